@@ -733,6 +733,9 @@ class Test(Base):
         },
     }
 
+    # Update search indices synchronously so that tests can check the result
+    RICHIE_ES_INDEXING_QUEUE = "richie.apps.search.queues.ImmediateIndexingQueue"
+
     RICHIE_LMS_BACKENDS = [
         {
             "BASE_URL": "http://localhost:8073",
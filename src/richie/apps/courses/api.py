@@ -3,13 +3,13 @@ API endpoints for the courses app.
 """
 
 import hmac
+from collections import defaultdict
 
 from django.conf import settings
-from django.core.cache import caches
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection, transaction
 from django.db.models import Q
 
-from cms import signals as cms_signals
-from cms.models import Page
 from rest_framework.decorators import api_view
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import BasePermission
@@ -21,6 +21,7 @@ from .exceptions import MissingResourceLinkError
 from .lms import LMSHandler
 from .models import Course, CourseRun, CourseRunSyncMode
 from .serializers import CourseRunSerializer
+from .signals import course_runs_synced
 from .utils import get_signature, normalize_code
 
 
@@ -63,7 +64,6 @@ class CourseRunsViewSet(ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-# pylint: disable=too-many-locals,too-many-branches
 def sync_course_run(data):
     """ "
     Synchronize a course run from its data.
@@ -90,127 +90,258 @@ def sync_course_run(data):
         ValidationError: something is wrong in the data. The error dict describes the error.
 
     """
-    # Select LMS from resource link
     resource_link = data.get("resource_link")
     if not resource_link:
         raise MissingResourceLinkError()
 
-    lms = LMSHandler.select_lms(resource_link)
-    if lms is None:
-        raise ValidationError(
-            {"resource_link": ["No LMS configuration found for this resource link."]}
-        )
-    sync_mode = lms.default_course_run_sync_mode
+    errors = sync_course_runs([data])
+    if errors:
+        raise errors[resource_link]
 
-    target_course_runs = CourseRun.objects.filter(resource_link=resource_link)
-    draft_course_runs = target_course_runs.filter(draft_course_run__isnull=True)
 
-    # Clean data before instiating a serializer with it
-    cleaned_data = lms.clean_course_run_data(data)
-    serializer = lms.get_course_run_serializer(
-        cleaned_data, partial=bool(draft_course_runs)
-    )
+# pylint: disable=too-many-locals,too-many-branches,too-many-statements
+def sync_course_runs(items):
+    """
+    Synchronize a batch of course runs from their data (see `sync_course_run` for the
+    format of each item).
 
-    if serializer.is_valid() is not True:
-        raise ValidationError(serializer.errors)
-    validated_data = serializer.validated_data
+    The course runs and courses targeted by the batch are loaded in a fixed number of
+    queries, all the valid items are saved in bulk in a single transaction and the public
+    courses impacted are reindexed at once.
 
-    if draft_course_runs:
-        # Remove fields that are protected for update
-        validated_data = {
-            key: value
-            for (key, value) in validated_data.items()
-            if key not in lms.configuration.get("COURSE_RUN_SYNC_NO_UPDATE_FIELDS", [])
-        }
+    Parameters
+    ----------
+    items : list
+        A list of dictionaries describing course runs, each with a "resource_link" key.
+        Items targeting the same resource link are merged, the latest fields winning, as
+        if they were synchronized one after the other.
 
-        for course_run in draft_course_runs.filter(
-            sync_mode__in=[
-                CourseRunSyncMode.SYNC_TO_DRAFT,
-                CourseRunSyncMode.SYNC_TO_PUBLIC,
-            ]
-        ):
-            nb_updated = CourseRun.objects.filter(
-                Q(pk=course_run.pk)
-                | Q(
-                    draft_course_run__sync_mode=CourseRunSyncMode.SYNC_TO_PUBLIC,
-                    draft_course_run=course_run,
+    Returns
+    -------
+    dict
+        The validation errors of the items that could not be synchronized, keyed by their
+        resource link. The other items were synchronized.
+
+    """
+    items_by_link = {}
+    for data in items:
+        resource_link = data["resource_link"]
+        items_by_link[resource_link] = {**items_by_link.get(resource_link, {}), **data}
+
+    errors = {}
+
+    # Load the existing draft course runs and their public counterpart in one query
+    draft_course_runs = defaultdict(list)
+    public_course_runs = {}
+    for course_run in CourseRun.objects.filter(
+        Q(resource_link__in=items_by_link)
+        | Q(draft_course_run__resource_link__in=items_by_link)
+    ).select_related(
+        "direct_course__extended_object", "direct_course__public_extension"
+    ):
+        if course_run.draft_course_run_id is None:
+            draft_course_runs[course_run.resource_link].append(course_run)
+        else:
+            public_course_runs[course_run.draft_course_run_id] = course_run
+
+    # Validate all items before writing anything
+    updates = []
+    creations = []
+    for resource_link, data in items_by_link.items():
+        # Select LMS from resource link
+        lms = LMSHandler.select_lms(resource_link)
+        if lms is None:
+            errors[resource_link] = ValidationError(
+                {
+                    "resource_link": [
+                        "No LMS configuration found for this resource link."
+                    ]
+                }
+            )
+            continue
+
+        # Clean data before instiating a serializer with it
+        cleaned_data = lms.clean_course_run_data(data)
+        serializer = lms.get_course_run_serializer(
+            cleaned_data, partial=bool(draft_course_runs[resource_link])
+        )
+        if serializer.is_valid() is not True:
+            errors[resource_link] = ValidationError(serializer.errors)
+            continue
+        validated_data = serializer.validated_data
+
+        if draft_course_runs[resource_link]:
+            # Remove fields that are protected for update
+            no_update_fields = lms.configuration.get(
+                "COURSE_RUN_SYNC_NO_UPDATE_FIELDS", []
+            )
+            updates.append(
+                (
+                    draft_course_runs[resource_link],
+                    {
+                        key: value
+                        for (key, value) in validated_data.items()
+                        if key not in no_update_fields
+                    },
                 )
-            ).update(**validated_data)
+            )
+            continue
 
-            public_course = course_run.direct_course.public_extension
-            if course_run.sync_mode == CourseRunSyncMode.SYNC_TO_PUBLIC:
-                if public_course:
-                    # If the public course run did not exist yet it has to be created
-                    if nb_updated == 1:
-                        public_course.copy_relations(course_run.direct_course)
-
-                    # What we did has changed the public course page. We must reindex it
-                    cms_signals.post_publish.send(
-                        sender=Page,
-                        instance=course_run.direct_course.extended_object,
-                        language=None,
-                    )
-                    # We also need to clear the cache of the public course page
-                    # and the search index (catalog)
-                    course_run.direct_course.extended_object.clear_cache()
-                    caches["search"].clear()
-            else:
-                course_run.refresh_from_db()
-                course_run.mark_course_dirty()
-        return
-
-    # We need to create a new course run
-    if lms.default_course_run_sync_mode == CourseRunSyncMode.MANUAL:
-        raise ValidationError(
-            {"resource_link": ["Unknown course run when creation is deactivated."]}
+        # We need to create a new course run
+        if lms.default_course_run_sync_mode == CourseRunSyncMode.MANUAL:
+            errors[resource_link] = ValidationError(
+                {"resource_link": ["Unknown course run when creation is deactivated."]}
+            )
+            continue
+
+        creations.append(
+            (
+                resource_link,
+                normalize_code(lms.extract_course_code(data)),
+                lms.default_course_run_sync_mode,
+                validated_data,
+            )
         )
 
-    # Look for the course targeted by the resource link
-    course_code = normalize_code(lms.extract_course_code(data))
-    try:
-        course = Course.objects.distinct().get(
-            code=course_code,
+    # Look for the courses targeted by the resource links of new course runs
+    courses = {
+        course.code: course
+        for course in Course.objects.filter(
+            code__in={course_code for _link, course_code, _mode, _data in creations},
             extended_object__publisher_is_draft=True,
             # Exclude snapshots
             extended_object__node__parent__cms_pages__course__isnull=True,
+        ).select_related("extended_object", "public_extension")
+    }
+
+    new_course_runs = []
+    for resource_link, course_code, sync_mode, validated_data in creations:
+        try:
+            course = courses[course_code]
+        except KeyError:
+            # The course page must first be created in draft
+            errors[resource_link] = ValidationError(
+                {"resource_link": [f"Unknown course: {course_code:s}."]}
+            )
+            continue
+
+        # Instantiate a new draft course run
+        draft_course_run = CourseRun(
+            direct_course=course, sync_mode=sync_mode, **validated_data
         )
-    except Course.DoesNotExist as exc:
-        # Create the course page in draft
-        raise ValidationError(
-            {"resource_link": [f"Unknown course: {course_code:s}."]}
-        ) from exc
-
-    # Instantiate a new draft course run
-    draft_course_run = CourseRun(
-        direct_course=course, sync_mode=sync_mode, **validated_data
-    )
+        try:
+            draft_course_run.full_clean()
+        except DjangoValidationError as error:
+            errors[resource_link] = error
+            continue
+        new_course_runs.append((draft_course_run, validated_data))
+
+    updated_course_runs = []
+    updated_fields = set()
+    dirty_course_runs = []
+    courses_to_copy = {}
+    synced_courses = {}
+    for course_runs, validated_data in updates:
+        for course_run in course_runs:
+            if course_run.sync_mode not in [
+                CourseRunSyncMode.SYNC_TO_DRAFT,
+                CourseRunSyncMode.SYNC_TO_PUBLIC,
+            ]:
+                continue
 
-    # Create the related public course run if necessary
-    if sync_mode == CourseRunSyncMode.SYNC_TO_PUBLIC:
-        # Don't mark the related course page dirty and directly add
-        # the course run to the corresponding public course page
-        draft_course_run.save()
-        if course.public_extension_id:
-            public_course_run = CourseRun(
-                direct_course=course.public_extension,
-                draft_course_run=draft_course_run,
-                sync_mode=sync_mode,
-                **validated_data,
+            targets = [course_run]
+            if course_run.sync_mode == CourseRunSyncMode.SYNC_TO_PUBLIC:
+                public_course = course_run.direct_course.public_extension
+                try:
+                    targets.append(public_course_runs[course_run.pk])
+                except KeyError:
+                    # If the public course run did not exist yet it has to be created
+                    if public_course:
+                        courses_to_copy[public_course.pk] = (
+                            public_course,
+                            course_run.direct_course,
+                        )
+                if public_course:
+                    synced_courses[public_course.pk] = public_course
+            else:
+                dirty_course_runs.append(course_run)
+
+            for target in targets:
+                for key, value in validated_data.items():
+                    setattr(target, key, value)
+            updated_course_runs.extend(targets)
+            updated_fields.update(validated_data)
+
+    with transaction.atomic():
+        if updated_course_runs and updated_fields:
+            CourseRun.objects.bulk_update(updated_course_runs, updated_fields)
+
+        for public_course, draft_course in courses_to_copy.values():
+            public_course.copy_relations(draft_course)
+
+        for course_run in dirty_course_runs:
+            course_run.mark_course_dirty()
+
+        new_draft_course_runs = [
+            draft_course_run for draft_course_run, _data in new_course_runs
+        ]
+        CourseRun.objects.bulk_create(new_draft_course_runs)
+        if (
+            new_draft_course_runs
+            and not connection.features.can_return_rows_from_bulk_insert
+        ):
+            # The database does not return the primary keys of the rows inserted in bulk
+            # (e.g. MySQL): read them back to link the public course runs to their draft
+            draft_ids = dict(
+                CourseRun.objects.filter(
+                    resource_link__in=[
+                        draft_course_run.resource_link
+                        for draft_course_run in new_draft_course_runs
+                    ],
+                    direct_course__extended_object__publisher_is_draft=True,
+                ).values_list("resource_link", "pk")
             )
-            public_course_run.save()
+            for draft_course_run in new_draft_course_runs:
+                draft_course_run.pk = draft_ids[draft_course_run.resource_link]
+
+        # Create the related public course runs if necessary
+        new_public_course_runs = []
+        for draft_course_run, validated_data in new_course_runs:
+            course = draft_course_run.direct_course
+            if draft_course_run.sync_mode == CourseRunSyncMode.SYNC_TO_PUBLIC:
+                # Don't mark the related course page dirty and directly add
+                # the course run to the corresponding public course page
+                if course.public_extension_id:
+                    new_public_course_runs.append(
+                        CourseRun(
+                            direct_course=course.public_extension,
+                            draft_course_run=draft_course_run,
+                            sync_mode=draft_course_run.sync_mode,
+                            **validated_data,
+                        )
+                    )
+                    synced_courses[course.public_extension_id] = course.public_extension
+            else:
+                # Mark the course page dirty
+                draft_course_run.mark_course_dirty()
+        CourseRun.objects.bulk_create(new_public_course_runs)
+
+        # The state materialized on the courses must be recomputed
+        CourseRun.invalidate_courses_state(
+            updated_course_runs + new_draft_course_runs + new_public_course_runs
+        )
 
-            # What we did has changed the public course page. We must reindex it
-            cms_signals.post_publish.send(
-                sender=Page, instance=course.extended_object, language=None
+        if synced_courses:
+            # What we did has changed the course runs of the public course pages.
+            # We must update them in the search index and its cache
+            course_runs_synced.send(
+                sender=Course, instances=list(synced_courses.values())
             )
-            # We also need to clear the cache of the public course page
-            # and the search index (catalog)
-            course.extended_object.clear_cache()
-            caches["search"].clear()
-    else:
-        # Save the draft course run marking the course page dirty
-        draft_course_run.save()
-        draft_course_run.mark_course_dirty()
+            # We also need to clear the cache of the public course pages (all the page
+            # caches are cleared at once)
+            next(iter(synced_courses.values())).extended_object.clear_cache()
+
+    return errors
 
 
 # pylint: disable=too-many-return-statements,unused-argument, too-many-locals,too-many-branches
@@ -265,19 +396,18 @@ def sync_course_runs_from_request(request, version):
         return Response("Invalid authentication.", status=401)
 
     if isinstance(request.data, (list, tuple)):
-        result = {}
-        status = 200
         if not all("resource_link" in d for d in request.data):
             return Response({"resource_link": ["This field is required."]}, status=400)
-        for data in request.data:
-            try:
-                sync_course_run(data)
-            except ValidationError as error:
-                result[data["resource_link"]] = as_serializer_error(error)
-                status = 400
-            else:
-                result[data["resource_link"]] = {"success": True}
-        return Response(result, status=status)
+        errors = sync_course_runs(request.data)
+        result = {
+            data["resource_link"]: (
+                as_serializer_error(errors[data["resource_link"]])
+                if data["resource_link"] in errors
+                else {"success": True}
+            )
+            for data in request.data
+        }
+        return Response(result, status=400 if errors else 200)
 
     try:
         sync_course_run(request.data)
@@ -1,10 +1,16 @@
 """LMS handler to select and return the right LMS backend for each url."""
 
 import re
+from functools import lru_cache
 
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils.module_loading import import_string
 
+# Number of urls for which the LMS backend selected is remembered
+LMS_SELECTION_CACHE_SIZE = 4096
+
 
 class LMSHandler:
     """Class to handle LMS backends.
@@ -13,18 +19,33 @@ class LMSHandler:
     via the `COURSE_REGEX` configured for each LMS.
     """
 
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_lms_backends():
+        """
+        Return the configured LMS backends as a tuple of (compiled course regex, backend
+        instance) pairs, in the order of the `RICHIE_LMS_BACKENDS` setting.
+
+        The regexes are compiled and the backends instantiated only once: backend instances
+        are shared and must not hold request specific state.
+        """
+        return tuple(
+            (
+                re.compile(lms_configuration.get("COURSE_REGEX", r".*")),
+                import_string(lms_configuration["BACKEND"])(lms_configuration),
+            )
+            for lms_configuration in settings.RICHIE_LMS_BACKENDS
+        )
+
     @staticmethod
     def get_lms_classes():
         """
         Return all enabled LMS classes.
         """
-
-        return {
-            import_string(lms_configuration["BACKEND"])
-            for lms_configuration in settings.RICHIE_LMS_BACKENDS
-        }
+        return {type(backend) for _regex, backend in LMSHandler.get_lms_backends()}
 
     @staticmethod
+    @lru_cache(maxsize=LMS_SELECTION_CACHE_SIZE)
     def select_lms(url):
         """
         Select and return the first LMS backend matching the url passed in argument.
@@ -32,13 +53,24 @@ class LMSHandler:
         Default to None if no LMS is found to enable use-cases where we need to detect whether
         a course run has a matching LMS or not. Callers can determine if not finding an LMS
         backend is an exception or not.
+
+        The backend selected for the most recent urls is remembered.
         """
         if url is None:
             return None
 
         # First check if it matches a configured LMS
-        for lms_configuration in settings.RICHIE_LMS_BACKENDS:
-            if re.match(lms_configuration.get("COURSE_REGEX", r".*"), url):
-                return import_string(lms_configuration["BACKEND"])(lms_configuration)
+        for regex, backend in LMSHandler.get_lms_backends():
+            if regex.match(url):
+                return backend
 
         return None
+
+
+# pylint: disable=unused-argument
+@receiver(setting_changed)
+def reset_lms_backends(sender, setting, **kwargs):
+    """Forget the LMS backends and selections when the LMS settings are changed in tests."""
+    if setting == "RICHIE_LMS_BACKENDS":
+        LMSHandler.get_lms_backends.cache_clear()
+        LMSHandler.select_lms.cache_clear()
@@ -0,0 +1,55 @@
+"""
+Recompute the state materialized on the courses for which it is stale.
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from ...models import Course
+from ...signals import course_states_updated
+
+logger = logging.getLogger("richie.courses.update_course_states")
+
+
+class Command(BaseCommand):
+    """
+    Recompute the best state and best course run of the courses for which one of the course
+    runs changed state since it was last computed. This command should be run periodically
+    (e.g. every few minutes) so that courses change state on time.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add an option to recompute the state of all courses."""
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            default=False,
+            help="Recompute the state of all courses even if it is not stale.",
+        )
+
+    def handle(self, *args, **options):
+        courses = Course.objects.select_related("extended_object__node")
+        if not options["all"]:
+            courses = courses.filter(
+                Q(state_computed_at__isnull=True)
+                | Q(state_transition_at__lte=timezone.now())
+            )
+
+        count = 0
+        public_courses = []
+        for course in courses.iterator():
+            course.update_state()
+            count += 1
+            if not course.extended_object.publisher_is_draft:
+                public_courses.append(course)
+
+        if public_courses:
+            # The state of public courses is also materialized in the search index
+            course_states_updated.send(sender=Course, instances=public_courses)
+
+        logger.info("State updated for %d courses.", count)
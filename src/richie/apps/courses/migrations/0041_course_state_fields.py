@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0040_courserun_certificate_discount_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="best_run",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="courses.courserun",
+            ),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="best_state",
+            field=models.PositiveSmallIntegerField(default=7, editable=False),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="state_computed_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="state_transition_at",
+            field=models.DateTimeField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+    ]
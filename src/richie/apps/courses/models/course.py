@@ -3,8 +3,10 @@ Declare and configure the models for the courses application
 """
 
 # pylint: disable=too-many-lines
+import operator
 from collections.abc import Mapping
 from datetime import MAXYEAR, datetime, timezone
+from functools import reduce
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
@@ -17,7 +19,7 @@ from django.utils.translation import gettext_lazy as _
 
 from cms.constants import PUBLISHER_STATE_DIRTY
 from cms.extensions.extension_pool import extension_pool
-from cms.models import Page, PagePermission
+from cms.models import Page, PagePermission, TreeNode
 from cms.models.pluginmodel import CMSPlugin
 from filer.fields.image import FilerImageField
 from filer.models import FolderPermission
@@ -189,6 +191,25 @@ class Course(EsIdMixin, BasePageExtension):
         help_text=_("Tick if the course pace is self paced."),
     )
 
+    # The state of the course is materialized from its course runs so that it is not
+    # computed on each access. It is valid from the time it was computed until the next
+    # time the state of one of its course runs changes (see `update_course_states`).
+    best_state = models.PositiveSmallIntegerField(
+        default=CourseState.TO_BE_SCHEDULED, editable=False
+    )
+    best_run = models.ForeignKey(
+        "CourseRun",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        editable=False,
+    )
+    state_computed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    state_transition_at = models.DateTimeField(
+        null=True, blank=True, db_index=True, editable=False
+    )
+
     PAGE = defaults.COURSES_PAGE
 
     class Meta:
@@ -621,11 +642,27 @@ class Course(EsIdMixin, BasePageExtension):
         """
         return self.get_reverse_related_page_extensions("program", language=language)
 
+    @property
+    def is_state_fresh(self):
+        """
+        Return True if the state materialized on the course is still valid at the current
+        time i.e. none of its course runs changed state since it was computed.
+        """
+        now = django_timezone.now()
+        return (
+            self.state_computed_at is not None
+            and self.state_computed_at <= now
+            and (self.state_transition_at is None or now < self.state_transition_at)
+        )
+
     @property
     def best_course_run(self):
         """
         Returns the course run with the best state.
         """
+        if self.is_state_fresh:
+            return self.best_run
+
         best_run = None
         course_runs = self.course_runs.only(
             "start", "end", "enrollment_start", "enrollment_end"
@@ -641,6 +678,54 @@ class Course(EsIdMixin, BasePageExtension):
 
         return best_run
 
+    def compute_state_fields(self):
+        """
+        Compute the fields materializing the state of the course from its course runs: its
+        best course run, the priority of its state and the next time the state of one of
+        its course runs changes.
+        """
+        now = django_timezone.now()
+        best_run = None
+        best_state = CourseState.TO_BE_SCHEDULED
+        transition_at = None
+
+        for course_run in self.course_runs.only(
+            "start", "end", "enrollment_start", "enrollment_end"
+        ).exclude(catalog_visibility=CourseRunCatalogVisibility.HIDDEN):
+            dates = (
+                course_run.start,
+                course_run.end,
+                course_run.enrollment_start,
+                course_run.enrollment_end,
+            )
+            priority = CourseRun.compute_state(*dates, now=now)["priority"]
+            if best_run is None or priority < best_state:
+                best_run = course_run
+                best_state = priority
+
+            run_transition_at = CourseRun.compute_state_transition(*dates, now=now)
+            if run_transition_at and (
+                transition_at is None or run_transition_at < transition_at
+            ):
+                transition_at = run_transition_at
+
+        return {
+            "best_run": best_run,
+            "best_state": best_state,
+            "state_computed_at": now,
+            "state_transition_at": transition_at,
+        }
+
+    def update_state(self):
+        """
+        Compute and save the fields materializing the state of the course. They are updated
+        directly in database so that saving them does not mark the course page dirty.
+        """
+        fields = self.compute_state_fields()
+        self.__class__.objects.filter(pk=self.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(self, name, value)
+
     @property
     def state(self):
         """
@@ -732,6 +817,12 @@ class Course(EsIdMixin, BasePageExtension):
         it should perfectly reflect the state of the draft page at the moment we clicked on the
         publish button.
         """
+        # The state materialized on the original course does not apply to its copy
+        self.best_run = self.state_computed_at = None
+        self.__class__.objects.filter(pk=self.pk).update(
+            best_run=None, state_computed_at=None
+        )
+
         # Don't copy the course runs if this is a copy to clone
         if oldinstance.public_extension_id != self.id:
             return
@@ -1025,6 +1116,38 @@ class CourseRun(TranslatableModel):
         """Enforce validation each time an instance is saved."""
         self.full_clean()
         super().save(*args, **kwargs)
+        self.invalidate_courses_state([self])
+
+    @staticmethod
+    def invalidate_courses_state(course_runs):
+        """
+        Mark as stale the state materialized on the courses to which the course runs passed
+        in argument are related, directly or through one of their snapshots.
+        """
+        paths = {}
+        for is_draft, path in Page.objects.filter(
+            course__id__in={course_run.direct_course_id for course_run in course_runs}
+        ).values_list("publisher_is_draft", "node__path"):
+            # The course runs of a snapshot are also the course runs of its ancestors
+            paths.setdefault(is_draft, set()).update(
+                path[:length]
+                for length in range(TreeNode.steplen, len(path) + 1, TreeNode.steplen)
+            )
+        if not paths:
+            return
+
+        Course.objects.filter(
+            reduce(
+                operator.or_,
+                [
+                    Q(
+                        extended_object__publisher_is_draft=is_draft,
+                        extended_object__node__path__in=node_paths,
+                    )
+                    for is_draft, node_paths in paths.items()
+                ],
+            )
+        ).update(state_computed_at=None)
 
     # pylint: disable=signature-differs
     def delete(self, *args, **kwargs):
@@ -1042,14 +1165,16 @@ class CourseRun(TranslatableModel):
                 self.direct_course.extended_object.title_set.update(
                     publisher_state=PUBLISHER_STATE_DIRTY
                 )  # mark page dirty in all languages
-        return super().delete(*args, **kwargs)
+        result = super().delete(*args, **kwargs)
+        self.invalidate_courses_state([self])
+        return result
 
     # pylint: disable=too-many-return-statements
     @staticmethod
-    def compute_state(start, end, enrollment_start, enrollment_end):
+    def compute_state(start, end, enrollment_start, enrollment_end, now=None):
         """
-        Compute at the current time the state of a course run that would have the dates
-        passed in argument.
+        Compute at the current time (or at the time passed in argument) the state of a
+        course run that would have the dates passed in argument.
 
         A static method not using the instance allows to call it with an Elasticsearch result.
         """
@@ -1061,7 +1186,7 @@ class CourseRun(TranslatableModel):
         end = end or MAX_DATE
         enrollment_end = enrollment_end or MAX_DATE
 
-        now = django_timezone.now()
+        now = now or django_timezone.now()
         if start < now:
             if end > now:
                 if enrollment_end > now:
@@ -1083,6 +1208,29 @@ class CourseRun(TranslatableModel):
         # future already closed
         return CourseState(CourseState.FUTURE_CLOSED)
 
+    @staticmethod
+    def compute_state_transition(
+        start, end, enrollment_start, enrollment_end, now=None
+    ):
+        """
+        Return the next time after the current time (or after the time passed in argument)
+        at which the state of a course run that would have the dates passed in argument
+        changes, or None if it will never change.
+        """
+        if not start or not enrollment_start:
+            # The course run is to be scheduled until its dates are modified
+            return None
+
+        now = now or django_timezone.now()
+        return min(
+            (
+                date_time
+                for date_time in (start, end, enrollment_start, enrollment_end)
+                if date_time is not None and now < date_time < MAX_DATE
+            ),
+            default=None,
+        )
+
     @property
     def state(self):
         """Return the state of the course run at the current time."""
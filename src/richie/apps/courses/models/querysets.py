@@ -7,8 +7,10 @@ from datetime import MAXYEAR, datetime, timezone
 from django.db.models import (
     Case,
     DateTimeField,
+    F,
     IntegerField,
     OuterRef,
+    Q,
     Subquery,
     Value,
     When,
@@ -27,15 +29,27 @@ def order_courses_by_state(queryset):
 
     Courses with no course runs are treated as TO_BE_SCHEDULED and
     appear last.
+
+    The state materialized on courses is used when it is still fresh,
+    the state is only computed from the course runs for stale courses.
     """
     from .course import (  # pylint: disable=import-outside-toplevel,cyclic-import
         CourseState,
     )
 
+    now = django_timezone.now()
     return queryset.annotate(
-        best_state_priority=Coalesce(
-            _best_course_run_state_subquery(),
-            Value(CourseState.TO_BE_SCHEDULED),
+        best_state_priority=Case(
+            When(
+                Q(state_transition_at__isnull=True) | Q(state_transition_at__gt=now),
+                state_computed_at__lte=now,
+                then=F("best_state"),
+            ),
+            default=Coalesce(
+                _best_course_run_state_subquery(),
+                Value(CourseState.TO_BE_SCHEDULED),
+            ),
+            output_field=IntegerField(),
         ),
     ).order_by("best_state_priority", "-pk")
 
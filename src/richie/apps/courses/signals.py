@@ -0,0 +1,12 @@
+"""Signals sent by the courses app."""
+
+from django.dispatch import Signal
+
+# Sent with the list of public courses as "instances" when the course runs of published
+# courses were modified outside of the publication workflow e.g. when they are synchronized
+# from an LMS.
+course_runs_synced = Signal()
+
+# Sent with the list of public courses as "instances" when the state materialized on these
+# courses was recomputed because one of their course runs changed state.
+course_states_updated = Signal()
@@ -1,30 +1,146 @@
 """Signals to update the Elasticsearch indices when page modifications are published."""
 
 # Define the global ES_CLIENT and ES_INDICES_CLIENT variables
+import logging
 
 from django.apps import AppConfig
 from django.conf import settings
 
+from elasticsearch import Elasticsearch
+from elasticsearch.client import IndicesClient
+from elasticsearch.exceptions import TransportError
+
+from .cache import get_search_cache
+from .defaults import ES_CLIENT_PROFILES, ES_VERSION_CACHE_TIMEOUT
 from .elasticsearch import (
     ElasticsearchClientCompat7to6,
     ElasticsearchIndicesClientCompat7to6,
+    InstrumentedTransport,
 )
 
+# Client of the "search" profile, used to serve API requests
 ES_CLIENT = None
+# Client of the "bulk" profile, used to write to the indices and to manage them
+ES_BULK_CLIENT = None
 ES_INDICES_CLIENT = None
 
+ES_VERSION_CACHE_KEY = "es_version"
+
+logger = logging.getLogger(__name__)
+
+
+def get_es_client_kwargs(profile):
+    """Return the options of the Elasticsearch client of a profile."""
+    return {
+        **ES_CLIENT_PROFILES[profile],
+        **getattr(settings, "RICHIE_ES_CLIENT_KWARGS", {}),
+        **getattr(settings, "RICHIE_ES_CLIENT_PROFILES", {}).get(profile, {}),
+    }
+
+
+def get_es_client(profile, es_version=None):
+    """
+    Instantiate an Elasticsearch client with the options of a profile. The compatibility
+    layer is only used if Elasticsearch 6 is targeted or if its version is not known.
+    """
+    hosts = getattr(settings, "RICHIE_ES_HOST", ["elasticsearch"])
+    if es_version is not None and es_version != "6":
+        return Elasticsearch(
+            hosts,
+            transport_class=InstrumentedTransport,
+            **get_es_client_kwargs(profile),
+        )
+
+    return ElasticsearchClientCompat7to6(
+        hosts,
+        es_version=es_version,
+        on_version_detected=set_es_version,
+        **get_es_client_kwargs(profile),
+    )
+
+
+def get_es_version():
+    """
+    Return the major version of Elasticsearch as a string. It is taken from the
+    `RICHIE_ES_VERSION` setting if it is set, otherwise from the search cache. If it is not
+    there, Elasticsearch is probed once and the version is stored in the search cache for
+    the other processes.
+
+    Return None if Elasticsearch can't be reached: the clients then detect the version
+    the first time they need it.
+    """
+    es_version = getattr(settings, "RICHIE_ES_VERSION", None)
+    if es_version:
+        return str(es_version)[:1]
+
+    cache = get_search_cache()
+    if cache is not None:
+        es_version = cache.get(ES_VERSION_CACHE_KEY)
+        if es_version is not None:
+            return es_version
+
+    try:
+        es_version = get_es_client("search").info()["version"]["number"][:1]
+    except TransportError as error:
+        logger.warning("Elasticsearch version could not be detected: %s", error)
+        return None
+
+    set_es_version(es_version)
+    return es_version
+
+
+def set_es_version(es_version):
+    """
+    Store the major version of Elasticsearch detected by a client in the search cache, to
+    share it with the other processes.
+    """
+    cache = get_search_cache()
+    if cache is not None:
+        cache.set(
+            ES_VERSION_CACHE_KEY,
+            es_version,
+            getattr(
+                settings, "RICHIE_ES_VERSION_CACHE_TIMEOUT", ES_VERSION_CACHE_TIMEOUT
+            ),
+        )
+
+
+def get_es_metrics():
+    """Return the metrics of the Elasticsearch clients of the current process by profile."""
+    return {
+        "search": ES_CLIENT.transport.get_metrics(),
+        "bulk": ES_BULK_CLIENT.transport.get_metrics(),
+    }
+
 
 def init_es():
     """
-    Initialize the Elasticsearch client and indices client.
+    Initialize the Elasticsearch clients and indices client.
+
+    The version of Elasticsearch is resolved once for all the clients so that it is not
+    probed on the first request served by each process.
     """
+    es_version = get_es_version()
     global ES_CLIENT  # pylint: disable=global-statement
-    ES_CLIENT = ElasticsearchClientCompat7to6(
-        getattr(settings, "RICHIE_ES_HOST", ["elasticsearch"]),
-        **getattr(settings, "RICHIE_ES_CLIENT_KWARGS", {}),
-    )
+    ES_CLIENT = get_es_client("search", es_version)
+    global ES_BULK_CLIENT  # pylint: disable=global-statement
+    ES_BULK_CLIENT = get_es_client("bulk", es_version)
     global ES_INDICES_CLIENT  # pylint: disable=global-statement
-    ES_INDICES_CLIENT = ElasticsearchIndicesClientCompat7to6(ES_CLIENT)
+    if isinstance(ES_BULK_CLIENT, ElasticsearchClientCompat7to6):
+        ES_INDICES_CLIENT = ElasticsearchIndicesClientCompat7to6(ES_BULK_CLIENT)
+    else:
+        ES_INDICES_CLIENT = IndicesClient(ES_BULK_CLIENT)
+
+
+# pylint: disable=import-outside-toplevel,cyclic-import
+def init_autocomplete():
+    """
+    Load the prefix indices of autocomplete once the Elasticsearch clients are initialized,
+    before the first request is served.
+    """
+    from .autocomplete import warm_prefix_indices
+
+    warm_prefix_indices()
 
 
 # pylint: disable=import-outside-toplevel,cyclic-import
@@ -32,10 +148,19 @@ def init_signals():
     """Register signals to update the Elasticsearch indices."""
     from cms.signals import post_publish, post_unpublish
 
-    from .signals import on_page_published, on_page_unpublished
+    from richie.apps.courses.signals import course_runs_synced, course_states_updated
+
+    from .signals import on_course_runs_synced, on_page_published, on_page_unpublished
 
     post_publish.connect(on_page_published, dispatch_uid="search_post_publish")
     post_unpublish.connect(on_page_unpublished, dispatch_uid="search_post_unpublish")
+    course_runs_synced.connect(
+        on_course_runs_synced, dispatch_uid="search_course_runs_synced"
+    )
+    # The course runs are updated in the same way when the state of courses changes
+    course_states_updated.connect(
+        on_course_runs_synced, dispatch_uid="search_course_states_updated"
+    )
 
 
 class SearchConfig(AppConfig):
@@ -46,7 +171,9 @@ class SearchConfig(AppConfig):
 
     def ready(self):
         """
-        Initialize the Elasticsearch client and register signals.
+        Initialize the Elasticsearch client, register signals and load the prefix indices
+        of autocomplete.
         """
         init_es()
         init_signals()
+        init_autocomplete()
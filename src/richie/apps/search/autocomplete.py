@@ -0,0 +1,239 @@
+"""
+Autocomplete on the completion fields of the search indices.
+
+Autocomplete requests are sent on each keystroke so, when enabled by the
+`RICHIE_ES_AUTOCOMPLETE_IN_MEMORY` setting, each process keeps a prefix index of the
+completion inputs of each index in memory and answers them without querying Elasticsearch.
+The prefix indices are loaded when the app is ready, so that they are shared by the
+workers forked from a preloaded application and not loaded by the first request of each
+worker otherwise. The prefix index of an index is loaded again once the tag of the index
+in the search cache was invalidated, which happens each time documents are written to the
+index (e.g. when a page is published).
+"""
+
+import bisect
+import logging
+import re
+import threading
+import unicodedata
+
+from django.conf import settings
+
+from elasticsearch.exceptions import TransportError
+from elasticsearch.helpers import scan
+
+from .apps import ES_CLIENT
+from .cache import get_index_tag, get_tag_version
+from .defaults import ES_AUTOCOMPLETE_IN_MEMORY, ES_EXPORT_CHUNK_SIZE
+from .indexers import ES_INDICES
+
+# Number of options returned, as by the completion suggester of Elasticsearch
+AUTOCOMPLETE_SIZE = 5
+
+# Fields of the documents loaded in the prefix indices. They include all the fields used by
+# the `format_es_document_for_autocomplete` method of Richie's indexers.
+AUTOCOMPLETE_SOURCE = ["absolute_url", "complete", "kind", "title"]
+
+# Runs of letters, the tokens produced by the "lowercase" tokenizer of Elasticsearch
+LETTERS_PATTERN = re.compile(r"[^\W\d_]+")
+
+_prefix_indices = {}
+_prefix_indices_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_completion(string):
+    """
+    Normalize a completion input or query like the "simple_diacritics_insensitive" analyzer
+    of the completion fields: keep the runs of letters, lowercased and without diacritics,
+    separated by a space.
+    """
+    string = "".join(
+        char
+        for char in unicodedata.normalize("NFKD", string)
+        if not unicodedata.combining(char)
+    )
+    return " ".join(LETTERS_PATTERN.findall(string.lower()))
+
+
+class PrefixIndex:
+    """
+    Completion inputs of the documents of an index, sorted by language so that the inputs
+    starting with a prefix are found by bisection.
+    """
+
+    def __init__(self, hits):
+        """Index the completion inputs of the hits passed in argument in each language."""
+        self.documents = {}
+        entries = {}
+        for hit in hits:
+            self.documents[hit["_id"]] = hit
+            for language, inputs in (hit["_source"].get("complete") or {}).items():
+                entries.setdefault(language, set()).update(
+                    (normalize_completion(string), hit["_id"]) for string in inputs
+                )
+
+        self.entries = {
+            language: sorted(language_entries)
+            for language, language_entries in entries.items()
+        }
+
+    def search(self, query, language, contexts=None, size=AUTOCOMPLETE_SIZE):
+        """
+        Return the documents with a completion input starting with the query in a language,
+        as hits of a completion suggester. Documents are returned once, in the alphabetical
+        order of their first normalized matching input, and can be restricted to the
+        documents of which the value of a field is one of the values passed for it in
+        `contexts`.
+        """
+        prefix = normalize_completion(query)
+        if not prefix:
+            return []
+
+        language_entries = self.entries.get(language, [])
+        options = {}
+        for index in range(
+            bisect.bisect_left(language_entries, (prefix,)), len(language_entries)
+        ):
+            key, document_id = language_entries[index]
+            if not key.startswith(prefix) or len(options) == size:
+                break
+            if document_id in options:
+                continue
+
+            document = self.documents[document_id]
+            if all(
+                document["_source"].get(field) in values
+                for field, values in (contexts or {}).items()
+            ):
+                options[document_id] = document
+
+        return list(options.values())
+
+
+def load_prefix_index(index_name):
+    """Read the completion inputs of all the documents of an index from Elasticsearch."""
+    return PrefixIndex(
+        scan(
+            ES_CLIENT,
+            index=index_name,
+            query={"query": {"match_all": {}}},
+            _source=AUTOCOMPLETE_SOURCE,
+            size=getattr(settings, "RICHIE_ES_EXPORT_CHUNK_SIZE", ES_EXPORT_CHUNK_SIZE),
+        )
+    )
+
+
+def get_prefix_index(index_name):
+    """
+    Return the prefix index of an index, loading it if the documents of the index changed
+    since it was loaded. Return None if the search cache is not configured as we could not
+    know when to load it again.
+    """
+    version = get_tag_version(get_index_tag(index_name))
+    if version is None:
+        return None
+
+    try:
+        loaded_version, prefix_index = _prefix_indices[index_name]
+    except KeyError:
+        loaded_version = None
+
+    if loaded_version != version:
+        # Load each prefix index only once per process, even if it is requested by
+        # concurrent requests
+        with _prefix_indices_lock:
+            loaded_version, prefix_index = _prefix_indices.get(index_name, (None, None))
+            if loaded_version != version:
+                prefix_index = load_prefix_index(index_name)
+                _prefix_indices[index_name] = version, prefix_index
+
+    return prefix_index
+
+
+def warm_prefix_indices():
+    """
+    Load the prefix indices of all the indices if autocomplete is served from memory. An
+    index that can't be read is loaded on first use instead.
+    """
+    if not getattr(
+        settings, "RICHIE_ES_AUTOCOMPLETE_IN_MEMORY", ES_AUTOCOMPLETE_IN_MEMORY
+    ):
+        return
+
+    for indexer in ES_INDICES:
+        try:
+            get_prefix_index(indexer.index_name)
+        except TransportError as error:
+            logger.warning(
+                "Prefix index of %s could not be loaded: %s", indexer.index_name, error
+            )
+
+
+def get_autocomplete_query(query, language, contexts=None):
+    """
+    Return the body of a search running the completion suggester of Elasticsearch on the
+    completion field of a language, restricted to the contexts passed in argument.
+    """
+    completion = {"field": f"complete.{language:s}"}
+    if contexts:
+        completion["contexts"] = contexts
+
+    return {"suggest": {"objects": {"prefix": query, "completion": completion}}}
+
+
+def get_autocomplete_options(index_name, query, language, contexts=None):
+    """
+    Return the documents of an index with a completion input in a language starting with
+    the query, from its prefix index if autocomplete is served from memory, otherwise
+    with the completion suggester of Elasticsearch.
+    """
+    if getattr(settings, "RICHIE_ES_AUTOCOMPLETE_IN_MEMORY", ES_AUTOCOMPLETE_IN_MEMORY):
+        prefix_index = get_prefix_index(index_name)
+        if prefix_index is not None:
+            return prefix_index.search(query, language, contexts=contexts)
+
+    autocomplete_query_response = ES_CLIENT.search(
+        index=index_name, body=get_autocomplete_query(query, language, contexts)
+    )
+    return autocomplete_query_response["suggest"]["objects"][0]["options"]
+
+
+def get_grouped_autocomplete_options(searches, query, language):
+    """
+    Same as `get_autocomplete_options` for several indices or contexts at once. The
+    searches are passed as a dictionary of `(index_name, contexts)` tuples and the options
+    are returned by the same keys. The searches that are not answered from memory are sent
+    to Elasticsearch in a single request. The options of a search that failed are empty.
+    """
+    in_memory = getattr(
+        settings, "RICHIE_ES_AUTOCOMPLETE_IN_MEMORY", ES_AUTOCOMPLETE_IN_MEMORY
+    )
+    options = {}
+    remote_searches = {}
+    for key, (index_name, contexts) in searches.items():
+        prefix_index = get_prefix_index(index_name) if in_memory else None
+        if prefix_index is None:
+            remote_searches[key] = index_name, contexts
+        else:
+            options[key] = prefix_index.search(query, language, contexts=contexts)
+
+    if remote_searches:
+        body = []
+        for index_name, contexts in remote_searches.values():
+            # Only the suggestions are needed, not the documents matching the search
+            body.append({"index": index_name})
+            body.append(
+                {**get_autocomplete_query(query, language, contexts), "size": 0}
+            )
+
+        responses = ES_CLIENT.msearch(body=body)["responses"]
+        for key, response in zip(remote_searches, responses):
+            options[key] = (
+                []
+                if "error" in response
+                else response["suggest"]["objects"][0]["options"]
+            )
+
+    return {key: options[key] for key in searches}
@@ -0,0 +1,106 @@
+"""
+Tagged entries in the search cache.
+
+Each entry of the search cache is stored along with the tags it depends on, typically the
+search indices from which it was computed.
+Each tag has a version token stored in the cache. Invalidating a tag replaces its token so
+that only the entries depending on it are considered stale when they are read, whatever
+the cache backend and without having to list its keys.
+"""
+
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, InvalidCacheBackendError
+
+SEARCH_CACHE_ALIAS = "search"
+TAG_KEY_PREFIX = "search_tag_"
+# Tag acting as the revision of the tree of public pages. It is invalidated each time a
+# page is published, unpublished, moved or deleted.
+PAGE_TREE_TAG = "page_tree"
+
+
+def get_search_cache():
+    """Return the search cache or None if it is not configured."""
+    try:
+        return caches[SEARCH_CACHE_ALIAS]
+    except InvalidCacheBackendError:
+        return None
+
+
+def get_index_tag(index_name):
+    """
+    Return the tag of the search cache entries that depend on the documents of an index.
+    It is invalidated each time documents are written to the index.
+    """
+    return f"index_{index_name!s}"
+
+
+def get_tag_version(tag):
+    """
+    Return the current version of a tag, or None if the search cache is not configured.
+    Entries can embed it in their key instead of being cached with `set_tagged`, so that
+    they are not found anymore once the tag is invalidated.
+    """
+    cache = get_search_cache()
+    if cache is None:
+        return None
+
+    tag_key = f"{TAG_KEY_PREFIX:s}{tag!s}"
+    version = cache.get(tag_key)
+    if version is None:
+        version = uuid4().hex
+        # Another process may have created the version in the meantime: it wins
+        if not cache.add(tag_key, version, timeout=None):
+            version = cache.get(tag_key, version)
+    return version
+
+
+def get_tagged(key, default=None):
+    """
+    Return the value cached for a key if none of the tags it depends on were invalidated
+    since it was cached, or the default value otherwise.
+    """
+    cache = get_search_cache()
+    if cache is None:
+        return default
+
+    entry = cache.get(key)
+    if entry is None:
+        return default
+
+    value, versions = entry
+    if versions and cache.get_many(versions.keys()) != versions:
+        return default
+    return value
+
+
+def set_tagged(key, value, tags, timeout=DEFAULT_TIMEOUT):
+    """Cache a value for a key along with the current version of the tags it depends on."""
+    cache = get_search_cache()
+    if cache is None:
+        return
+
+    tag_keys = [f"{TAG_KEY_PREFIX:s}{tag!s}" for tag in tags]
+    versions = cache.get_many(tag_keys)
+    missing_versions = {
+        tag_key: uuid4().hex for tag_key in tag_keys if tag_key not in versions
+    }
+    if missing_versions:
+        # Tag versions never expire: if one was evicted from the cache, the entries that
+        # recorded it can't match it anymore and are considered stale, which is safe.
+        cache.set_many(missing_versions, timeout=None)
+        versions.update(missing_versions)
+
+    cache.set(key, (value, versions), timeout=timeout)
+
+
+def invalidate_tags(tags):
+    """Make all the entries that depend on any of the tags passed in argument stale."""
+    cache = get_search_cache()
+    if cache is None or not tags:
+        return
+
+    cache.set_many(
+        {f"{TAG_KEY_PREFIX:s}{tag!s}": uuid4().hex for tag in tags}, timeout=None
+    )
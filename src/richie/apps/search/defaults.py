@@ -8,8 +8,74 @@ from django.utils.translation import gettext_lazy as _
 
 # Elasticsearch
 ES_CHUNK_SIZE = 500
+# Number of threads used by each process to send documents to Elasticsearch when
+# regenerating the indices in parallel
+ES_BULK_THREAD_COUNT = 4
+
+# Options of the Elasticsearch client of each profile. They are merged with the options of
+# the `RICHIE_ES_CLIENT_KWARGS` setting, then with the options defined for the profile in
+# the `RICHIE_ES_CLIENT_PROFILES` setting. Any option of the client, of its transport or of
+# its connections can be used (e.g. `sniff_on_start`, `sniffer_timeout`, `http_compress`).
+# - "search": serves API requests. It fails fast and keeps enough connections alive in its
+#   pool for the requests served concurrently by a process,
+# - "bulk": writes to the indices. It waits for long bulk requests and retries them.
+ES_CLIENT_PROFILES = {
+    "search": {
+        "timeout": 5,
+        "max_retries": 1,
+        "retry_on_timeout": False,
+        "maxsize": 10,
+    },
+    "bulk": {
+        "timeout": 60,
+        "max_retries": 3,
+        "retry_on_timeout": True,
+        "maxsize": ES_BULK_THREAD_COUNT,
+    },
+}
+
+# Duration (in seconds) during which the major version of Elasticsearch detected at startup
+# is stored in the search cache, so that the processes started meanwhile don't probe it
+# again. It is only shared if the search cache is shared between processes (not with a local
+# memory cache). Set the `RICHIE_ES_VERSION` setting to skip the detection altogether.
+ES_VERSION_CACHE_TIMEOUT = 3600
+
+# Queue collecting the pages to reindex when they are published or unpublished and
+# delay (in seconds) during which the in-process queue waits for updates to merge
+ES_INDEXING_QUEUE = "richie.apps.search.queues.ThreadIndexingQueue"
+ES_INDEXING_DELAY = 1
 ES_PAGE_SIZE = 10
 
+# Number of courses fetched from Elasticsearch by each scroll request of the course export
+# endpoint and duration during which the scroll context is kept alive between requests
+ES_EXPORT_CHUNK_SIZE = 500
+ES_EXPORT_SCROLL = "2m"
+
+# Duration (in seconds) during which the responses of the course search API are cached
+# for identical query params. The state of courses moves with time so keep it short: a
+# course may be ranked in its previous state for this long after one of its course runs
+# opens or closes. Writing to the courses index or to the index of an object naming facets
+# evicts the cached responses, except for the partial updates of course runs synchronized
+# from an LMS: responses may miss them for this long. Set it to 0 to disable the cache.
+ES_COURSES_CACHE_TIMEOUT = 60
+
+# Serve autocomplete requests from a prefix index of the completion inputs of each index
+# kept in the memory of each process instead of querying Elasticsearch. The prefix index of
+# an index is loaded again after documents are written to it, which requires a search
+# cache shared by all processes. Options are ordered alphabetically by their normalized
+# matching input whereas the completion suggester orders them by score, then by their
+# original matching input: as Richie's completion inputs have no weight, the orders only
+# differ for inputs that differ by their case, diacritics or punctuation.
+ES_AUTOCOMPLETE_IN_MEMORY = False
+
+# Ranking of courses in search results:
+# - "script": the best state of each course is computed from its course runs by a script
+#   at query time,
+# - "sort_keys": the best state of each course and the date ranking it within its state
+#   are computed at index time. Requires running the `update_course_states` command
+#   periodically so that courses are reindexed when their state changes.
+ES_COURSES_RANKING = "script"
+
 # Use a lazy to enable easier testing by not defining the value at bootstrap time
 ES_INDICES_PREFIX = lazy(
     lambda: getattr(settings, "RICHIE_ES_INDICES_PREFIX", "richie")
@@ -4,44 +4,116 @@ just like it does with ElasticSearch 7.
 """
 
 # pragma pylint: disable=W0221
+import threading
+
 from django.utils.functional import cached_property
 
 from elasticsearch import Elasticsearch, Transport
 from elasticsearch.client import IndicesClient
-from elasticsearch.helpers import bulk
+from elasticsearch.exceptions import HTTP_EXCEPTIONS, TransportError
+from elasticsearch.helpers import bulk, parallel_bulk
 
 # Dummy type used to satisfy the ES6 requirement to have type. "_doc" is conventional,
 # and the actual value of the string does not change anything functionally.
 DOC_TYPE = "_doc"
 
 
+class InstrumentedTransport(Transport):
+    """
+    Transport counting the requests it performs and the attempts it makes to perform them,
+    to report its metrics along with the usage of the pools of its connections.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize the counters of the transport. They are protected by a lock as the
+        transport is shared by the threads of `parallel_bulk`.
+        """
+        self.requests_count = 0
+        self.attempts_count = 0
+        self.counters_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def get_connection(self):
+        """Count each attempt to perform a request: a connection is picked for each."""
+        with self.counters_lock:
+            self.attempts_count += 1
+        return super().get_connection()
+
+    def perform_request(self, *args, **kwargs):
+        """Count each request performed, whatever the number of attempts it takes."""
+        with self.counters_lock:
+            self.requests_count += 1
+        return super().perform_request(*args, **kwargs)
+
+    def get_metrics(self):
+        """
+        Return the number of requests performed and retried by the transport and, for the
+        pool of each of its connections, the number of connections opened, in use and
+        allowed. A pool is saturated when all its allowed connections are in use: requests
+        then open connections that are discarded after use.
+        """
+        pools = []
+        for connection in self.connection_pool.connections:
+            # Only the pools of urllib3 connections (the default) are reported
+            queue = getattr(getattr(connection, "pool", None), "pool", None)
+            if queue is None:
+                continue
+            pools.append(
+                {
+                    "host": connection.host,
+                    "maxsize": queue.maxsize,
+                    # The queue holds the idle connections and placeholders for the
+                    # connections that were not opened yet
+                    "in_use": queue.maxsize - queue.qsize(),
+                    "opened": connection.pool.num_connections,
+                }
+            )
+
+        with self.counters_lock:
+            requests_count = self.requests_count
+            attempts_count = self.attempts_count
+
+        return {
+            "requests": requests_count,
+            "retries": attempts_count - requests_count,
+            "pools": pools,
+        }
+
+
 class ElasticsearchClientCompat7to6(Elasticsearch):
     """
     Compatibility wrapper around the Elasticsearch client from elasticsearch-py that
     handles incompatibilities to let Richie run ES6 and ES7.
     """
 
-    def __init__(self, hosts=None, transport_class=Transport, **kwargs):
+    def __init__(
+        self,
+        hosts=None,
+        transport_class=InstrumentedTransport,
+        es_version=None,
+        on_version_detected=None,
+        **kwargs,
+    ):
         """
-        Instantiate the actual Elasticsearch client, then use it to detect the version
-        of Elasticsearch we're working with.
+        Instantiate the actual Elasticsearch client. The major version of Elasticsearch we're
+        working with can be passed if it is known, otherwise it is detected on first use and
+        passed to the `on_version_detected` callback, if any.
         """
         super().__init__(hosts=hosts, transport_class=transport_class, **kwargs)
+        self.on_version_detected = on_version_detected
+        if es_version is not None:
+            self.__dict__["__es_version__"] = str(es_version)[:1]
 
     @cached_property
     def __es_version__(self):
         """
         First retrieve version from elasticsearch server then returns the cached result
         """
-        return self.info()["version"]["number"][:1]
-
-    # pylint: disable=W0622
-    def get(self, index, id):
-        """
-        Patch the dummy doc type onto document retrieval requests so ES6 accepts the requests.
-        """
-
-        return super().get(index=index, id=id, doc_type=DOC_TYPE)
+        es_version = self.info()["version"]["number"][:1]
+        if self.on_version_detected is not None:
+            self.on_version_detected(es_version)
+        return es_version
 
     def search(self, body=None, index=None, params=None, **kwargs):
         """
@@ -61,6 +133,25 @@ class ElasticsearchClientCompat7to6(Elasticsearch):
 
         return search_response
 
+    def msearch(self, body, index=None, params=None, **kwargs):
+        """
+        Same as `search` for the response of each search of a multi-search that did not
+        fail.
+        """
+        msearch_response = super().msearch(
+            body=body, index=index, params=params or {}, **kwargs
+        )
+
+        if self.__es_version__ == "6":
+            for search_response in msearch_response["responses"]:
+                if "hits" in search_response:
+                    search_response["hits"]["total"] = {
+                        "value": search_response["hits"]["total"],
+                        "relation": "eq",
+                    }
+
+        return msearch_response
+
 
 class ElasticsearchIndicesClientCompat7to6(IndicesClient):
     """
@@ -97,16 +188,55 @@ class ElasticsearchIndicesClientCompat7to6(IndicesClient):
         return super().put_mapping(body, index=index, params=params or {})
 
 
+def get_search_error(search_response):
+    """
+    Return the exception the client would have raised for a search that failed in a
+    multi-search, from the error reported in its response.
+    """
+    status_code = search_response.get("status", 500)
+    error_message = search_response["error"]
+    if isinstance(error_message, dict) and "type" in error_message:
+        error_message = error_message["type"]
+    return HTTP_EXCEPTIONS.get(status_code, TransportError)(
+        status_code, error_message, search_response
+    )
+
+
+def is_es6_client(client):
+    """
+    Return True if the client targets Elasticsearch 6. Only the clients of the compatibility
+    layer may do so: plain clients are built once the version is known not to be 6.
+    """
+    return (
+        isinstance(client, ElasticsearchClientCompat7to6)
+        and client.__es_version__ == "6"
+    )
+
+
 def bulk_compat_7_to_6(client, actions, *args, stats_only=False, **kwargs):
     """
     Patch a dummy type on all actions to satisfy the requirement for ES6. As types are not
     actually used for anything, we can use the same value everywhere.
     """
-    if client.__es_version__ == "6":
+    if is_es6_client(client):
         # Use a generator expression instead of a for loop to keep actions lazy
         actions = ({**action, "_type": DOC_TYPE} for action in actions)
 
     bulk(client, actions, stats_only=stats_only, *args, **kwargs)
 
 
+def parallel_bulk_compat_7_to_6(client, actions, *args, **kwargs):
+    """
+    Same as `bulk_compat_7_to_6` but sending the chunks of actions to Elasticsearch from
+    a pool of threads. Return the number of actions that were successfully executed.
+    """
+    if is_es6_client(client):
+        # Use a generator expression instead of a for loop to keep actions lazy
+        actions = ({**action, "_type": DOC_TYPE} for action in actions)
+
+    # The parallel bulk helper is lazy and must be consumed for the requests to be sent
+    return sum(ok for ok, _info in parallel_bulk(client, actions, *args, **kwargs))
+
+
 bulk_compat = bulk_compat_7_to_6
+parallel_bulk_compat = parallel_bulk_compat_7_to_6
@@ -1,9 +1,15 @@
 """Make all filter definitions available from richie.apps.search.filter_definitions."""
 
+import threading
+from types import MappingProxyType
+
 from django.utils.module_loading import import_string
+from django.utils.translation import get_language
+
+from ..cache import PAGE_TREE_TAG, get_tag_version
 
 # pylint: disable=unused-import
-from ..defaults import FILTERS_CONFIGURATION
+from ..defaults import FILTERS_CONFIGURATION, FILTERS_PRESENTATION
 from .base import BaseFilterDefinition, NestingWrapper  # noqa
 from .courses import (  # noqa
     AvailabilityFilterDefinition,
@@ -17,3 +23,63 @@ FILTERS = {
     name: import_string(values["class"])(name, **values["params"])
     for name, values in FILTERS_CONFIGURATION.items()
 }
+
+# Static definitions of the filters held by the process for each language, and the revision
+# of the tree of public pages they were built from as they include the path of base pages
+_static_definitions = {"revision": None, "languages": {}}
+_static_definitions_lock = threading.Lock()
+
+
+def build_static_definitions():
+    """
+    Build the static definitions of the filters listed in `FILTERS_PRESENTATION`, in the
+    active language. They are keyed by name in the order in which filters are presented and
+    each of them includes its position. The table is read-only as it is shared by requests.
+    """
+    definitions = {
+        name: definition
+        for filter_definition in FILTERS.values()
+        for name, definition in filter_definition.get_definition().items()
+        if name in FILTERS_PRESENTATION
+    }
+    return MappingProxyType(
+        {
+            name: MappingProxyType(
+                {
+                    **definitions[name],
+                    "human_name": str(definitions[name]["human_name"]),
+                    "position": FILTERS_PRESENTATION.index(name),
+                }
+            )
+            for name in sorted(definitions, key=FILTERS_PRESENTATION.index)
+        }
+    )
+
+
+def get_static_definitions():
+    """
+    Return the static definitions of the filters in the active language (see
+    `build_static_definitions`). They are built once per process and language, and built
+    again once the revision of the tree of public pages changed in the search cache.
+    """
+    revision = get_tag_version(PAGE_TREE_TAG)
+    if revision is None:
+        # The search cache is not configured: we can't know when base pages change
+        return build_static_definitions()
+
+    language = get_language()
+    try:
+        if _static_definitions["revision"] == revision:
+            return _static_definitions["languages"][language]
+    except KeyError:
+        pass
+
+    # Build the definitions only once per process, even if they are requested by
+    # concurrent requests
+    with _static_definitions_lock:
+        if _static_definitions["revision"] != revision:
+            _static_definitions["languages"] = {}
+            _static_definitions["revision"] = revision
+        if language not in _static_definitions["languages"]:
+            _static_definitions["languages"][language] = build_static_definitions()
+        return _static_definitions["languages"][language]
@@ -428,11 +428,19 @@ class NestingWrapper(BaseFilterDefinition):
             }
         ]
         """
-        queries = [
-            kf_pair
-            for fd in self.filter_definitions.values()
-            for kf_pair in fd.get_query_fragment(data)
-        ]
+        return self.get_nested_query_fragment(
+            [
+                kf_pair
+                for fd in self.filter_definitions.values()
+                for kf_pair in fd.get_query_fragment(data)
+            ]
+        )
+
+    def get_nested_query_fragment(self, queries):
+        """
+        Wrap the key/fragment pairs collected from the nested children in one nested query
+        (see `get_query_fragment` for an example). Return an empty list if there are none.
+        """
         nested_query = {
             "bool": {
                 "must":
@@ -453,6 +461,49 @@ class NestingWrapper(BaseFilterDefinition):
             else []
         )
 
+    def get_choices_query_fragments(self, data, name, choices):
+        """
+        Compute the query fragment of the nesting wrapper for each choice of one of its
+        children, as if this choice was the only value selected for this child.
+
+        This is the same as calling `get_query_fragment` with `{**data, name: [choice]}` for
+        each choice but the query fragments of the other children, which do not depend on
+        the choice, are only computed once.
+
+        Arguments:
+        ----------
+            data (Dict): a dictionary mapping the name of filters with the list of
+                values selected for each filter (see `get_query_fragment`).
+            name (string): the name of the child filter definition of which each choice is
+                applied in turn.
+            choices (Iterable[string]): the values of the child filter definition for which
+                a query fragment should be computed.
+
+        Returns:
+        --------
+            Dict: a dictionary mapping each choice with the list of key/fragment pairs that
+                `get_query_fragment` returns when this choice is the only one selected.
+        """
+        # The queries of the children before and after the one of which we apply the choices,
+        # so that the clauses of the nested query are in the same order as usual
+        queries_before, queries_after = [], []
+        queries = queries_before
+        for fd_name, fd in self.filter_definitions.items():
+            if fd_name == name:
+                queries = queries_after
+            else:
+                queries.extend(fd.get_query_fragment(data))
+
+        fragments = {}
+        for choice in choices:
+            choice_queries = self.filter_definitions[name].get_query_fragment(
+                {**data, name: [choice]}
+            )
+            fragments[choice] = self.get_nested_query_fragment(
+                queries_before + choice_queries + queries_after
+            )
+        return fragments
+
     # pylint: disable=arguments-differ
     def get_aggs_fragment(self, queries, data, *args, **kwargs):
         """
@@ -4,8 +4,6 @@ import re
 from operator import itemgetter
 
 from django import forms
-from django.core.cache import caches
-from django.core.cache.backends.base import InvalidCacheBackendError
 from django.core.exceptions import ImproperlyConfigured
 from django.utils import translation
 from django.utils.translation import gettext_lazy as _
@@ -16,11 +14,12 @@ from cms.api import Page
 from richie.apps.core.defaults import ALL_LANGUAGES_DICT
 
 from ..apps import ES_CLIENT
+from ..cache import get_index_tag, get_search_cache, get_tag_version
 from ..fields.array import ArrayField
 from ..indexers import ES_INDICES
 from ..utils.i18n import get_best_field_language
 from .base import BaseChoicesFilterDefinition, BaseFilterDefinition
-from .helpers import applicable_facet_limit
+from .helpers import applicable_facet_limit, get_child_page_ids
 from .mixins import (
     ChoicesAggsMixin,
     ChoicesQueryMixin,
@@ -39,6 +38,8 @@ class IndexableFilterDefinition(TermsQueryMixin, BaseFilterDefinition):
     def __init__(self, name, reverse_id=None, **kwargs):
         self.reverse_id = reverse_id
         self._base_page = None
+        self._titles = {}
+        self._titles_version = None
         super().__init__(name, **kwargs)
 
     @property
@@ -70,38 +71,37 @@ class IndexableFilterDefinition(TermsQueryMixin, BaseFilterDefinition):
         """Do not limit which facets are computed by default."""
         return ".*"
 
-    # pylint: disable=unused-argument,arguments-differ
-    def get_aggs_fragment(self, queries, data, *args, **kwargs):
+    def get_aggs_include(self, data):
         """
-        Build the aggregations as a term query that counts all the different values assigned
-        to the field.
+        Return the values for which facets are computed: either a regex or a list.
         """
         # Look the aggregations parameters in the form data (either [filter]_children_aggs or
         # [filter]_aggs), and default to the filter definition's aggs_include.
         if data[f"{self.name:s}_children_aggs"]:
-            # Cache the request for children of the relevant parent
-            parent_id = data[f"{self.name:s}_children_aggs"]
-            cache_key = f"filter_definition_{self.name}_aggs_include_{parent_id}"
-            try:
-                cache = caches["search"]
-                include = cache.get(cache_key)
-            except InvalidCacheBackendError:
-                cache = None
-                include = None
-
-            if include is None:
-                # Add all child pages of the given parent to the included aggs
-                include = [
-                    str(page_id)
-                    for page_id in Page.objects.get(id=parent_id)
-                    .get_child_pages()
-                    .values_list("id", flat=True)
-                ]
-                if cache is not None:
-                    cache.set(cache_key, include)
+            # Add all child pages of the given parent to the included aggs
+            return get_child_page_ids(data[f"{self.name:s}_children_aggs"])
 
-        else:
-            include = data[f"{self.name:s}_aggs"] or self.aggs_include
+        return data[f"{self.name:s}_aggs"] or self.aggs_include
+
+    @staticmethod
+    def get_value_included(include):
+        """
+        Return a function checking if a value matches an include filter, which can be
+        either a regex or a list.
+        """
+        if isinstance(include, str):
+            # The Elasticsearch include regex matches exact values so we must do the same
+            # with `fullmatch`. Compile it once instead of for each value.
+            return re.compile(include).fullmatch
+        return include.__contains__
+
+    # pylint: disable=unused-argument,arguments-differ
+    def get_aggs_fragment(self, queries, data, *args, **kwargs):
+        """
+        Build the aggregations as a term query that counts all the different values assigned
+        to the field.
+        """
+        include = self.get_aggs_include(data)
 
         # Use all the query fragments from the queries *but* the one(s) that filter on the
         # current filter
@@ -149,20 +149,9 @@ class IndexableFilterDefinition(TermsQueryMixin, BaseFilterDefinition):
             }
         }
 
-        def value_included(value, include):
-            """
-            Do not build aggregations for values from query string if they do not match
-            the current include filter.
-            Use a function to perform the check as the include filter can be either a regex
-            or a list.
-            """
-            try:
-                # The Elasticsearch include regex matches exact values so we must do the same
-                # by adding ^ (resp. $) at the beginning (resp. at the end) of the pattern.
-                return re.match(f"^{include:s}$", value)
-            # Trying to build the regex with a list will trigger a TypeError
-            except TypeError:
-                return value in include
+        # Do not build aggregations for values from query string if they do not match
+        # the current include filter
+        value_included = self.get_value_included(include)
 
         # Filters aggregation for values that were selected in the querystring (we must force
         # them because they may not be in the n top facet counts but we must make sure we keep
@@ -184,7 +173,7 @@ class IndexableFilterDefinition(TermsQueryMixin, BaseFilterDefinition):
                     }
                 }
                 for value in data.get(self.name, [])
-                if value_included(value, include)
+                if value_included(value)
             }
         )
 
@@ -212,6 +201,95 @@ class IndexableFilterDefinition(TermsQueryMixin, BaseFilterDefinition):
             ),
         }
 
+    def get_known_keys(self, data):
+        """
+        Return the keys of the facets to present that are known before the aggregations
+        are computed, so that their titles can be fetched along with the search: the values
+        selected in the querystring and, if they are all presented, the included values.
+        """
+        include = self.get_aggs_include(data)
+        value_included = self.get_value_included(include)
+        keys = [value for value in data.get(self.name, []) if value_included(value)]
+        # All the included values are presented if they fit in the facet limit
+        facet_limit = applicable_facet_limit(data, self.name)
+        if not isinstance(include, str) and len(include) <= facet_limit:
+            keys.extend(include)
+        return list(dict.fromkeys(keys))
+
+    def get_cached_titles(self, keys):
+        """
+        Return the titles in all languages that are cached for a list of indexed objects'
+        ids, as a dictionary mapping ids to titles, and the list of ids whose titles are not
+        cached.
+
+        Titles are cached in the process and in the search cache under a key that embeds
+        the version of the tag of their index, so that they are all refreshed as soon as
+        documents are written to this index (e.g. when one of its pages is published or
+        when indices are regenerated).
+        """
+        index_name = getattr(ES_INDICES, self.term).index_name
+        version = get_tag_version(get_index_tag(index_name))
+        if version is None:
+            # The search cache is not configured: we can't know when titles change
+            self._titles, self._titles_version = {}, None
+        elif version != self._titles_version:
+            self._titles, self._titles_version = {}, version
+
+        titles = self._titles
+        missing_keys = [key for key in keys if key not in titles]
+        if missing_keys and version is not None:
+            cache_keys = {self.get_titles_cache_key(key): key for key in missing_keys}
+            titles.update(
+                {
+                    cache_keys[cache_key]: title
+                    for cache_key, title in get_search_cache()
+                    .get_many(cache_keys.keys())
+                    .items()
+                }
+            )
+            missing_keys = [key for key in missing_keys if key not in titles]
+
+        return titles, missing_keys
+
+    def get_titles_cache_key(self, key):
+        """Return the key under which the titles of an indexed object are shared."""
+        index_name = getattr(ES_INDICES, self.term).index_name
+        return f"i18n_titles_{index_name!s}_{self._titles_version!s}_{key!s}"
+
+    def get_titles_search(self, keys):
+        """
+        Return the index and the body of the Elasticsearch search that gets the titles of
+        a list of indexed objects' ids.
+        """
+        return getattr(ES_INDICES, self.term).index_name, {
+            # We only need the titles to get the i18n names
+            "_source": ["title"],
+            "query": {"terms": {"_id": keys}},
+            "size": len(keys),
+        }
+
+    def cache_titles(self, hits):
+        """Cache the titles found by a search built with `get_titles_search`."""
+        titles = {doc["_id"]: doc["_source"]["title"] for doc in hits}
+        self._titles.update(titles)
+        if self._titles_version is not None:
+            get_search_cache().set_many(
+                {self.get_titles_cache_key(key): title for key, title in titles.items()}
+            )
+
+    def get_titles(self, keys):
+        """
+        Return the titles in all languages of a list of indexed objects' ids, as a
+        dictionary mapping each id found to its titles. Elasticsearch is only queried for
+        the titles that are not cached.
+        """
+        titles, missing_keys = self.get_cached_titles(keys)
+        if missing_keys:
+            # Get just the documents we need from ElasticSearch
+            index, body = self.get_titles_search(missing_keys)
+            self.cache_titles(ES_CLIENT.search(index=index, body=body)["hits"]["hits"])
+        return titles
+
     def get_i18n_names(self, keys):
         """
         Helper method to get the corresponding internationalized human name for each key in
@@ -220,35 +298,20 @@ class IndexableFilterDefinition(TermsQueryMixin, BaseFilterDefinition):
         like organizations or categories.
         """
         language = translation.get_language()
-        indexer = getattr(ES_INDICES, self.term)
-
-        # Get just the documents we need from ElasticSearch
-        # pylint: disable=unexpected-keyword-arg
-        search_query_response = ES_CLIENT.search(
-            # We only need the titles to get the i18n names
-            _source=["title"],
-            index=indexer.index_name,
-            body={"query": {"terms": {"_id": keys}}},
-            size=len(keys),
-        )
+        titles = self.get_titles(keys)
 
         # Extract the best available language here to avoid handling these kinds of
         # implementation details in the ViewSet
         return {
-            doc["_id"]: get_best_field_language(doc["_source"]["title"], language)
-            for doc in search_query_response["hits"]["hits"]
+            key: get_best_field_language(titles[key], language)
+            for key in keys
+            if key in titles
         }
 
-    def get_facet_info(self, facets, data, *args, **kwargs):
+    def get_key_counts(self, facets, data):
         """
-        Build the facet information from keys in the current language.
-        Those provide us with the keys and counts that we just have to consume. They come from:
-        - a bucket with the top facets in decreasing order of counts,
-        - specific facets for values that were select in the querystring (we must force them
-          because they may not be in the n top facet counts but we must make sure we keep it
-          so that it remains available as an option so the user sees it and can unselect it)
-
-        We resort to the `get_i18n_names` method to get the internationalized human names.
+        Return the keys and counts of the facets to present, as a dictionary, and whether
+        there are more values than those.
         """
         # Convert the keys & counts from ElasticSearch facets to a more readily consumable format
         #   {
@@ -315,6 +378,21 @@ class IndexableFilterDefinition(TermsQueryMixin, BaseFilterDefinition):
             }
         )
 
+        return key_count_map, has_more_values
+
+    def get_facet_info(self, facets, data, *args, **kwargs):
+        """
+        Build the facet information from keys in the current language.
+        Those provide us with the keys and counts that we just have to consume. They come from:
+        - a bucket with the top facets in decreasing order of counts,
+        - specific facets for values that were select in the querystring (we must force them
+          because they may not be in the n top facet counts but we must make sure we keep it
+          so that it remains available as an option so the user sees it and can unselect it)
+
+        We resort to the `get_i18n_names` method to get the internationalized human names.
+        """
+        key_count_map, has_more_values = self.get_key_counts(facets, data)
+
         # Get internationalized names for all our keys
         key_i18n_name_map = self.get_i18n_names([*key_count_map])
 
@@ -392,26 +470,8 @@ class IndexableHierarchicalFilterDefinition(IndexableFilterDefinition):
         """
         if self.reverse_id:
             if self.base_page:
-                cache_key = f"filter_definition_{self.name}_aggs_include"
-                try:
-                    cache = caches["search"]
-                    aggs_include = cache.get(cache_key)
-                except InvalidCacheBackendError:
-                    cache = None
-                    aggs_include = None
-
-                if aggs_include is None:
-                    # Add all the direct children of the base page to the included aggregations
-                    aggs_include = [
-                        str(page_id)
-                        for page_id in self.base_page.get_child_pages().values_list(
-                            "id", flat=True
-                        )
-                    ]
-                    if cache is not None:
-                        cache.set(cache_key, aggs_include)
-
-                return aggs_include
+                # Add all the direct children of the base page to the included aggregations
+                return get_child_page_ids(self.base_page.id)
             return []
 
         return super().aggs_include
@@ -489,8 +549,16 @@ class LanguagesFilterDefinition(
         return ALL_LANGUAGES_DICT
 
     def get_fragment_map(self):
-        """Compute query fragments for each language defined in the project's settings."""
-        return {
-            language: [{"term": {"course_runs.languages": language}}]
-            for language in ALL_LANGUAGES_DICT
-        }
+        """
+        Compute query fragments for each language defined in the project's settings. They
+        do not change so they are computed only once, on first use.
+        """
+        try:
+            return self._fragment_map
+        except AttributeError:
+            # pylint: disable=attribute-defined-outside-init
+            self._fragment_map = {
+                language: [{"term": {"course_runs.languages": language}}]
+                for language in ALL_LANGUAGES_DICT
+            }
+            return self._fragment_map
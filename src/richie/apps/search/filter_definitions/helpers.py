@@ -1,7 +1,17 @@
 """Common helpers for different kinds of filter definitions."""
 
+import threading
+
+from cms.models import Page
+
+from ..cache import PAGE_TREE_TAG, get_tag_version
 from ..defaults import FACET_COUNTS_DEFAULT_LIMIT, FACET_COUNTS_MAX_LIMIT
 
+# Snapshot of the tree of public pages held by the process and the revision of the tree
+# it was built from
+_page_tree = {"revision": None, "children": {}}
+_page_tree_lock = threading.Lock()
+
 
 def applicable_facet_limit(data, filter_name):
     """
@@ -17,3 +27,50 @@ def applicable_facet_limit(data, filter_name):
         )
     except KeyError:
         return FACET_COUNTS_DEFAULT_LIMIT
+
+
+def load_page_tree():
+    """
+    Return the ids of the children of each public page, by id of their parent, as strings.
+    The whole tree is read in one query and children are ordered as in the CMS.
+    """
+    pages = list(
+        Page.objects.filter(publisher_is_draft=False)
+        .order_by("node__path")
+        .values_list("id", "node_id", "node__parent_id")
+    )
+    page_ids = {node_id: str(page_id) for page_id, node_id, _parent_node_id in pages}
+
+    children = {}
+    for page_id, _node_id, parent_node_id in pages:
+        if parent_node_id in page_ids:
+            children.setdefault(page_ids[parent_node_id], []).append(str(page_id))
+
+    return children
+
+
+def get_child_page_ids(page_id):
+    """
+    Return the ids of the public pages that are direct children of a public page, as
+    strings. They are read from the snapshot of the tree of public pages held by the
+    process, which is built again once the revision of the tree changed in the search cache.
+    """
+    revision = get_tag_version(PAGE_TREE_TAG)
+    if revision is None:
+        # The search cache is not configured: we can't know when the tree changes
+        return [
+            str(child_id)
+            for child_id in Page.objects.get(id=page_id)
+            .get_child_pages()
+            .values_list("id", flat=True)
+        ]
+
+    if _page_tree["revision"] != revision:
+        # Build the snapshot only once per process, even if it is requested by
+        # concurrent requests
+        with _page_tree_lock:
+            if _page_tree["revision"] != revision:
+                _page_tree["children"] = load_page_tree()
+                _page_tree["revision"] = revision
+
+    return list(_page_tree["children"].get(str(page_id), []))
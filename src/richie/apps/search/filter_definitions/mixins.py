@@ -36,24 +36,19 @@ class ChoicesAggsMixin:
         """
         Build the aggregations as a set of filters, one for each possible value of the field.
         """
+        # Use all the query fragments from the queries *but* the one(s) that filter on the
+        # current filter: we manually add back the only one that is relevant to each choice.
+        filter_fragments = [
+            clause
+            for kf_pair in queries
+            for clause in kf_pair["fragment"]
+            if kf_pair["key"] is not self.name
+        ]
         return {
             # Create a custom aggregation for each possible choice for this filter
             # eg `availability@coming_soon` & `availability@current` & `availability@open`
             f"{self.name:s}@{choice_key:s}": {
-                "filter": {
-                    "bool": {
-                        # Use all the query fragments from the queries *but* the one(s) that
-                        # filter on the current filter: we manually add back the only one that
-                        # is relevant to the current choice.
-                        "must": choice_fragment
-                        + [
-                            clause
-                            for kf_pair in queries
-                            for clause in kf_pair["fragment"]
-                            if kf_pair["key"] is not self.name
-                        ]
-                    }
-                }
+                "filter": {"bool": {"must": choice_fragment + filter_fragments}}
             }
             for choice_key, choice_fragment in self.get_fragment_map().items()
         }
@@ -105,31 +100,31 @@ class NestedChoicesAggsMixin:
                 }
             }
 
-        This can only be built by calling the parent NestingWrapper with customized filter data.
+        This can only be built by calling the parent NestingWrapper with customized filter data,
+        which builds the query fragments of the other nested fields only once for all choices.
         """
+        # Use all the query fragments from the queries (the nesting parent is responsible for
+        # excluding the queries related to nested fields so we have to manually add them,
+        # making sure to apply on the current field only the current choice.
+        filter_fragments = [
+            clause for kf_pair in queries for clause in kf_pair["fragment"]
+        ]
         return {
             # Create a custom aggregation for each possible choice for this filter
             # eg `availability@coming_soon` & `availability@current` & `availability@open`
             f"{self.name:s}@{choice_key:s}": {
                 "filter": {
                     "bool": {
-                        # Use all the query fragments from the queries (the nesting parent is
-                        # responsible for excluding the queries related to nested fields so we
-                        # have to manually add them, making sure to apply on the current field
-                        # only the current choice.
-                        "must": [
+                        "must": filter_fragments
+                        + [
                             clause
-                            for kf_pair in (
-                                queries
-                                + parent.get_query_fragment(
-                                    # override data with only the current choice
-                                    {**data, self.name: [choice_key]}
-                                )
-                            )
+                            for kf_pair in nested_queries
                             for clause in kf_pair["fragment"]
                         ]
                     }
                 }
             }
-            for choice_key, choice_fragment in self.get_fragment_map().items()
+            for choice_key, nested_queries in parent.get_choices_query_fragments(
+                data, self.name, self.get_fragment_map()
+            ).items()
         }
@@ -2,10 +2,9 @@
 Validate and clean request parameters for our endpoints using Django forms
 """
 
-from functools import reduce
-
 from django import forms
 from django.conf import settings
+from django.utils.functional import cached_property
 from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 
@@ -13,12 +12,13 @@ import arrow
 
 from richie.apps.courses.models import CourseState
 
-from .defaults import QUERY_ANALYZERS, RELATED_CONTENT_BOOST
+from .defaults import ES_COURSES_RANKING, QUERY_ANALYZERS, RELATED_CONTENT_BOOST
 from .filter_definitions import (
     FILTERS,
     AvailabilityFilterDefinition,
     BaseFilterDefinition,
 )
+from .utils.cursors import decode_cursor
 
 # Instantiate filter fields for each filter defined in settings
 # It is of the form:
@@ -60,6 +60,27 @@ class SearchForm(forms.Form):
     query = forms.CharField(required=False, min_length=3, max_length=100)
     offset = forms.IntegerField(required=False, min_value=0, initial=0)
     scope = forms.ChoiceField(required=False, choices=SCOPE_CHOICES)
+    # Opaque cursor returned with a page of results to fetch the next page. Passing it
+    # empty requests the first page of results paginated with cursors.
+    cursor = forms.CharField(required=False, max_length=1000)
+
+    def clean_cursor(self):
+        """
+        Decode the cursor to the values it holds if one was passed. Return an empty dictionary
+        if the cursor is passed empty to request the first page of results and None if it is
+        not passed at all, in which case results are paginated with the offset.
+        """
+        if "cursor" not in self.data:
+            return None
+
+        cursor = self.cleaned_data["cursor"]
+        if not cursor:
+            return {}
+
+        try:
+            return decode_cursor(cursor)
+        except ValueError as error:
+            raise forms.ValidationError(_("Invalid cursor.")) from error
 
 
 class CourseSearchForm(SearchForm):
@@ -76,6 +97,8 @@ class CourseSearchForm(SearchForm):
             (BaseFilterDefinition.SORTING_NAME, _("Sort alphabetically")),
         ],
     )
+    # Token returned with the facets of a search to fetch its next pages without them
+    facets_token = forms.CharField(required=False, max_length=40)
 
     def __init__(self, *args, data=None, **kwargs):
         """
@@ -129,6 +152,18 @@ class CourseSearchForm(SearchForm):
 
         return availabilities
 
+    @cached_property
+    def ms_since_epoch(self):
+        """
+        Return the date, in milliseconds since epoch, from which the state of courses is
+        computed to rank them. It is carried by cursors so that the ranking of courses
+        does not move with time while their pages of results are fetched.
+        """
+        cursor = self.cleaned_data.get("cursor") or {}
+        if isinstance(cursor.get("now"), (int, float)):
+            return cursor["now"]
+        return arrow.utcnow().timestamp() * 1000
+
     def get_script_fields(self):
         """
         Build the part of the Elasticseach query that defines script fields ie fields that can not
@@ -147,17 +182,7 @@ class CourseSearchForm(SearchForm):
                     "id": "state_field",
                     "params": {
                         "languages": self.cleaned_data.get("languages") or None,
-                        "ms_since_epoch": arrow.utcnow().int_timestamp * 1000,
-                        "states": self.states,
-                    },
-                }
-            },
-            "offer_fields": {
-                "script": {
-                    "id": "offer_fields",
-                    "params": {
-                        "languages": self.cleaned_data.get("languages") or None,
-                        "ms_since_epoch": arrow.utcnow().int_timestamp * 1000,
+                        "ms_since_epoch": self.ms_since_epoch,
                         "states": self.states,
                     },
                 }
@@ -186,7 +211,7 @@ class CourseSearchForm(SearchForm):
 
         # Add the query fragments of each filter definition to the list of queries
         for filter_definition in FILTERS.values():
-            queries = queries + filter_definition.get_query_fragment(self.cleaned_data)
+            queries.extend(filter_definition.get_query_fragment(self.cleaned_data))
 
         # Full text search is a regular (multilingual) match query
         full_text = self.cleaned_data.get("query")
@@ -247,6 +272,35 @@ class CourseSearchForm(SearchForm):
 
         return queries
 
+    def get_score_script(self):
+        """
+        Return the script ranking courses by the best state of their course runs.
+
+        The sort keys computed at index time can only be used when the ranking is not
+        impacted by filters on the languages or the states of course runs.
+        """
+        languages = self.cleaned_data.get("languages") or None
+        ms_since_epoch = self.ms_since_epoch
+        if (
+            getattr(settings, "RICHIE_ES_COURSES_RANKING", ES_COURSES_RANKING)
+            == "sort_keys"
+            and languages is None
+            and self.states is None
+        ):
+            return {
+                "id": "score_sort_keys",
+                "params": {"ms_since_epoch": ms_since_epoch},
+            }
+
+        return {
+            "id": "score",
+            "params": {
+                "languages": languages,
+                "ms_since_epoch": ms_since_epoch,
+                "states": self.states,
+            },
+        }
+
     def build_es_query(self):
         """
         Build the actual Elasticsearch search query and aggregation query from the fragments
@@ -283,36 +337,19 @@ class CourseSearchForm(SearchForm):
                     }
                 },
                 "boost_mode": "replace",
-                "script_score": {
-                    "script": {
-                        "id": "score",
-                        "params": {
-                            "languages": self.cleaned_data.get("languages") or None,
-                            "ms_since_epoch": arrow.utcnow().timestamp() * 1000,
-                            "states": self.states,
-                        },
-                    }
-                },
+                "script_score": {"script": self.get_score_script()},
             }
         }
 
         # Concatenate our hardcoded filters query fragments with organizations and categories
         # terms aggregations build on-the-fly
-        aggs = {
-            "all_courses": {
-                "global": {},
-                "aggregations": reduce(
-                    # Merge all the partial aggregations dicts together
-                    lambda acc, aggs_fragment: {**acc, **aggs_fragment},
-                    # Generate a partial aggregations dict (an aggs_fragment) for each filter
-                    [
-                        filter.get_aggs_fragment(queries, self.cleaned_data)
-                        for filter in FILTERS.values()
-                    ],
-                    {},
-                ),
-            }
-        }
+        aggregations = {}
+        for filter_definition in FILTERS.values():
+            # Merge all the partial aggregations dicts together
+            aggregations.update(
+                filter_definition.get_aggs_fragment(queries, self.cleaned_data)
+            )
+        aggs = {"all_courses": {"global": {}, "aggregations": aggregations}}
 
         return (
             self.cleaned_data.get("limit"),
@@ -3,31 +3,109 @@ ElasticSearch indices utilities.
 """
 
 import logging
+import multiprocessing
 import re
 from functools import reduce
 
 from django.conf import settings
+from django.db import connections
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from elasticsearch.exceptions import NotFoundError, RequestError
+from elasticsearch.helpers import bulk, parallel_bulk
 
-from .apps import ES_CLIENT, ES_INDICES_CLIENT
-from .defaults import ES_CHUNK_SIZE, ES_INDICES_PREFIX
-from .elasticsearch import bulk_compat
+from . import apps
+from .apps import ES_BULK_CLIENT, ES_INDICES_CLIENT
+from .cache import get_index_tag, invalidate_tags
+from .defaults import ES_BULK_THREAD_COUNT, ES_CHUNK_SIZE, ES_INDICES_PREFIX
+from .elasticsearch import (
+    ElasticsearchClientCompat7to6,
+    bulk_compat,
+    parallel_bulk_compat,
+)
 from .indexers import ES_INDICES
 from .text_indexing import ANALYSIS_SETTINGS
 
 logger = logging.getLogger(__name__)
 
+# Key under which the date of the last indexing is stored in the "_meta" field of the
+# mapping of each index. It is used as high-water mark to update indices incrementally.
+INDEXED_AT_META_KEY = "richie_indexed_at"
 
-def richie_bulk(actions):
-    """Wrap bulk helper to set default parameters."""
-    return bulk_compat(
-        actions=actions,
-        chunk_size=getattr(settings, "RICHIE_ES_CHUNK_SIZE", ES_CHUNK_SIZE),
-        client=ES_CLIENT,
-        stats_only=True,
-    )
+
+def track_indices(actions, indices):
+    """
+    Collect the names of the indices targeted by actions. Lists of actions are returned
+    as is, other iterables are wrapped to collect them as they are consumed.
+    """
+    if isinstance(actions, list):
+        indices.update(action.get("_index") for action in actions)
+        return actions
+    return track_iterated_indices(actions, indices)
+
+
+def track_iterated_indices(actions, indices):
+    """Collect the names of the indices targeted by actions as they are consumed."""
+    for action in actions:
+        indices.add(action.get("_index"))
+        yield action
+
+
+def invalidate_indices_tags(indices):
+    """
+    Make the search cache entries that depend on the content of the indices passed in
+    argument stale.
+    """
+    invalidate_tags([get_index_tag(index) for index in indices if index])
+
+
+def richie_bulk(actions, invalidate_cache=True):
+    """
+    Wrap bulk helper to set default parameters and make the search cache entries that
+    depend on the content of the indices stale, unless `invalidate_cache` is False for
+    updates that cached entries can miss until they expire.
+    """
+    indices = set()
+    kwargs = {
+        "actions": track_indices(actions, indices),
+        "chunk_size": getattr(settings, "RICHIE_ES_CHUNK_SIZE", ES_CHUNK_SIZE),
+        "client": ES_BULK_CLIENT,
+        "stats_only": True,
+    }
+    try:
+        # The compatibility layer is bypassed once the version is known not to be 6
+        if isinstance(ES_BULK_CLIENT, ElasticsearchClientCompat7to6):
+            return bulk_compat(**kwargs)
+        return bulk(**kwargs)
+    finally:
+        if invalidate_cache:
+            invalidate_indices_tags(indices)
+
+
+def richie_parallel_bulk(actions):
+    """
+    Wrap parallel bulk helper to set default parameters and make the search cache entries
+    that depend on the content of the indices stale. Return the number of actions that
+    were successfully executed.
+    """
+    indices = set()
+    kwargs = {
+        "actions": track_indices(actions, indices),
+        "chunk_size": getattr(settings, "RICHIE_ES_CHUNK_SIZE", ES_CHUNK_SIZE),
+        "client": ES_BULK_CLIENT,
+        "thread_count": getattr(
+            settings, "RICHIE_ES_BULK_THREAD_COUNT", ES_BULK_THREAD_COUNT
+        ),
+    }
+    try:
+        # The compatibility layer is bypassed once the version is known not to be 6
+        if isinstance(ES_BULK_CLIENT, ElasticsearchClientCompat7to6):
+            return parallel_bulk_compat(**kwargs)
+        # The parallel bulk helper is lazy and must be consumed for the requests to be sent
+        return sum(ok for ok, _info in parallel_bulk(**kwargs))
+    finally:
+        invalidate_indices_tags(indices)
 
 
 def get_indices_by_alias(existing_indices, alias):
@@ -40,11 +118,11 @@ def get_indices_by_alias(existing_indices, alias):
             yield index, alias
 
 
-def perform_create_index(indexable):
+def create_index(indexable):
     """
-    Create a new index in ElasticSearch from an indexable instance
+    Create a new empty index in ElasticSearch with the settings and mapping of an
+    indexable instance
     """
-    logger.info("Creating the index %s...", indexable.index_name)
     # Create a new index name, suffixing its name with a timestamp
     new_index = f"{indexable.index_name:s}_{timezone.now():%Y-%m-%d-%Hh%Mm%S.%fs}"
 
@@ -59,6 +137,16 @@ def perform_create_index(indexable):
 
     ES_INDICES_CLIENT.put_mapping(body=indexable.mapping, index=new_index)
 
+    return new_index
+
+
+def perform_create_index(indexable):
+    """
+    Create a new index in ElasticSearch from an indexable instance
+    """
+    logger.info("Creating the index %s...", indexable.index_name)
+    new_index = create_index(indexable)
+
     # Populate the new index with data provided from our indexable class
     richie_bulk(indexable.get_es_documents(new_index))
 
@@ -66,12 +154,96 @@ def perform_create_index(indexable):
     return new_index
 
 
-def regenerate_indices():
+def init_indexing_worker():
+    """
+    Give each worker process of the indexing pool its own Elasticsearch connections
+    instead of sharing the ones inherited from the parent process.
+    """
+    global ES_BULK_CLIENT  # pylint: disable=global-statement
+    apps.init_es()
+    ES_BULK_CLIENT = apps.ES_BULK_CLIENT
+
+
+def populate_index_shard(indexable, index, shard):
+    """
+    Populate an index with the documents of one shard of an indexable. This is the task
+    run by each worker process of the indexing pool.
+    """
+    return indexable.index_name, richie_parallel_bulk(
+        indexable.get_es_documents(index, shard=shard)
+    )
+
+
+def perform_create_indices_in_parallel(indexables, workers):
+    """
+    Create new indices in ElasticSearch from a list of indexables, spreading the
+    generation of their documents across a pool of worker processes.
+
+    The primary keys of each indexable are split in as many shards as there are workers
+    and each shard is handled by a worker with its own database connection.
+    """
+    indices = []
+    for indexable in indexables:
+        logger.info("Creating the index %s...", indexable.index_name)
+        indices.append((create_index(indexable), indexable))
+
+    tasks = [
+        (indexable, index, (shard_index, workers))
+        for index, indexable in indices
+        for shard_index in range(workers)
+    ]
+
+    # Database connections must not be shared with the worker processes: close them
+    # before forking so that each worker opens its own connection on first query.
+    connections.close_all()
+
+    logger.info("Populating ES indices with %d workers...", workers)
+    with multiprocessing.get_context("fork").Pool(
+        processes=workers, initializer=init_indexing_worker
+    ) as pool:
+        for index_name, count in pool.starmap(populate_index_shard, tasks):
+            logger.debug("Indexed %d documents in %s", count, index_name)
+
+    return indices
+
+
+def get_indexed_at(index):
+    """
+    Return the date of the last indexing recorded on an index (or alias), None if the
+    index does not exist or does not record it.
+    """
+    try:
+        mappings = ES_INDICES_CLIENT.get_mapping(index=index)
+    except NotFoundError:
+        return None
+
+    for details in mappings.values():
+        indexed_at = details["mappings"].get("_meta", {}).get(INDEXED_AT_META_KEY)
+        if indexed_at:
+            return parse_datetime(indexed_at)
+    return None
+
+
+def set_indexed_at(index, indexed_at):
+    """Record the date of the last indexing on an index (or alias)."""
+    ES_INDICES_CLIENT.put_mapping(
+        body={"_meta": {INDEXED_AT_META_KEY: indexed_at.isoformat()}}, index=index
+    )
+
+
+def regenerate_indices(workers=None):
     """
     Create new indices for our indexables and replace possible existing indices with
     a new one only once it has successfully built it.
+
+    When a number of workers greater than 1 is given, the documents are generated in
+    parallel by a pool of worker processes.
     """
     logger.info("Regenerating ES indices...")
+    # Record the date before reading the database: objects modified while we are indexing
+    # will be picked-up by the next incremental update
+    indexed_at = timezone.now()
+
     # Get all existing indices once; we'll look up into this list many times
     try:
         existing_indices = ES_INDICES_CLIENT.get_alias("*")
@@ -81,8 +253,14 @@ def regenerate_indices():
 
     logger.info("Creating new ES indices...")
     # Create a new index for each of those modules
-    # NB: we're mapping perform_create_index which produces side-effects
-    indices_to_create = [(perform_create_index(ix), ix) for ix in ES_INDICES]
+    if workers and workers > 1:
+        indices_to_create = perform_create_indices_in_parallel(ES_INDICES, workers)
+    else:
+        # NB: we're mapping perform_create_index which produces side-effects
+        indices_to_create = [(perform_create_index(ix), ix) for ix in ES_INDICES]
+
+    for index, _ix in indices_to_create:
+        set_indexed_at(index, indexed_at)
 
     # Prepare to alias them so they can be swapped-in for the previous versions
     actions_to_create_aliases = [
@@ -145,6 +323,8 @@ def regenerate_indices():
                 raise exception
 
     perform_aliases_update()
+    # The new indices are now live: search results cached from the previous ones are stale
+    invalidate_indices_tags([ix.index_name for ix in ES_INDICES])
 
     for useless_index in useless_indices:
         # Disable keyword arguments checking as elasticsearch-py uses a decorator to list
@@ -155,6 +335,32 @@ def regenerate_indices():
         ES_INDICES_CLIENT.delete(index=useless_index, ignore=[400, 404])
 
 
+def update_indices(since=None):
+    """
+    Update the existing aliased indices in place with the documents of the objects that
+    changed since a date. When no date is given, each index is updated from the date of
+    its last indexing, recorded as high-water mark on the index.
+
+    Documents of deleted or unpublished objects are not removed: this is taken care of
+    by the signals and by regenerating the indices.
+    """
+    logger.info("Updating ES indices...")
+    for indexable in ES_INDICES:
+        alias = indexable.index_name
+        if not ES_INDICES_CLIENT.exists_alias(name=alias):
+            logger.warning(
+                "Index %s does not exist and can't be updated. Regenerate indices first.",
+                alias,
+            )
+            continue
+
+        indexed_at = timezone.now()
+        indexable_since = since or get_indexed_at(alias)
+        logger.info("Updating the index %s since %s...", alias, indexable_since)
+        richie_bulk(indexable.get_es_documents(alias, since=indexable_since))
+        set_indexed_at(alias, indexed_at)
+
+
 def store_es_scripts():
     """
     Iterate over the indexers listed in the settings, import them, and store the scripts
@@ -167,4 +373,4 @@ def store_es_scripts():
                 script_id,
                 indexer.__name__,
             )
-            ES_CLIENT.put_script(id=script_id, body=script_body)
+            ES_BULK_CLIENT.put_script(id=script_id, body=script_body)
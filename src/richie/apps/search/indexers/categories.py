@@ -18,7 +18,11 @@ from ..defaults import ES_INDICES_PREFIX
 from ..forms import ItemSearchForm
 from ..text_indexing import MULTILINGUAL_TEXT
 from ..utils.i18n import get_best_field_language
-from ..utils.indexers import slice_string_for_completion
+from ..utils.indexers import (
+    filter_queryset_changed_since,
+    filter_queryset_for_shard,
+    slice_string_for_completion,
+)
 
 
 class CategoriesIndexer:
@@ -44,12 +48,15 @@ class CategoriesIndexer:
                 }
                 for lang, _ in settings.LANGUAGES
             },
+            # Copy of the document id to break ties in sorts (see `TIE_BREAKER_SORT`)
+            "id": {"type": "keyword"},
             "is_meta": {"type": "boolean"},
             "kind": {"type": "keyword"},
             "nb_children": {"type": "integer"},
             "path": {"type": "keyword"},
             # Not searchable
             "absolute_url": {"type": "object", "enabled": False},
+            "color": {"type": "keyword", "index": False},
             "icon": {"type": "object", "enabled": False},
             "logo": {"type": "object", "enabled": False},
             # Create a raw title field to enable alphabetical sorting
@@ -128,6 +135,9 @@ class CategoriesIndexer:
                 lang: category.extended_object.get_absolute_url(lang)
                 for lang, _ in settings.LANGUAGES
             },
+            # Not displayed but denormalized in the documents of courses (see
+            # `CoursesIndexer.related_fields`)
+            "color": category.color,
             "complete": {
                 language: slice_string_for_completion(title)
                 for language, title in titles.items()
@@ -136,6 +146,7 @@ class CategoriesIndexer:
                 language: " ".join(st) for language, st in description.items()
             },
             "icon": icon_images,
+            "id": category.get_es_id(),
             "is_meta": bool(
                 node.parent is None
                 or node.parent.cms_pages.filter(category__isnull=True).exists()
@@ -149,16 +160,26 @@ class CategoriesIndexer:
         }
 
     @classmethod
-    def get_es_documents(cls, index=None, action="index"):
+    def get_es_documents(cls, index=None, action="index", shard=None, since=None):
         """
-        Loop on all the categories in database and format them for the ElasticSearch index
+        Loop on all the categories in database and format them for the ElasticSearch index.
+        When a shard is given, only its slice of primary keys is processed.
+        When a date is given, only the categories whose page or children pages changed
+        since this date are processed.
         """
         index = index or cls.index_name
 
         for category in (
-            Category.objects.filter(
-                extended_object__publisher_is_draft=False,
-                extended_object__title_set__published=True,
+            filter_queryset_for_shard(
+                filter_queryset_changed_since(
+                    Category.objects.filter(
+                        extended_object__publisher_is_draft=False,
+                        extended_object__title_set__published=True,
+                    ),
+                    since,
+                    related_lookups=("extended_object__node__children__cms_pages",),
+                ),
+                shard,
             )
             .distinct()
             .iterator()
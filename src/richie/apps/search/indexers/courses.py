@@ -4,67 +4,95 @@ ElasticSearch course document management utilities
 
 from collections import defaultdict
 from datetime import datetime
-from functools import reduce
+from itertools import islice
 
 from django.conf import settings
-from django.db.models import Prefetch
+from django.db.models import prefetch_related_objects
 from django.utils import translation
 
 from cms.models import Title
-from djangocms_picture.models import Picture
 
-from richie.apps.search.indexers.organizations import OrganizationsIndexer
 from richie.plugins.plain_text.models import PlainText
-from richie.plugins.simple_picture.helpers import get_picture_info
 from richie.plugins.simple_text_ckeditor.models import SimpleText
 
-from ...courses.models import (
-    MAX_DATE,
-    CategoryPluginModel,
-    Course,
-    CourseRunCatalogVisibility,
-    CourseState,
-    Licence,
-)
-from ..defaults import ES_INDICES_PREFIX, ES_STATE_WEIGHTS
+from ...courses.models import Course, CourseState
+from ..defaults import ES_CHUNK_SIZE, ES_INDICES_PREFIX, ES_STATE_WEIGHTS
 from ..forms import CourseSearchForm
 from ..text_indexing import MULTILINGUAL_TEXT
 from ..utils.i18n import get_best_field_language
-from ..utils.indexers import get_course_pace, slice_string_for_completion
+from ..utils.indexers import (
+    filter_queryset_changed_since,
+    filter_queryset_for_shard,
+    get_course_pace,
+    slice_string_for_completion,
+)
+from .courses_batch import (
+    get_course_runs_by_page,
+    get_course_runs_doc_values,
+    get_course_runs_state,
+    get_licences_by_page,
+    get_pictures_by_page,
+    get_related_fields_by_page,
+    get_texts_by_page,
+)
+
+# Date of the best course run displayed with the state of courses
+STATE_DISPLAY_DATES = {
+    CourseState.ONGOING_OPEN: "enrollment_end",
+    CourseState.FUTURE_OPEN: "start",
+    CourseState.ARCHIVED_OPEN: "enrollment_end",
+    CourseState.FUTURE_NOT_YET_OPEN: "start",
+}
+
+# Fields of the best course run describing the offer of courses
+OFFER_FIELDS = (
+    "certificate_offer",
+    "certificate_price",
+    "offer",
+    "price",
+    "price_currency",
+    "discounted_price",
+    "discount",
+    "certificate_discounted_price",
+    "certificate_discount",
+)
 
 BEST_STATE_SCRIPT = """
-    DateTimeFormatter formatter = DateTimeFormatter.ofPattern(
-        "yyyy-MM-dd'T'HH:mm:ss[.SSSSSS]XXXXX"
-    );
+    int count = doc['course_runs_ms'].size() / 4;
+    long mask = (1L << 48) - 1;
+    long value;
+    long[][] dates = new long[count][4];
+    for (int j = 0; j < doc['course_runs_ms'].size(); ++j) {
+        value = doc['course_runs_ms'][j];
+        dates[(int) (value >>> 50)][(int) ((value >>> 48) & 3)] = value & mask;
+    }
+
+    // Flag the course runs that are in a desired language
+    boolean[] in_languages = new boolean[count];
+    if (params.languages != null) {
+        String language;
+        for (int j = 0; j < doc['course_runs_languages'].size(); ++j) {
+            language = doc['course_runs_languages'][j];
+            if (params.languages.contains(language.substring(5))) {
+                in_languages[Integer.parseInt(language.substring(0, 4))] = true;
+            }
+        }
+    }
+
     int best_state = 7;
     int best_index = 0;
     long start, end, enrollment_start, enrollment_end;
-    Set intersection;
 
     // Go through the sorted course runs nested under this course to look for the
     // best course run (open for enrollment > future > on-going > archived)
-    for (int i = 0; i < params._source.course_runs.length; ++i) {
-        start = ZonedDateTime.parse(
-            params._source.course_runs[i]['start'], formatter
-        ).toInstant().toEpochMilli();
-        end = ZonedDateTime.parse(
-            params._source.course_runs[i]['end'], formatter
-        ).toInstant().toEpochMilli();
-        enrollment_start = ZonedDateTime.parse(
-            params._source.course_runs[i]['enrollment_start'], formatter
-        ).toInstant().toEpochMilli();
-        enrollment_end = ZonedDateTime.parse(
-            params._source.course_runs[i]['enrollment_end'], formatter
-        ).toInstant().toEpochMilli();
-
-        // Use language sets to check their intersection
-        intersection = new HashSet(params._source.course_runs[i]['languages']);
-        if (params.languages != null) {
-            intersection.retainAll(new HashSet(params.languages))
-        }
+    for (int i = 0; i < count; ++i) {
+        start = dates[i][0];
+        end = dates[i][1];
+        enrollment_start = dates[i][2];
+        enrollment_end = dates[i][3];
 
         // Only consider this course run if it is in a desired language
-        if (params.languages == null || !intersection.isEmpty()) {
+        if (params.languages == null || in_languages[i]) {
             if (start < params.ms_since_epoch) {
                 if (end > params.ms_since_epoch) {
                     if (enrollment_end > params.ms_since_epoch) {
@@ -170,6 +198,25 @@ class CoursesIndexer:
     """
 
     index_name = f"{ES_INDICES_PREFIX}_courses"
+    # Fields of course documents that are denormalized from the pages of related objects,
+    # with the fields of the documents of these related objects they depend on. When one of
+    # these pages is modified, its document is compared with the one currently indexed and
+    # only the course fields depending on a field that changed are rebuilt and sent in
+    # partial updates.
+    related_fields = {
+        "categories": {
+            "categories": ["path", "title"],
+            "categories_names": ["path", "title"],
+            "icon": ["color", "icon", "title"],
+        },
+        "organizations": {
+            "organization_highlighted": ["menu_title", "title"],
+            "organization_highlighted_cover_image": ["logo", "title"],
+            "organizations": ["title"],
+            "organizations_names": ["title"],
+        },
+        "persons": {"persons": ["title"], "persons_names": ["title"]},
+    }
     mapping = {
         "dynamic_templates": MULTILINGUAL_TEXT,
         "properties": {
@@ -193,8 +240,19 @@ class CoursesIndexer:
                     "certificate_discount": {"type": "keyword"},
                 },
             },
+            # Dates and languages of course runs encoded for scripts, which read them from
+            # doc values (see `COURSE_RUN_DATE_FIELDS`):
+            # - one long per date of each course run, packing the index of the course run
+            #   in `course_runs` (bits 50 to 62), the index of the date in `start`, `end`,
+            #   `enrollment_start` and `enrollment_end` (bits 48 and 49) and the date in
+            #   milliseconds since epoch (bits 0 to 47),
+            # - one keyword per language of each course run, "<index on 4 digits>:<language>".
+            "course_runs_ms": {"type": "long", "index": False},
+            "course_runs_languages": {"type": "keyword", "index": False},
             # Keywords
             "categories": {"type": "keyword"},
+            # Copy of the document id to break ties in sorts (see `TIE_BREAKER_SORT`)
+            "id": {"type": "keyword"},
             "licences": {"type": "keyword"},
             "organizations": {"type": "keyword"},
             "persons": {"type": "keyword"},
@@ -217,6 +275,12 @@ class CoursesIndexer:
             },
             "is_new": {"type": "boolean"},
             "is_listed": {"type": "boolean"},
+            # Best state of the course runs and next time it changes
+            "best_state": {"type": "integer"},
+            "state_transition_at": {"type": "date"},
+            # Date (in milliseconds since epoch) ranking the course among the courses
+            # in the same state
+            "state_sort_ms": {"type": "long"},
             # Not searchable
             "absolute_url": {"type": "object", "enabled": False},
             "cover_image": {"type": "object", "enabled": False},
@@ -317,9 +381,7 @@ class CoursesIndexer:
                     return (_score + 1) * (
                         {weight_0:d} * params.ms_since_epoch + Math.max(
                             0,
-                            2 * params.ms_since_epoch - ZonedDateTime.parse(
-                                params._source.course_runs[best_index]['enrollment_end'], formatter
-                            ).toInstant().toEpochMilli()
+                            2 * params.ms_since_epoch - dates[best_index][3]
                         )
                     );
                 }}
@@ -330,9 +392,7 @@ class CoursesIndexer:
                     return (_score + 1) * (
                         {weight_1:d} * params.ms_since_epoch + Math.max(
                             0,
-                            2 * params.ms_since_epoch - ZonedDateTime.parse(
-                                params._source.course_runs[best_index]['start'], formatter
-                            ).toInstant().toEpochMilli()
+                            2 * params.ms_since_epoch - dates[best_index][0]
                         )
                     );
                 }}
@@ -343,9 +403,7 @@ class CoursesIndexer:
                     return (_score + 1) * (
                         {weight_2:d} * params.ms_since_epoch + Math.max(
                             0,
-                            2 * params.ms_since_epoch - ZonedDateTime.parse(
-                                params._source.course_runs[best_index]['enrollment_end'], formatter
-                            ).toInstant().toEpochMilli()
+                            2 * params.ms_since_epoch - dates[best_index][3]
                         )
                     );
                 }}
@@ -356,9 +414,7 @@ class CoursesIndexer:
                     return (_score + 1) * (
                         {weight_3:d} * params.ms_since_epoch + Math.max(
                             0,
-                            2 * params.ms_since_epoch - ZonedDateTime.parse(
-                                params._source.course_runs[best_index]['start'], formatter
-                            ).toInstant().toEpochMilli()
+                            2 * params.ms_since_epoch - dates[best_index][0]
                         )
                     );
                 }}
@@ -368,9 +424,7 @@ class CoursesIndexer:
                     return (_score + 1) * (
                         {weight_4:d} * params.ms_since_epoch + Math.max(
                             0,
-                            2 * params.ms_since_epoch - ZonedDateTime.parse(
-                                params._source.course_runs[best_index]['start'], formatter
-                            ).toInstant().toEpochMilli()
+                            2 * params.ms_since_epoch - dates[best_index][0]
                         )
                     );
                 }}
@@ -380,9 +434,7 @@ class CoursesIndexer:
                     return (_score + 1) * (
                         {weight_5:d} * params.ms_since_epoch + Math.max(
                             0,
-                            2 * params.ms_since_epoch - ZonedDateTime.parse(
-                                params._source.course_runs[best_index]['end'], formatter
-                            ).toInstant().toEpochMilli()
+                            2 * params.ms_since_epoch - dates[best_index][1]
                         )
                     );
                 }}
@@ -391,9 +443,7 @@ class CoursesIndexer:
                     // Ordered by end datetime. The next course to start is displayed
                     // first.
                     return (_score + 1) * (
-                        {weight_6:d} * params.ms_since_epoch + ZonedDateTime.parse(
-                            params._source.course_runs[best_index]['end'], formatter
-                        ).toInstant().toEpochMilli()
+                        {weight_6:d} * params.ms_since_epoch + dates[best_index][1]
                     );
                 }}
                 // The course has no course runs
@@ -406,414 +456,260 @@ class CoursesIndexer:
                 ),
             }
         },
-        # Compute a course's state based on the current state of each of its course runs.
-        "state_field": {
+        # Same ordering as the "score" script above, computed from the best state and the
+        # significant datetime of each course stored in its document at index time
+        # (see `get_course_runs_state`) instead of looping over its course runs. It is only
+        # relevant when search results are not filtered by languages or states.
+        "score_sort_keys": {
             "script": {
                 "lang": "painless",
-                "source": BEST_STATE_SCRIPT
-                + """
-                if (best_state == 0) {
-                    // The course is on-going and open
-                    // Return the date of end of enrollment
-                    return [
-                        'priority': 0,
-                        'date_time': params._source.course_runs[best_index][
-                            'enrollment_end']
-                    ];
-                }
-                else if (best_state == 1) {
-                    // The course is future and open
-                    // Return the start date
-                    return [
-                        'priority': 1,
-                        'date_time': params._source.course_runs[best_index]['start']
-                    ];
-                }
-                else if (best_state == 2) {
-                    // The course is archived but open
-                    // Return the date of end of enrollment
-                    return [
-                        'priority': 2,
-                        'date_time': params._source.course_runs[best_index][
-                            'enrollment_end']
-                    ];
-                }
-                else if (best_state == 3) {
-                    // The course is future but not yet open for enrollment
-                    // Return the start date
-                    return [
-                        'priority': 3,
-                        'date_time': params._source.course_runs[best_index]['start']
-                    ];
-                }
-                else if (best_state == 4) {
-                    // The course is future but already closed for enrollment
-                    return ['priority': 4];
-                }
-                else if (best_state == 5) {
-                    // The course is on-going and closed for enrollment
-                    return ['priority': 5];
-                }
-                else if (best_state == 6) {
-                    // The course is archived
-                    return ['priority': 6];
-                }
-                else {
+                # pylint: disable-next=consider-using-f-string
+                "source": """
+                if (doc['best_state'].size() == 0 || doc['state_sort_ms'].size() == 0) {{
                     // The course has no course runs
-                    return ['priority': 7];
-                }
-                """,
-            },
+                    return 0;
+                }}
+                int best_state = (int) doc['best_state'].value;
+                long date = doc['state_sort_ms'].value;
+                double[] weights = new double[] {{{weights:s}}};
+                if (best_state == 6) {{
+                    // The course is archived and closed for enrollment
+                    return (_score + 1) * (
+                        weights[best_state] * params.ms_since_epoch + date
+                    );
+                }}
+                return (_score + 1) * (
+                    weights[best_state] * params.ms_since_epoch + Math.max(
+                        0, 2 * params.ms_since_epoch - date
+                    )
+                );
+                """.format(
+                    weights=", ".join(f"{weight:d}" for weight in ES_STATE_WEIGHTS)
+                ),
+            }
         },
-        "offer_fields": {
+        # Compute a course's state based on the current state of each of its course runs.
+        # The index of the best course run is returned so that its dates and offer can
+        # be read from the `_source` of the course document, which is anyway returned.
+        "state_field": {
             "script": {
                 "lang": "painless",
                 "source": BEST_STATE_SCRIPT
                 + """
-                // If the course has no course runs, return the default values
                 if (best_state < 7) {
-                    return [
-                        'certificate_offer':
-                            params._source.course_runs[best_index]['certificate_offer'],
-                        'certificate_price':
-                            params._source.course_runs[best_index]['certificate_price'],
-                        'offer': params._source.course_runs[best_index]['offer'],
-                        'price': params._source.course_runs[best_index]['price'],
-                        'price_currency': params._source.course_runs[best_index]['price_currency'],
-                        'discounted_price':
-                            params._source.course_runs[best_index]['discounted_price'],
-                        'discount': params._source.course_runs[best_index]['discount'],
-                        'certificate_discounted_price':
-                            params._source.course_runs[best_index]['certificate_discounted_price'],
-                        'certificate_discount':
-                            params._source.course_runs[best_index]['certificate_discount']
-                    ];
-                } else {
-                    return [
-                        'certificate_offer': null,
-                        'certificate_price': null,
-                        'offer': null,
-                        'price': null,
-                        'price_currency': null,
-                        'discounted_price': null,
-                        'discount': null,
-                        'certificate_discounted_price': null,
-                        'certificate_discount': null
-                    ];
+                    return ['priority': best_state, 'index': best_index];
                 }
+                // The course has no course runs
+                return ['priority': 7];
                 """,
-            }
+            },
         },
     }
 
-    # pylint: disable=too-many-locals
     @classmethod
     def get_es_document_for_course(cls, course, index=None, action="index"):
         """
         Build an Elasticsearch document from the course instance.
         """
-        index = index or cls.index_name
+        return cls.get_es_documents_for_courses([course], index=index, action=action)[0]
 
-        # Prepare published titles
-        titles = {
-            t.language: t.title
-            for t in Title.objects.filter(page=course.extended_object, published=True)
-        }
-
-        # Prepare cover images
-        cover_images = {}
-        for cover in Picture.objects.filter(
-            cmsplugin_ptr__placeholder__page=course.extended_object,
-            cmsplugin_ptr__placeholder__slot="course_cover",
-        ):
-            language = cover.cmsplugin_ptr.language
-            with translation.override(language):
-                picture_info = get_picture_info(cover, "cover")
-                if picture_info:
-                    cover_images[language] = picture_info
-
-        # Prepare the related category icon
-        icon_images = {}
-        for plugin_model in CategoryPluginModel.objects.filter(
-            cmsplugin_ptr__placeholder__page=course.extended_object_id,
-            cmsplugin_ptr__placeholder__slot="course_icons",
-            cmsplugin_ptr__position=0,
-        ):
-            language = plugin_model.language
-            for icon in Picture.objects.filter(
-                cmsplugin_ptr__language=language,
-                cmsplugin_ptr__placeholder__page=plugin_model.page_id,
-                cmsplugin_ptr__placeholder__slot="icon",
-                cmsplugin_ptr__position=0,
-            ):
-                with translation.override(language):
-                    picture_info = get_picture_info(icon, "icon") or {}
-                    icon_images[language] = {
-                        **picture_info,
-                        "color": plugin_model.page.category.color,
-                        "title": plugin_model.page.get_title(),
-                    }
-
-        # Prepare description texts
-        descriptions = defaultdict(list)
-        for simple_text in SimpleText.objects.filter(
-            cmsplugin_ptr__placeholder__page=course.extended_object,
-            cmsplugin_ptr__placeholder__slot="course_description",
-        ):
-            descriptions[simple_text.cmsplugin_ptr.language].append(simple_text.body)
-
-        # Prepare introduction texts
-        introductions = defaultdict(list)
-        for plain_text in PlainText.objects.filter(
-            cmsplugin_ptr__placeholder__page=course.extended_object,
-            cmsplugin_ptr__placeholder__slot="course_introduction",
-        ):
-            introductions[plain_text.cmsplugin_ptr.language].append(plain_text.body)
-
-        # Prepare localized duration texts
-        duration = {}
-        for language, _ in settings.LANGUAGES:
-            with translation.override(language):
-                duration[language] = course.get_duration_display()
-
-        # Prepare localized effort texts
-        effort = {}
-        for language, _ in settings.LANGUAGES:
-            with translation.override(language):
-                effort[language] = course.get_effort_display()
-
-        # Prepare categories, making sure we get title information for categories
-        # in the same query
-        category_pages = (
-            course.get_root_to_leaf_public_category_pages()
-            .prefetch_related(
-                Prefetch(
-                    "title_set",
-                    to_attr="published_titles",
-                    queryset=Title.objects.filter(published=True),
-                )
-            )
-            .distinct()
-        )
-
-        # Prepare organizations, making sure we get title information for organizations
-        # in the same query
-        organizations = (
-            course.get_organizations()
-            .prefetch_related(
-                Prefetch(
-                    "extended_object__title_set",
-                    to_attr="published_titles",
-                    queryset=Title.objects.filter(published=True),
-                )
-            )
-            .distinct()
-        )
-        organization_main = course.get_main_organization()
-        organization_highlighted = (
-            organizations.get(id=organization_main.id) if organization_main else None
-        )
-        organization_highlighted_cover_image = (
-            OrganizationsIndexer.get_logo_images(organization_main)
-            if organization_main
-            else {}
+    @classmethod
+    def get_es_course_runs_updates(cls, courses, index=None):
+        """
+        Build partial updates replacing only the fields that depend on course runs in the
+        Elasticsearch documents of the courses passed in argument. This is much cheaper
+        than rebuilding the whole documents when only course runs were modified.
+        """
+        courses = list(courses)
+        prefetch_related_objects(
+            courses, "draft_extension", "public_extension", "extended_object__node"
         )
+        course_runs = get_course_runs_by_page(courses)
 
-        # Prepare persons, making sure we get title information for persons
-        # in the same query
-        persons = (
-            course.get_persons()
-            .prefetch_related(
-                Prefetch(
-                    "extended_object__title_set",
-                    to_attr="published_titles",
-                    queryset=Title.objects.filter(published=True),
-                )
-            )
-            .distinct()
-        )
+        return [
+            {
+                "_id": course.get_es_id(),
+                "_index": index or cls.index_name,
+                "_op_type": "update",
+                "doc": {
+                    "course_runs": course_runs[course.extended_object_id],
+                    "is_new": len(course_runs[course.extended_object_id]) == 1,
+                    **get_course_runs_state(course_runs[course.extended_object_id]),
+                    **get_course_runs_doc_values(
+                        course_runs[course.extended_object_id]
+                    ),
+                },
+            }
+            for course in courses
+        ]
 
-        # Prepare course runs
-        # Ordering them by their `end` date is important to optimize sorting and other
-        # computations that require looping on the course runs
-        # Course runs with no start date or no start of enrollment date are ignored as
-        # they are still to be scheduled.
-        course_runs_queryset = (
-            course.course_runs.filter(
-                start__isnull=False,
-                enrollment_start__isnull=False,
-                catalog_visibility=CourseRunCatalogVisibility.COURSE_AND_SEARCH,
-            )
-            .order_by("-end")
-            .values(
-                "start",
-                "end",
-                "enrollment_start",
-                "enrollment_end",
-                "languages",
-                "price",
-                "price_currency",
-                "offer",
-                "discounted_price",
-                "discount",
-                "certificate_price",
-                "certificate_offer",
-                "certificate_discounted_price",
-                "certificate_discount",
-            )
+    @classmethod
+    def get_es_related_updates(cls, courses, fields, index=None):
+        """
+        Build partial updates replacing only the fields passed in argument, among the fields
+        denormalized from the pages of related objects (see `related_fields`), in the
+        Elasticsearch documents of the courses passed in argument.
+        """
+        courses = list(courses)
+        prefetch_related_objects(
+            courses, "draft_extension", "public_extension", "extended_object__node"
         )
+        related_fields = get_related_fields_by_page(courses, fields)
 
-        course_runs = [
+        return [
             {
-                "start": cr["start"],
-                "end": cr["end"] or MAX_DATE,
-                "enrollment_start": cr["enrollment_start"],
-                "enrollment_end": cr["enrollment_end"] or cr["end"] or MAX_DATE,
-                "languages": cr["languages"],
-                "price": cr["price"],
-                "price_currency": cr["price_currency"],
-                "offer": cr["offer"],
-                "discounted_price": cr["discounted_price"],
-                "discount": cr["discount"],
-                "certificate_price": cr["certificate_price"],
-                "certificate_offer": cr["certificate_offer"],
-                "certificate_discounted_price": cr["certificate_discounted_price"],
-                "certificate_discount": cr["certificate_discount"],
+                "_id": course.get_es_id(),
+                "_index": index or cls.index_name,
+                "_op_type": "update",
+                "doc": related_fields[course.extended_object_id],
             }
-            for cr in course_runs_queryset
+            for course in courses
         ]
 
-        licences = (
-            Licence.objects.filter(
-                licencepluginmodel__cmsplugin_ptr__placeholder__page__course=course,
-                licencepluginmodel__cmsplugin_ptr__placeholder__slot="course_license_content",
-            )
-            .distinct()
-            .order_by("id")
-            .values_list("id", flat=True)
+    # pylint: disable=too-many-locals
+    @classmethod
+    def get_es_documents_for_courses(cls, courses, index=None, action="index"):
+        """
+        Build Elasticsearch documents for a chunk of course instances.
+
+        All the rows related to the courses of the chunk are loaded in a fixed number of
+        queries whatever the size of the chunk. The documents are then built in memory.
+        """
+        index = index or cls.index_name
+        courses = list(courses)
+        prefetch_related_objects(
+            courses,
+            "draft_extension",
+            "public_extension",
+            "extended_object__node",
+            # Titles of the course pages are required to compute their absolute urls
+            "extended_object__title_set",
         )
+        page_ids = [course.extended_object_id for course in courses]
 
-        return {
-            "_id": course.get_es_id(),
-            "_index": index,
-            "_op_type": action,
-            "absolute_url": {
-                lang: course.extended_object.get_absolute_url(lang)
-                for lang, _ in settings.LANGUAGES
-            },
-            "categories": [page.category.get_es_id() for page in category_pages],
-            # Index the names of categories to surface them in full text searches
-            "categories_names": reduce(
-                lambda acc, title: {
-                    **acc,
-                    title.language: (
-                        acc[title.language] + [title.title]
-                        if acc.get(title.language)
-                        else [title.title]
-                    ),
-                },
-                [title for page in category_pages for title in page.published_titles],
-                {},
-            ),
-            "code": course.code,
-            "complete": (
-                {
-                    language: slice_string_for_completion(title)
-                    for language, title in titles.items()
-                }
-                if course.is_listed
-                else None
-            ),
-            "course_runs": course_runs,
-            "cover_image": cover_images,
-            "description": {
-                language: " ".join(st) for language, st in descriptions.items()
-            },
-            "duration": duration,
-            "effort": effort,
-            "icon": icon_images,
-            "introduction": {
-                language: " ".join(st) for language, st in introductions.items()
-            },
-            "is_new": len(course_runs) == 1,
-            # If titles is an empty dict, it means the course is not published in any language:
-            "is_listed": bool(course.is_listed and titles),
-            "licences": list(licences),
-            # Pick the highlighted organization from the organizations QuerySet to benefit from
-            # the prefetch of related title sets
-            "organization_highlighted": (
+        # Prepare published titles
+        titles_by_page = defaultdict(dict)
+        for title in Title.objects.filter(page__in=page_ids, published=True):
+            titles_by_page[title.page_id][title.language] = title.title
+
+        cover_images = get_pictures_by_page(page_ids, "course_cover", "cover")
+        descriptions = get_texts_by_page(SimpleText, page_ids, "course_description")
+        introductions = get_texts_by_page(PlainText, page_ids, "course_introduction")
+
+        related_fields = get_related_fields_by_page(
+            courses,
+            [field for fields in cls.related_fields.values() for field in fields],
+        )
+        course_runs = get_course_runs_by_page(courses)
+        licences = get_licences_by_page(page_ids)
+
+        documents = []
+        for course in courses:
+            page_id = course.extended_object_id
+            titles = titles_by_page[page_id]
+
+            # Prepare localized duration and effort texts
+            duration = {}
+            effort = {}
+            for language, _ in settings.LANGUAGES:
+                with translation.override(language):
+                    duration[language] = course.get_duration_display()
+                    effort[language] = course.get_effort_display()
+
+            documents.append(
                 {
-                    title.language: (
-                        title.menu_title if title.menu_title else title.title
-                    )
-                    for title in organization_highlighted.extended_object.published_titles
-                }
-                if organization_highlighted
-                else None
-            ),
-            "organization_highlighted_cover_image": organization_highlighted_cover_image,
-            "organizations": [
-                organization.get_es_id() for organization in organizations
-            ],
-            # Index the names of organizations to surface them in full text searches
-            "organizations_names": reduce(
-                lambda acc, title: {
-                    **acc,
-                    title.language: (
-                        acc[title.language] + [title.title]
-                        if acc.get(title.language)
-                        else [title.title]
+                    "_id": course.get_es_id(),
+                    "_index": index,
+                    "_op_type": action,
+                    "absolute_url": {
+                        lang: course.extended_object.get_absolute_url(lang)
+                        for lang, _ in settings.LANGUAGES
+                    },
+                    # Fields denormalized from categories, organizations and persons
+                    **related_fields[page_id],
+                    "code": course.code,
+                    "complete": (
+                        {
+                            language: slice_string_for_completion(title)
+                            for language, title in titles.items()
+                        }
+                        if course.is_listed
+                        else None
                     ),
-                },
-                [
-                    title
-                    for organization in organizations
-                    for title in organization.extended_object.published_titles
-                ],
-                {},
-            ),
-            "persons": [person.get_es_id() for person in persons],
-            "persons_names": reduce(
-                lambda acc, title: {
-                    **acc,
-                    title.language: (
-                        acc[title.language] + [title.title]
-                        if acc.get(title.language)
-                        else [title.title]
+                    "course_runs": course_runs[page_id],
+                    "cover_image": cover_images[page_id],
+                    "description": descriptions[page_id],
+                    "duration": duration,
+                    "effort": effort,
+                    "id": course.get_es_id(),
+                    "introduction": introductions[page_id],
+                    "is_new": len(course_runs[page_id]) == 1,
+                    **get_course_runs_state(course_runs[page_id]),
+                    **get_course_runs_doc_values(course_runs[page_id]),
+                    # If titles is an empty dict, it means the course is not published in
+                    # any language:
+                    "is_listed": bool(course.is_listed and titles),
+                    "licences": sorted(licences[page_id]),
+                    "pace": (
+                        None
+                        if course.is_self_paced
+                        else get_course_pace(course.effort, course.duration)
                     ),
-                },
-                [
-                    title
-                    for person in persons
-                    for title in person.extended_object.published_titles
-                ],
-                {},
-            ),
-            "pace": (
-                None
-                if course.is_self_paced
-                else get_course_pace(course.effort, course.duration)
-            ),
-            "title": titles,
-        }
+                    "title": titles,
+                }
+            )
+
+        return documents
 
     @classmethod
-    def get_es_documents(cls, index=None, action="index"):
+    def get_es_documents(cls, index=None, action="index", shard=None, since=None):
         """
-        Loop on all the courses in database and format them for the ElasticSearch index
+        Loop on all the courses in database and format them for the ElasticSearch index.
+        Courses are processed in chunks to build their documents with a fixed number of
+        database queries per chunk. When a shard is given, only its slice of primary keys
+        is processed.
+
+        When a date is given, only the courses that changed since this date are processed:
+        a course changed if its page or one of its snapshots changed or if one of the
+        categories, organizations or persons it is linked to, changed.
         """
         index = index or cls.index_name
+        chunk_size = getattr(settings, "RICHIE_ES_CHUNK_SIZE", ES_CHUNK_SIZE)
 
-        for course in (
-            Course.objects.filter(
-                extended_object__publisher_is_draft=False,  # index the public object
-                extended_object__title_set__published=True,  # only index published courses
-                extended_object__node__parent__cms_pages__course__isnull=True,  # exclude snapshots
-            )
+        queryset = Course.objects.filter(
+            extended_object__publisher_is_draft=False,  # index the public object
+            extended_object__title_set__published=True,  # only index published courses
+            extended_object__node__parent__cms_pages__course__isnull=True,  # exclude snapshots
+        )
+        queryset = filter_queryset_changed_since(
+            queryset,
+            since,
+            related_lookups=(
+                # Snapshots hold course runs of the course
+                "extended_object__node__children__cms_pages",
+                # Names and images of related pages are denormalized in course documents
+                *(
+                    f"extended_object__placeholders__cmsplugin__{plugin:s}__page"
+                    for plugin in [
+                        "courses_categorypluginmodel",
+                        "courses_organizationpluginmodel",
+                        "courses_personpluginmodel",
+                    ]
+                ),
+            ),
+        )
+        courses = (
+            filter_queryset_for_shard(queryset, shard)
             .distinct()
-            .iterator()
-        ):
-            yield cls.get_es_document_for_course(course, index=index, action=action)
+            .iterator(chunk_size=chunk_size)
+        )
+        while True:
+            chunk = list(islice(courses, chunk_size))
+            if not chunk:
+                break
+            yield from cls.get_es_documents_for_courses(
+                chunk, index=index, action=action
+            )
 
     @staticmethod
     def format_es_object_for_api(es_course, language=None):
@@ -824,10 +720,16 @@ class CoursesIndexer:
         language = language or translation.get_language()
         source = es_course["_source"]
 
-        # Prepare the state
+        # Prepare the state from the best course run found by the "state_field" script
         state = es_course["fields"]["state"][0]
         try:
-            state["date_time"] = datetime.fromisoformat(state["date_time"])
+            best_course_run = source["course_runs"][state.pop("index")]
+        except KeyError:
+            best_course_run = {}
+        try:
+            state["date_time"] = datetime.fromisoformat(
+                best_course_run[STATE_DISPLAY_DATES[state["priority"]]]
+            )
         except KeyError:
             state["date_time"] = None
 
@@ -862,7 +764,7 @@ class CoursesIndexer:
             ),
             "organizations": source["organizations"],
             "state": CourseState(**state),
-            **es_course["fields"]["offer_fields"][0],
+            **{field: best_course_run.get(field) for field in OFFER_FIELDS},
         }
 
     @staticmethod
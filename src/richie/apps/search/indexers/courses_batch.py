@@ -0,0 +1,604 @@
+"""
+Helpers loading the rows related to a chunk of courses in a fixed number of queries
+whatever the size of the chunk, for the course documents built by `CoursesIndexer`.
+"""
+
+import operator
+from collections import defaultdict
+from functools import reduce
+from operator import itemgetter
+
+from django.db.models import F, Prefetch, Q
+from django.utils import timezone, translation
+
+from cms.models import Page, Title, TreeNode
+from cms.utils import get_current_site, i18n
+from djangocms_picture.models import Picture
+
+from richie.plugins.simple_picture.helpers import get_picture_info
+
+from ...courses.models import (
+    MAX_DATE,
+    Category,
+    CategoryPluginModel,
+    CourseRun,
+    CourseRunCatalogVisibility,
+    CourseState,
+    Licence,
+    Organization,
+    OrganizationPluginModel,
+    Person,
+    PersonPluginModel,
+)
+from ..utils.indexers import get_epoch_ms
+
+# Date of the best course run on which courses in each state are ranked
+STATE_SORT_DATES = {
+    CourseState.ONGOING_OPEN: "enrollment_end",
+    CourseState.FUTURE_OPEN: "start",
+    CourseState.ARCHIVED_OPEN: "enrollment_end",
+    CourseState.FUTURE_NOT_YET_OPEN: "start",
+    CourseState.FUTURE_CLOSED: "start",
+    CourseState.ONGOING_CLOSED: "end",
+    CourseState.ARCHIVED_CLOSED: "end",
+}
+
+# Course run dates are stored in the `course_runs_ms` field of course documents, encoded
+# in a single long value per date so that scripts can read them from doc values, which are
+# sorted, instead of loading and parsing the `_source` of each document:
+# - the index of the course run in the `course_runs` list on bits 50 and above,
+# - the index of the date field in `COURSE_RUN_DATE_FIELDS` on bits 48 and 49,
+# - the date in milliseconds since epoch on the 48 lower bits (enough until year 9999).
+# The languages of each course run are stored in the `course_runs_languages` field as
+# "<index of the course run on 4 digits>:<language>".
+COURSE_RUN_DATE_FIELDS = ("start", "end", "enrollment_start", "enrollment_end")
+COURSE_RUN_INDEX_SHIFT = 50
+COURSE_RUN_FIELD_SHIFT = 48
+COURSE_RUN_MAX_COUNT = 1 << (63 - COURSE_RUN_INDEX_SHIFT)
+
+
+def get_relevant_language(languages, existing_languages, default):
+    """
+    Return the first language of `languages` found in `existing_languages` or the
+    default language if there is none.
+    """
+    return next(
+        (language for language in languages if language in existing_languages), default
+    )
+
+
+def group_titles_by_language(titles):
+    """
+    Group the titles passed in argument by language, in a dictionary mapping each
+    language with the list of titles, in their order.
+    """
+    grouped_titles = defaultdict(list)
+    for title in titles:
+        grouped_titles[title.language].append(title.title)
+    return dict(grouped_titles)
+
+
+def get_page_links_by_page(plugin_model, page_ids):
+    """
+    Collect the plugins linking each page to other pages, as tuples
+    `(language, related page id, plugin position)` in a dictionary keyed by page id.
+    """
+    links = defaultdict(list)
+    for page_id, language, related_page_id, position in plugin_model.objects.filter(
+        cmsplugin_ptr__placeholder__page__in=page_ids
+    ).values_list(
+        "cmsplugin_ptr__placeholder__page",
+        "cmsplugin_ptr__language",
+        "page",
+        "cmsplugin_ptr__position",
+    ):
+        links[page_id].append((language, related_page_id, position))
+    return links
+
+
+def get_related_extensions_by_page(courses, extension_model, plugin_model):
+    """
+    Bulk version of `get_direct_related_page_extensions` for a chunk of courses.
+
+    Returns a dictionary mapping the id of each course page with a list of tuples
+    `(page extension, plugin position)` for the page extensions linked to the course via
+    a plugin, ranked by their `path` to respect the order in the page tree. The published
+    titles of each page extension are prefetched in a `published_titles` attribute.
+    """
+    current_language = translation.get_language()
+    languages = [current_language] + i18n.get_fallback_languages(
+        current_language, site_id=get_current_site().pk
+    )
+
+    plugins_by_page = get_page_links_by_page(
+        plugin_model, [course.extended_object_id for course in courses]
+    )
+
+    extensions = {
+        extension.extended_object_id: extension
+        for extension in extension_model.objects.filter(
+            extended_object__in={
+                related_page_id
+                for plugins in plugins_by_page.values()
+                for _language, related_page_id, _position in plugins
+            }
+        )
+        .select_related("extended_object__node", "public_extension")
+        .prefetch_related(
+            Prefetch(
+                "extended_object__title_set",
+                to_attr="published_titles",
+                queryset=Title.objects.filter(published=True),
+            )
+        )
+    }
+
+    related_extensions = {}
+    for course in courses:
+        plugins = plugins_by_page[course.extended_object_id]
+        relevant_language = get_relevant_language(
+            languages,
+            {language for language, _id, _position in plugins},
+            current_language,
+        )
+
+        positions = {}
+        for language, related_page_id, position in plugins:
+            if language == relevant_language:
+                positions[related_page_id] = min(
+                    position, positions.get(related_page_id, position)
+                )
+
+        related_extensions[course.extended_object_id] = sorted(
+            [
+                (extensions[related_page_id], position)
+                for related_page_id, position in positions.items()
+                if related_page_id in extensions
+                # For a public course, we must filter out page extensions that are not
+                # published in any language
+                and (
+                    course.extended_object.publisher_is_draft
+                    or extensions[related_page_id].extended_object.published_titles
+                )
+            ],
+            key=lambda pair: pair[0].extended_object.node.path,
+        )
+
+    return related_extensions
+
+
+def get_plugins_by_page(plugin_model, page_ids, slot, **filters):
+    """
+    Group the plugins found in a given placeholder of each page by page id, in the order
+    in which they are returned by the database.
+    """
+    plugins = defaultdict(list)
+    queryset = plugin_model.objects.filter(
+        cmsplugin_ptr__placeholder__page__in=page_ids,
+        cmsplugin_ptr__placeholder__slot=slot,
+        **filters,
+    ).annotate(placeholder_page_id=F("cmsplugin_ptr__placeholder__page"))
+    if plugin_model is Picture:
+        queryset = queryset.select_related("picture")
+    for plugin in queryset:
+        plugins[plugin.placeholder_page_id].append(plugin)
+    return plugins
+
+
+def get_pictures_by_page(page_ids, slot, picture_format, keep_empty=False):
+    """
+    Return the information of the pictures found in a given placeholder of each page,
+    by language, in a dictionary keyed by page id. Pictures with no image are skipped
+    unless `keep_empty` is set.
+    """
+    pictures = defaultdict(dict)
+    for page_id, plugins in get_plugins_by_page(Picture, page_ids, slot).items():
+        for picture in plugins:
+            with translation.override(picture.language):
+                picture_info = get_picture_info(picture, picture_format)
+            if picture_info or keep_empty:
+                pictures[page_id][picture.language] = picture_info
+    return pictures
+
+
+def get_texts_by_page(plugin_model, page_ids, slot):
+    """
+    Return the bodies of the text plugins found in a given placeholder of each page,
+    joined by language, in a dictionary keyed by page id.
+    """
+    texts = defaultdict(lambda: defaultdict(list))
+    for page_id, plugins in get_plugins_by_page(plugin_model, page_ids, slot).items():
+        for plugin in plugins:
+            texts[page_id][plugin.language].append(plugin.body)
+    return defaultdict(
+        dict,
+        {
+            page_id: {language: " ".join(bodies) for language, bodies in text.items()}
+            for page_id, text in texts.items()
+        },
+    )
+
+
+def get_icons_by_page(page_ids):
+    """
+    Return the icon of the first category linked to each course page, by language, with
+    the color and title of the category, in a dictionary keyed by page id.
+    """
+    icon_plugins = get_plugins_by_page(
+        CategoryPluginModel, page_ids, "course_icons", cmsplugin_ptr__position=0
+    )
+    category_pages = (
+        Page.objects.select_related("category")
+        .prefetch_related("title_set")
+        .in_bulk(
+            {
+                plugin_model.page_id
+                for plugin_models in icon_plugins.values()
+                for plugin_model in plugin_models
+            }
+        )
+    )
+    icons = get_plugins_by_page(
+        Picture, category_pages.keys(), "icon", cmsplugin_ptr__position=0
+    )
+
+    icon_images = defaultdict(dict)
+    for page_id, plugin_models in icon_plugins.items():
+        for plugin_model in plugin_models:
+            language = plugin_model.language
+            category_page = category_pages[plugin_model.page_id]
+            for icon in icons[plugin_model.page_id]:
+                if icon.language != language:
+                    continue
+                with translation.override(language):
+                    icon_images[page_id][language] = {
+                        **(get_picture_info(icon, "icon") or {}),
+                        "color": category_page.category.color,
+                        "title": category_page.get_title(),
+                    }
+    return icon_images
+
+
+def get_category_pages_by_page(courses):
+    """
+    Return the public pages of the categories linked to each course and of their
+    ancestors, excluding the meta category itself, ranked by path, in a dictionary keyed
+    by course page id. Draft and public pages share the same node in the page tree.
+
+    The published titles of each category page are prefetched in a `published_titles`
+    attribute.
+    """
+    categories = {
+        page_id: {category.extended_object.node.path for category, _ in pairs}
+        for page_id, pairs in get_related_extensions_by_page(
+            courses, Category, CategoryPluginModel
+        ).items()
+    }
+    category_paths = set().union(*categories.values())
+    ancestor_paths = set(
+        Page.objects.filter(
+            node__path__in={
+                path[:length]
+                for path in category_paths
+                for length in range(TreeNode.steplen, len(path), TreeNode.steplen)
+            },
+            node__parent__cms_pages__category__isnull=False,
+            publisher_is_draft=False,
+            title_set__published=True,
+        ).values_list("node__path", flat=True)
+    )
+    category_pages = sorted(
+        Page.objects.filter(
+            node__path__in=category_paths | ancestor_paths,
+            publisher_is_draft=False,
+            title_set__published=True,
+        )
+        .select_related("node", "category__draft_extension")
+        .prefetch_related(
+            Prefetch(
+                "title_set",
+                to_attr="published_titles",
+                queryset=Title.objects.filter(published=True),
+            )
+        )
+        .distinct(),
+        key=lambda page: page.node.path,
+    )
+
+    return {
+        page_id: [
+            page
+            for page in category_pages
+            if page.node.path in course_category_paths
+            or (
+                page.node.path in ancestor_paths
+                and any(p.startswith(page.node.path) for p in course_category_paths)
+            )
+        ]
+        for page_id, course_category_paths in categories.items()
+    }
+
+
+def get_licences_by_page(page_ids):
+    """
+    Return the ids of the licences linked to each course page, in a dictionary keyed by
+    page id.
+    """
+    licences = defaultdict(set)
+    for licence_id, page_id in Licence.objects.filter(
+        licencepluginmodel__cmsplugin_ptr__placeholder__page__in=page_ids,
+        licencepluginmodel__cmsplugin_ptr__placeholder__slot="course_license_content",
+    ).values_list("id", "licencepluginmodel__cmsplugin_ptr__placeholder__page"):
+        licences[page_id].add(licence_id)
+    return licences
+
+
+def get_category_fields_by_page(courses, _fields):
+    """
+    Build the fields of course documents denormalized from the pages of their categories.
+    """
+    return {
+        page_id: {
+            "categories": [page.category.get_es_id() for page in pages],
+            # Index the names of categories to surface them in full text searches
+            "categories_names": group_titles_by_language(
+                title for page in pages for title in page.published_titles
+            ),
+        }
+        for page_id, pages in get_category_pages_by_page(courses).items()
+    }
+
+
+def get_icon_fields_by_page(courses, _fields):
+    """
+    Build the field of course documents denormalized from the category of their icon.
+    """
+    icons = get_icons_by_page([course.extended_object_id for course in courses])
+    return {
+        course.extended_object_id: {"icon": icons[course.extended_object_id]}
+        for course in courses
+    }
+
+
+def get_organization_fields_by_page(courses, fields):
+    """
+    Build the fields of course documents denormalized from the pages of their
+    organizations. The logo of the main organization is only loaded if it is requested.
+    """
+    organizations = get_related_extensions_by_page(
+        courses, Organization, OrganizationPluginModel
+    )
+
+    # The main organization is the first one in order of position in its placeholder
+    main_organizations = {
+        page_id: min(pairs, key=itemgetter(1))[0]
+        for page_id, pairs in organizations.items()
+        if pairs
+    }
+    logos = (
+        get_pictures_by_page(
+            [
+                organization.extended_object_id
+                for organization in main_organizations.values()
+            ],
+            "logo",
+            "logo",
+            keep_empty=True,
+        )
+        if "organization_highlighted_cover_image" in fields
+        else {}
+    )
+
+    values = {}
+    for page_id, pairs in organizations.items():
+        main_organization = main_organizations.get(page_id)
+        values[page_id] = {
+            "organization_highlighted": (
+                {
+                    title.language: title.menu_title or title.title
+                    for title in main_organization.extended_object.published_titles
+                }
+                if main_organization
+                else None
+            ),
+            "organization_highlighted_cover_image": (
+                logos.get(main_organization.extended_object_id, {})
+                if main_organization
+                else {}
+            ),
+            "organizations": [organization.get_es_id() for organization, _ in pairs],
+            # Index the names of organizations to surface them in full text searches
+            "organizations_names": group_titles_by_language(
+                title
+                for organization, _ in pairs
+                for title in organization.extended_object.published_titles
+            ),
+        }
+    return values
+
+
+def get_person_fields_by_page(courses, _fields):
+    """
+    Build the fields of course documents denormalized from the pages of their persons.
+    """
+    return {
+        page_id: {
+            "persons": [person.get_es_id() for person, _ in pairs],
+            "persons_names": group_titles_by_language(
+                title
+                for person, _ in pairs
+                for title in person.extended_object.published_titles
+            ),
+        }
+        for page_id, pairs in get_related_extensions_by_page(
+            courses, Person, PersonPluginModel
+        ).items()
+    }
+
+
+# Functions building the fields of course documents denormalized from related pages, with
+# the fields each of them builds
+RELATED_FIELDS_BUILDERS = (
+    (get_category_fields_by_page, ("categories", "categories_names")),
+    (get_icon_fields_by_page, ("icon",)),
+    (
+        get_organization_fields_by_page,
+        (
+            "organization_highlighted",
+            "organization_highlighted_cover_image",
+            "organizations",
+            "organizations_names",
+        ),
+    ),
+    (get_person_fields_by_page, ("persons", "persons_names")),
+)
+
+
+def get_related_fields_by_page(courses, fields):
+    """
+    Build the fields passed in argument, among the fields of course documents denormalized
+    from the pages of related objects, in a dictionary keyed by course page id. Only the
+    rows required to build these fields are loaded.
+    """
+    values = {course.extended_object_id: {} for course in courses}
+    for builder, built_fields in RELATED_FIELDS_BUILDERS:
+        if not set(fields).intersection(built_fields):
+            continue
+        for page_id, page_values in builder(courses, fields).items():
+            values[page_id].update(
+                (field, value)
+                for field, value in page_values.items()
+                if field in fields
+            )
+    return values
+
+
+def get_course_runs_by_page(courses):
+    """
+    Return the course runs of each course, formatted for its Elasticsearch document, in
+    a dictionary keyed by course page id. The course runs of all the courses are loaded
+    in a single query.
+    """
+    # Ordering them by their `end` date is important to optimize sorting and other
+    # computations that require looping on the course runs
+    # Course runs with no start date or no start of enrollment date are ignored as
+    # they are still to be scheduled.
+    # The course runs of a course may be related to the course itself or to one of its
+    # snapshots i.e. to a course page in its descendants.
+    course_runs = defaultdict(list)
+    courses_by_node = {
+        (
+            course.extended_object.node.path,
+            course.extended_object.publisher_is_draft,
+        ): course.extended_object_id
+        for course in courses
+    }
+    for course_run in (
+        CourseRun.objects.filter(
+            reduce(
+                operator.or_,
+                [
+                    Q(direct_course__extended_object__node__path__startswith=path)
+                    for path, _is_draft in courses_by_node
+                ],
+                Q(pk__in=[]),
+            ),
+            start__isnull=False,
+            enrollment_start__isnull=False,
+            catalog_visibility=CourseRunCatalogVisibility.COURSE_AND_SEARCH,
+        )
+        .order_by("-end")
+        .values(
+            "direct_course__extended_object__node__path",
+            "direct_course__extended_object__publisher_is_draft",
+            "start",
+            "end",
+            "enrollment_start",
+            "enrollment_end",
+            "languages",
+            "price",
+            "price_currency",
+            "offer",
+            "discounted_price",
+            "discount",
+            "certificate_price",
+            "certificate_offer",
+            "certificate_discounted_price",
+            "certificate_discount",
+        )
+    ):
+        path = course_run.pop("direct_course__extended_object__node__path")
+        is_draft = course_run.pop("direct_course__extended_object__publisher_is_draft")
+        formatted_course_run = {
+            **course_run,
+            "end": course_run["end"] or MAX_DATE,
+            "enrollment_end": course_run["enrollment_end"]
+            or course_run["end"]
+            or MAX_DATE,
+        }
+        for length in range(TreeNode.steplen, len(path) + 1, TreeNode.steplen):
+            page_id = courses_by_node.get((path[:length], is_draft))
+            if page_id is not None:
+                course_runs[page_id].append(formatted_course_run)
+
+    return course_runs
+
+
+def get_course_runs_state(course_runs):
+    """
+    Return the best state among the course runs formatted for an Elasticsearch document
+    and the next time the state of one of them changes.
+    """
+    now = timezone.now()
+    best_state = CourseState.TO_BE_SCHEDULED
+    best_run = None
+    transition_at = None
+    # Course runs are ordered by descending `end` date: the first course run found in
+    # the best state is the best course run, like in the `BEST_STATE_SCRIPT` script.
+    for course_run in course_runs:
+        dates = (
+            course_run["start"],
+            course_run["end"],
+            course_run["enrollment_start"],
+            course_run["enrollment_end"],
+        )
+        state = CourseRun.compute_state(*dates, now=now)["priority"]
+        if state < best_state:
+            best_state = state
+            best_run = course_run
+        run_transition_at = CourseRun.compute_state_transition(*dates, now=now)
+        if run_transition_at and (
+            transition_at is None or run_transition_at < transition_at
+        ):
+            transition_at = run_transition_at
+
+    return {
+        "best_state": best_state,
+        "state_transition_at": transition_at,
+        "state_sort_ms": (
+            get_epoch_ms(best_run[STATE_SORT_DATES[best_state]]) if best_run else None
+        ),
+    }
+
+
+def get_course_runs_doc_values(course_runs):
+    """
+    Encode the dates and languages of the course runs formatted for an Elasticsearch
+    document in fields that scripts can read from doc values (see
+    `COURSE_RUN_DATE_FIELDS`).
+    """
+    course_runs = course_runs[:COURSE_RUN_MAX_COUNT]
+    return {
+        "course_runs_ms": [
+            (index << COURSE_RUN_INDEX_SHIFT)
+            | (position << COURSE_RUN_FIELD_SHIFT)
+            | max(get_epoch_ms(course_run[field]), 0)
+            for index, course_run in enumerate(course_runs)
+            for position, field in enumerate(COURSE_RUN_DATE_FIELDS)
+        ],
+        "course_runs_languages": [
+            f"{index:04d}:{language:s}"
+            for index, course_run in enumerate(course_runs)
+            for language in course_run["languages"]
+        ],
+    }
@@ -9,7 +9,7 @@ from ..defaults import ES_INDICES_PREFIX
 from ..forms import LicenceSearchForm
 from ..text_indexing import MULTILINGUAL_TEXT
 from ..utils.i18n import get_best_field_language
-from ..utils.indexers import slice_string_for_completion
+from ..utils.indexers import filter_queryset_for_shard, slice_string_for_completion
 
 
 class LicencesIndexer:
@@ -31,6 +31,8 @@ class LicencesIndexer:
                 }
                 for lang, _ in settings.LANGUAGES
             },
+            # Copy of the document id to break ties in sorts (see `TIE_BREAKER_SORT`)
+            "id": {"type": "keyword"},
             # Create a raw title field to enable alphabetical sorting
             # We cannot use the default title field as the analysis prevents sorting on it
             **{
@@ -65,18 +67,25 @@ class LicencesIndexer:
                 translation.language_code: translation.content
                 for translation in translations
             },
+            "id": str(licence.id),
             "title": titles,
             "title_raw": titles,
         }
 
+    # pylint: disable=unused-argument
     @classmethod
-    def get_es_documents(cls, index=None, action="index"):
+    def get_es_documents(cls, index=None, action="index", shard=None, since=None):
         """
-        Loop on all the liences in database and format them for the ElasticSearch index
+        Loop on all the liences in database and format them for the ElasticSearch index.
+        When a shard is given, only its slice of primary keys is processed.
+        Licences don't keep track of their modification date: they are all processed even
+        when a date is given (there are only a handful of them).
         """
         index = index or cls.index_name
 
-        for licence in Licence.objects.prefetch_related("translations").iterator():
+        for licence in filter_queryset_for_shard(
+            Licence.objects.prefetch_related("translations"), shard
+        ).iterator():
             yield cls.get_es_document_for_licence(licence, index=index, action=action)
 
     @staticmethod
@@ -18,7 +18,11 @@ from ..defaults import ES_INDICES_PREFIX
 from ..forms import ItemSearchForm
 from ..text_indexing import MULTILINGUAL_TEXT
 from ..utils.i18n import get_best_field_language
-from ..utils.indexers import slice_string_for_completion
+from ..utils.indexers import (
+    filter_queryset_changed_since,
+    filter_queryset_for_shard,
+    slice_string_for_completion,
+)
 
 
 class OrganizationsIndexer:
@@ -44,6 +48,9 @@ class OrganizationsIndexer:
             # Not searchable
             "absolute_url": {"type": "object", "enabled": False},
             "logo": {"type": "object", "enabled": False},
+            "menu_title": {"type": "object", "enabled": False},
+            # Copy of the document id to break ties in sorts (see `TIE_BREAKER_SORT`)
+            "id": {"type": "keyword"},
             # Create a raw title field to enable alphabetical sorting
             # We cannot use the default title field as the analysis prevents sorting on it
             **{
@@ -61,12 +68,13 @@ class OrganizationsIndexer:
         index = index or cls.index_name
 
         # Get published titles
-        titles = {
-            t.language: t.title
-            for t in Title.objects.filter(
-                page=organization.extended_object, published=True
-            )
-        }
+        titles = {}
+        menu_titles = {}
+        for title in Title.objects.filter(
+            page=organization.extended_object, published=True
+        ):
+            titles[title.language] = title.title
+            menu_titles[title.language] = title.menu_title
 
         # Prepare logo images
         logo_images = cls.get_logo_images(organization)
@@ -91,7 +99,11 @@ class OrganizationsIndexer:
                 language: slice_string_for_completion(title)
                 for language, title in titles.items()
             },
+            "id": organization.get_es_id(),
             "logo": logo_images,
+            # Not displayed but denormalized in the documents of courses (see
+            # `CoursesIndexer.related_fields`)
+            "menu_title": menu_titles,
             "description": {
                 language: " ".join(st) for language, st in description.items()
             },
@@ -115,16 +127,25 @@ class OrganizationsIndexer:
         return logo_images
 
     @classmethod
-    def get_es_documents(cls, index=None, action="index"):
+    def get_es_documents(cls, index=None, action="index", shard=None, since=None):
         """
-        Loop on all the organizations in database and format them for the ElasticSearch index
+        Loop on all the organizations in database and format them for the ElasticSearch index.
+        When a shard is given, only its slice of primary keys is processed.
+        When a date is given, only the organizations whose page changed since this date are
+        processed.
         """
         index = index or cls.index_name
 
         for organization in (
-            Organization.objects.filter(
-                extended_object__publisher_is_draft=False,
-                extended_object__title_set__published=True,
+            filter_queryset_for_shard(
+                filter_queryset_changed_since(
+                    Organization.objects.filter(
+                        extended_object__publisher_is_draft=False,
+                        extended_object__title_set__published=True,
+                    ),
+                    since,
+                ),
+                shard,
             )
             .distinct()
             .iterator()
@@ -19,7 +19,11 @@ from ..defaults import ES_INDICES_PREFIX
 from ..forms import ItemSearchForm
 from ..text_indexing import MULTILINGUAL_TEXT
 from ..utils.i18n import get_best_field_language
-from ..utils.indexers import slice_string_for_completion
+from ..utils.indexers import (
+    filter_queryset_changed_since,
+    filter_queryset_for_shard,
+    slice_string_for_completion,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +55,8 @@ class PersonsIndexer:
             # Not searchable
             "absolute_url": {"type": "object", "enabled": False},
             "portrait": {"type": "object", "enabled": False},
+            # Copy of the document id to break ties in sorts (see `TIE_BREAKER_SORT`)
+            "id": {"type": "keyword"},
             # Create a raw title field to enable alphabetical sorting
             # We cannot use the default title field as the analysis prevents sorting on it
             **{
@@ -109,22 +115,32 @@ class PersonsIndexer:
                 language: slice_string_for_completion(title)
                 for language, title in titles.items()
             },
+            "id": str(person.extended_object_id),
             "portrait": portrait_images,
             "title": titles,
             "title_raw": titles,
         }
 
     @classmethod
-    def get_es_documents(cls, index=None, action="index"):
+    def get_es_documents(cls, index=None, action="index", shard=None, since=None):
         """
-        Loop on all the persons in database and format them for the ElasticSearch index
+        Loop on all the persons in database and format them for the ElasticSearch index.
+        When a shard is given, only its slice of primary keys is processed.
+        When a date is given, only the persons whose page changed since this date are
+        processed.
         """
         index = index or cls.index_name
 
         for person in (
-            Person.objects.filter(
-                extended_object__publisher_is_draft=False,
-                extended_object__title_set__published=True,
+            filter_queryset_for_shard(
+                filter_queryset_changed_since(
+                    Person.objects.filter(
+                        extended_object__publisher_is_draft=False,
+                        extended_object__title_set__published=True,
+                    ),
+                    since,
+                ),
+                shard,
             )
             .distinct()
             .iterator()
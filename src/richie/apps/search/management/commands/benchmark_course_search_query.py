@@ -0,0 +1,58 @@
+"""
+Measure the CPU time spent building the Elasticsearch query of typical course searches.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from ...forms import CourseSearchForm
+
+# Querystrings of typical course searches, from the landing of the search page to a search
+# combining filters of each kind
+QUERYSTRINGS = [
+    "",
+    "query=python",
+    "availability=open&languages=en&languages=fr",
+    "levels=1&new=new&organizations=2&pace=lt-1h&persons=3&subjects=4&subjects=5",
+]
+
+
+class Command(BaseCommand):
+    """
+    Build the Elasticsearch query and aggregations of typical course searches repeatedly
+    and report the CPU time spent per search. Elasticsearch is not queried.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add an option to set the number of times each query is built."""
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=500,
+            help="Number of times the query of each search is built.",
+        )
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        for querystring in QUERYSTRINGS:
+            form = CourseSearchForm(data=QueryDict(querystring))
+            if not form.is_valid():
+                raise CommandError(f"Invalid search {querystring:s}: {form.errors!s}")
+
+            # Build the query once so that the measure is not impacted by the values that
+            # are computed on first use (e.g. the base pages of filters)
+            form.build_es_query()
+
+            start = time.process_time()
+            for _ in range(iterations):
+                form.build_es_query()
+            elapsed = time.process_time() - start
+
+            self.stdout.write(
+                f"{querystring or '(no filters)':s}: "
+                f"{elapsed * 1000000 / iterations:.1f} µs per query"
+            )
@@ -4,9 +4,11 @@ Handle ElasticSearch setup that needs to be done at bootstrap time.
 
 import logging
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
-from ...index_manager import regenerate_indices, store_es_scripts
+from ...index_manager import regenerate_indices, store_es_scripts, update_indices
 
 logger = logging.getLogger("richie.search.bootstrap_elasticsearch")
 
@@ -17,20 +19,72 @@ class Command(BaseCommand):
     - create indices for courses, organizations, categories,
     - index all records in their respective indices,
     - store necessary scripts.
+
+    With the "--since" or "--incremental" options, existing indices are updated in place
+    with the records that changed since the given date or since their last indexing.
     """
 
     help = __doc__
 
+    def add_arguments(self, parser):
+        """Add options to parallelize indexing or to update indices incrementally."""
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help=(
+                "Number of worker processes used to generate and upload the documents "
+                "(defaults to 1: indices are populated sequentially)."
+            ),
+        )
+        parser.add_argument(
+            "--since",
+            help=(
+                "Update existing indices with the records that changed since this "
+                "ISO 8601 date instead of regenerating them."
+            ),
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help=(
+                "Update existing indices with the records that changed since their "
+                "last indexing instead of regenerating them."
+            ),
+        )
+
     def handle(self, *args, **options):
-        # Keep track of starting time for logging purposes
-        logger.info("Starting to regenerate ES indices...")
+        since = options["since"]
+        if since is not None:
+            try:
+                since = parse_datetime(since)
+            except ValueError:
+                since = None
+            if since is None:
+                raise CommandError(
+                    f"Invalid date for the since option: {options['since']:s}"
+                )
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        if since or options["incremental"]:
+            logger.info("Starting to update ES indices...")
+
+            # Reindex the records that changed since the given date or since the last
+            # indexing, in the existing indices
+            update_indices(since=since)
+
+            logger.info("ES indices updated.")
+        else:
+            # Keep track of starting time for logging purposes
+            logger.info("Starting to regenerate ES indices...")
 
-        # Creates new indices each time, populates them, and atomically replaces
-        # the old indices once the new ones are ready.
-        regenerate_indices()
+            # Creates new indices each time, populates them, and atomically replaces
+            # the old indices once the new ones are ready.
+            regenerate_indices(workers=options["workers"])
 
-        # Confirm operation success through a console log
-        logger.info("ES indices regenerated.")
+            # Confirm operation success through a console log
+            logger.info("ES indices regenerated.")
 
         logger.info("Starting to store ES scripts...")
 
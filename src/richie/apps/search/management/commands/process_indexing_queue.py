@@ -0,0 +1,34 @@
+"""
+Process the updates waiting in the database indexing queue.
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand
+
+from ...queues import DatabaseIndexingQueue
+
+logger = logging.getLogger("richie.search.process_indexing_queue")
+
+
+class Command(BaseCommand):
+    """
+    Send to Elasticsearch the documents impacted by the pages published or unpublished
+    since the last run. This command should be run periodically when the search indices
+    are kept updated via the database indexing queue.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add an option to limit the number of page updates processed in one run."""
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Maximum number of page updates to process in one run.",
+        )
+
+    def handle(self, *args, **options):
+        count = DatabaseIndexingQueue().process_pending(limit=options["limit"])
+        logger.info("%d documents updated in Elasticsearch indices.", count)
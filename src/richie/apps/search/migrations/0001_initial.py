@@ -0,0 +1,80 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("cms", "0022_auto_20180620_1551"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchAccess",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+            ],
+            options={
+                "permissions": (
+                    (
+                        "can_manage_elasticsearch",
+                        "Allow managing Elasticsearch indices",
+                    ),
+                ),
+                "managed": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="IndexingQueueItem",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("language", models.CharField(max_length=15, verbose_name="language")),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[("index", "index"), ("delete", "delete")],
+                        max_length=10,
+                        verbose_name="action",
+                    ),
+                ),
+                (
+                    "updated_on",
+                    models.DateTimeField(auto_now=True, verbose_name="updated on"),
+                ),
+                (
+                    "page",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="cms.page",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "indexing queue item",
+                "verbose_name_plural": "indexing queue items",
+                "db_table": "richie_search_indexing_queue_item",
+                "unique_together": {("page", "language")},
+            },
+        ),
+    ]
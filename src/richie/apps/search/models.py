@@ -1,6 +1,9 @@
 """Declare and configure the models for richie's search application."""
 
 from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from cms.models import Page
 
 
 class SearchAccess(models.Model):
@@ -11,3 +14,29 @@ class SearchAccess(models.Model):
         permissions = (
             ("can_manage_elasticsearch", "Allow managing Elasticsearch indices"),
         )
+
+
+class IndexingQueueItem(models.Model):
+    """
+    An update of a page waiting to be reflected in the Elasticsearch indices, used by the
+    database indexing queue.
+    """
+
+    page = models.ForeignKey(Page, on_delete=models.CASCADE, related_name="+")
+    language = models.CharField(_("language"), max_length=15)
+    action = models.CharField(
+        _("action"),
+        max_length=10,
+        choices=(("index", _("index")), ("delete", _("delete"))),
+    )
+    updated_on = models.DateTimeField(_("updated on"), auto_now=True)
+
+    class Meta:
+        db_table = "richie_search_indexing_queue_item"
+        unique_together = ("page", "language")
+        verbose_name = _("indexing queue item")
+        verbose_name_plural = _("indexing queue items")
+
+    def __str__(self):
+        """Human representation of an indexing queue item."""
+        return f"{self.action:s} page {self.page_id!s} in {self.language:s}"
@@ -0,0 +1,223 @@
+"""
+Queues collecting the pages that were published or unpublished so that the Elasticsearch
+documents impacted by their modification are rebuilt outside of the editor's request.
+
+Repeated updates to the same page are merged while they wait in the queue and all the
+documents impacted by the pending updates are sent to Elasticsearch in bulk requests.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+from cms.models import Page
+
+from .defaults import ES_INDEXING_DELAY, ES_INDEXING_QUEUE
+from .models import IndexingQueueItem
+
+logger = logging.getLogger(__name__)
+
+QUEUES = {}
+
+
+def get_indexing_queue():
+    """
+    Return the indexing queue configured in the settings. Queues are instantiated only
+    once per process.
+    """
+    dotted_path = getattr(settings, "RICHIE_ES_INDEXING_QUEUE", ES_INDEXING_QUEUE)
+    try:
+        return QUEUES[dotted_path]
+    except KeyError:
+        return QUEUES.setdefault(dotted_path, import_string(dotted_path)())
+
+
+def merge_es_actions(previous, action):
+    """
+    Merge two Elasticsearch actions on the same document, the second one being the most
+    up-to-date. Partial updates are merged into the previous action so that they don't
+    shadow it.
+    """
+    if previous is None or action["_op_type"] != "update":
+        return action
+    if previous["_op_type"] == "index":
+        return {**previous, **action["doc"]}
+    if previous["_op_type"] == "update":
+        return {**previous, "doc": {**previous["doc"], **action["doc"]}}
+    # The document is deleted: there is nothing left to update
+    return previous
+
+
+class BaseIndexingQueue:
+    """
+    Base class for indexing queues. Subclasses should implement the `put` method that is
+    called each time a page is published or unpublished.
+    """
+
+    def put(self, page_id, action, language):
+        """Add the update of a page to the queue."""
+        raise NotImplementedError()
+
+    @staticmethod
+    def process(updates):
+        """
+        Send to Elasticsearch, in bulk, the actions resulting from the updates passed in
+        argument as a dictionary mapping `(page id, language)` tuples to an action.
+
+        A document impacted by several updates is only sent once. Returns the number of
+        actions that were sent.
+        """
+        # pylint: disable=import-outside-toplevel,cyclic-import
+        from .signals import apply_es_actions, get_es_actions_for_page
+
+        pages = Page.objects.in_bulk({page_id for page_id, _language in updates})
+
+        actions = {}
+        for (page_id, language), action in updates.items():
+            try:
+                page = pages[page_id]
+            except KeyError:
+                # The page was deleted while waiting in the queue
+                continue
+            for es_action in get_es_actions_for_page(page, action, language):
+                key = (es_action["_index"], es_action["_id"])
+                actions[key] = merge_es_actions(actions.get(key), es_action)
+
+        if actions:
+            apply_es_actions(list(actions.values()))
+        return len(actions)
+
+
+class ImmediateIndexingQueue(BaseIndexingQueue):
+    """
+    Process updates as soon as they are queued, in the current thread. This is the
+    behavior expected in tests.
+    """
+
+    def put(self, page_id, action, language):
+        """Process the update of a page right away."""
+        self.process({(page_id, language): action})
+
+
+class ThreadIndexingQueue(BaseIndexingQueue):
+    """
+    Collect updates in memory and process them in a background thread of the current
+    process. The thread waits for `RICHIE_ES_INDEXING_DELAY` seconds after being woken
+    up so that updates in quick succession are merged.
+
+    Updates still pending when the process exits are flushed before exiting but they are
+    lost if the process is killed: use the database queue if this is not acceptable.
+    """
+
+    def __init__(self):
+        """Initialize the pending updates and the synchronization primitives."""
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        atexit.register(self.flush)
+
+    def put(self, page_id, action, language):
+        """
+        Add the update of a page to the pending updates, replacing any previous update of
+        the same page in the same language, and wake up the worker thread.
+        """
+        with self.lock:
+            self.pending.pop((page_id, language), None)
+            self.pending[page_id, language] = action
+
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name="richie-search-indexing", daemon=True
+                )
+                self.thread.start()
+
+        self.wakeup.set()
+
+    def flush(self):
+        """Process all the pending updates in the current thread."""
+        with self.lock:
+            updates, self.pending = self.pending, {}
+            self.wakeup.clear()
+
+        if updates:
+            self.process(updates)
+
+    def run(self):
+        """Loop forever waiting for updates to process."""
+        while True:
+            self.wakeup.wait()
+            # Leave some time for other updates to come in and be merged
+            time.sleep(getattr(settings, "RICHIE_ES_INDEXING_DELAY", ES_INDEXING_DELAY))
+            try:
+                self.flush()
+            # pylint: disable=broad-except
+            except Exception:
+                logger.exception("Failed to update Elasticsearch indices")
+            finally:
+                # Don't keep a database connection open while waiting for updates
+                connections.close_all()
+
+
+class DatabaseIndexingQueue(BaseIndexingQueue):
+    """
+    Store updates in a database table so that they survive restarts and can be processed
+    by any node of a multi-node setup, by running the `process_indexing_queue` management
+    command periodically.
+    """
+
+    def put(self, page_id, action, language):
+        """
+        Record the update of a page in database, replacing any previous update of the
+        same page in the same language.
+        """
+        IndexingQueueItem.objects.update_or_create(
+            page_id=page_id, language=language, defaults={"action": action}
+        )
+
+    def process_pending(self, limit=None):
+        """
+        Process the updates recorded in database. Items locked by another process are
+        skipped. Items are claimed by deleting them in a short transaction so that no lock
+        is held while Elasticsearch is called: the editors publishing pages in the meantime
+        just queue new items. Claimed items are queued back if Elasticsearch fails, unless
+        a newer update of the same page was queued in the meantime.
+        Returns the number of actions that were sent to Elasticsearch.
+        """
+        with transaction.atomic():
+            items = list(
+                IndexingQueueItem.objects.select_for_update(skip_locked=True).order_by(
+                    "updated_on"
+                )[:limit]
+            )
+            if not items:
+                return 0
+            IndexingQueueItem.objects.filter(
+                pk__in=[item.pk for item in items]
+            ).delete()
+
+        try:
+            return self.process(
+                {(item.page_id, item.language): item.action for item in items}
+            )
+        except Exception:
+            # Pages deleted in the meantime have nothing left to index
+            page_ids = set(
+                Page.objects.filter(
+                    pk__in={item.page_id for item in items}
+                ).values_list("pk", flat=True)
+            )
+            for item in items:
+                if item.page_id not in page_ids:
+                    continue
+                IndexingQueueItem.objects.get_or_create(
+                    page_id=item.page_id,
+                    language=item.language,
+                    defaults={"action": item.action},
+                )
+            raise
@@ -8,50 +8,171 @@ from django.dispatch import receiver
 from cms import operations
 from cms.models import Title
 from cms.signals import post_obj_operation
+from elasticsearch.exceptions import TransportError
+from elasticsearch.helpers import BulkIndexError
 
 from richie.apps.courses.models import Category, Course, Organization, Person
+from richie.apps.search.apps import ES_CLIENT
+from richie.apps.search.cache import PAGE_TREE_TAG, invalidate_tags
+from richie.apps.search.elasticsearch import DOC_TYPE
 from richie.apps.search.index_manager import richie_bulk
 from richie.apps.search.indexers import ES_INDICES
 from richie.apps.search.indexers.categories import CategoriesIndexer
+from richie.apps.search.queues import get_indexing_queue
 
 
-def apply_es_action_to_course(instance, action, _language):
+def get_changed_source_fields(document, source_fields):
     """
-    Update Elasticsearch indices when a course is modified:
+    Compare the fields passed in argument between a document about to be sent to
+    Elasticsearch and the version of this document currently indexed. Return the fields
+    that changed, or all of them if the document is deleted or if it can't be compared.
+    """
+    if document["_op_type"] == "delete":
+        return set(source_fields)
+
+    try:
+        # pylint: disable=unexpected-keyword-arg
+        indexed_source = ES_CLIENT.get(
+            index=document["_index"],
+            doc_type=DOC_TYPE,
+            id=document["_id"],
+            _source=sorted(source_fields),
+        )["_source"]
+    except TransportError:
+        # The document is not indexed yet or the index can't be read
+        return set(source_fields)
+
+    return {
+        field
+        for field in source_fields
+        if indexed_source.get(field) != document.get(field)
+    }
+
+
+def get_es_actions_for_related_courses(courses, kind, document):
+    """
+    Compute the Elasticsearch actions required on the documents of courses linked to a page
+    of the given kind (categories, organizations or persons) when this page is modified,
+    given the new document of this page.
+
+    The fields of this document on which course documents depend are compared with the
+    document currently indexed: nothing is done on courses if none of them changed.
+    Otherwise, only the course fields that depend on the fields that changed are built
+    and sent in partial "update" actions.
+    """
+    dependencies = ES_INDICES.courses.related_fields[kind]
+    changed_source_fields = get_changed_source_fields(
+        document,
+        {field for source_fields in dependencies.values() for field in source_fields},
+    )
+    fields = [
+        field
+        for field, source_fields in dependencies.items()
+        if changed_source_fields.intersection(source_fields)
+    ]
+    if not fields:
+        return []
+
+    courses = [course for course in courses if not course.is_snapshot]
+    if not courses:
+        return []
+
+    return ES_INDICES.courses.get_es_related_updates(courses, fields)
+
+
+def apply_es_actions(actions):
+    """
+    Send Elasticsearch actions in bulk. The documents of courses that could not be partially
+    updated because they are not indexed yet are fully indexed instead.
+    """
+    try:
+        richie_bulk(actions)
+    except BulkIndexError as error:
+        updated_courses = {
+            action["_id"]
+            for action in actions
+            if action["_op_type"] == "update"
+            and action["_index"] == ES_INDICES.courses.index_name
+        }
+        missing_courses = {
+            item["update"]["_id"]
+            for item in error.errors
+            if item.get("update", {}).get("status") == 404
+            and item["update"]["_id"] in updated_courses
+        }
+        if missing_courses:
+            richie_bulk(
+                ES_INDICES.courses.get_es_documents_for_courses(
+                    Course.objects.filter(extended_object_id__in=missing_courses)
+                )
+            )
+        if len(missing_courses) < len(error.errors):
+            raise
+
+
+def get_es_actions_for_course(instance, action, _language):
+    """
+    Compute the Elasticsearch actions required when a course is modified:
     - update the course document in the Elasticsearch courses index.
 
-    Returns None if the page was related to a course and the Elasticsearch update is done.
+    Returns the list of actions if the page was related to a course.
     Raises ObjectDoesNotExist if the page instance is not related to a course.
     """
     course = Course.objects.get(draft_extension__extended_object=instance)
-    if not course.is_snapshot:
+    if course.is_snapshot:
+        return []
+    return [ES_INDICES.courses.get_es_document_for_course(course, action=action)]
+
+
+def apply_es_action_to_course(instance, action, language):
+    """
+    Update Elasticsearch indices when a course is modified.
+
+    Returns None if the page was related to a course and the Elasticsearch update is done.
+    Raises ObjectDoesNotExist if the page instance is not related to a course.
+    """
+    richie_bulk(get_es_actions_for_course(instance, action, language))
+
+
+def apply_course_runs_update_to_courses(courses):
+    """
+    Update only the fields that depend on course runs in the Elasticsearch documents of
+    courses. The whole documents are indexed if some of them were not found in the index.
+
+    Course runs are synchronized from LMS as often as every few seconds so their partial
+    updates don't evict the course searches cached in the search cache: their results
+    and facets may miss the last synchronizations for `RICHIE_ES_COURSES_CACHE_TIMEOUT`
+    seconds at most.
+    """
+    try:
         richie_bulk(
-            [ES_INDICES.courses.get_es_document_for_course(course, action=action)]
+            ES_INDICES.courses.get_es_course_runs_updates(courses),
+            invalidate_cache=False,
         )
+    except BulkIndexError:
+        # Some courses are not indexed yet: index their whole documents
+        richie_bulk(ES_INDICES.courses.get_es_documents_for_courses(courses))
 
 
-def apply_es_action_to_organization(instance, action, language):
+def get_es_actions_for_organization(instance, action, language):
     """
-    Update Elasticsearch indices when an organization is modified:
+    Compute the Elasticsearch actions required when an organization is modified:
     - update the organization document in the Elasticsearch organizations index for the
       organization and its direct parent (because the parent ID may change from Parent to Leaf),
-    - update the course documents in the Elasticsearch courses index for all courses linked to
-      this organization.
+    - update the fields that depend on it in the documents of the Elasticsearch courses index,
+      for all courses linked to this organization.
 
-    Returns None if the page was related to an organization and the Elasticsearch update is done.
+    Returns the list of actions if the page was related to an organization.
     Raises ObjectDoesNotExist if the page instance is not related to an organization.
     """
     organization = Organization.objects.get(draft_extension__extended_object=instance)
-    actions = [
-        ES_INDICES.courses.get_es_document_for_course(course)
-        for course in organization.get_courses(language)
-        if not course.is_snapshot
-    ]
-    actions.append(
-        ES_INDICES.organizations.get_es_document_for_organization(
-            organization, action=action
-        )
+    document = ES_INDICES.organizations.get_es_document_for_organization(
+        organization, action=action
     )
+    actions = get_es_actions_for_related_courses(
+        organization.get_courses(language), "organizations", document
+    )
+    actions.append(document)
 
     # Update the organization's parent only if it exists
     try:
@@ -63,51 +184,49 @@ def apply_es_action_to_organization(instance, action, language):
             ES_INDICES.organizations.get_es_document_for_organization(parent)
         )
 
-    richie_bulk(actions)
+    return actions
 
 
-def apply_es_action_to_person(instance, action, language):
+def get_es_actions_for_person(instance, action, language):
     """
-    Update Elasticsearch indices when a person is modified:
+    Compute the Elasticsearch actions required when a person is modified:
     - update the person document in the Elasticsearch persons index for the
       person,
-    - update the course documents in the Elasticsearch courses index for all courses linked to
-      this person.
+    - update the fields that depend on it in the documents of the Elasticsearch courses index,
+      for all courses linked to this person.
 
-    Returns None if the page was related to a person and the Elasticsearch update is done.
+    Returns the list of actions if the page was related to a person.
     Raises ObjectDoesNotExist if the page instance is not related to a person.
     """
     person = Person.objects.get(draft_extension__extended_object=instance)
-    actions = [
-        ES_INDICES.courses.get_es_document_for_course(course)
-        for course in person.get_courses(language)
-        if not course.is_snapshot
-    ]
-    actions.append(ES_INDICES.persons.get_es_document_for_person(person, action=action))
+    document = ES_INDICES.persons.get_es_document_for_person(person, action=action)
+    actions = get_es_actions_for_related_courses(
+        person.get_courses(language), "persons", document
+    )
+    actions.append(document)
 
-    richie_bulk(actions)
+    return actions
 
 
-def apply_es_action_to_category(instance, action, language):
+def get_es_actions_for_category(instance, action, language):
     """
-    Update Elasticsearch indices when a category is modified:
+    Compute the Elasticsearch actions required when a category is modified:
     - update the category document in the Elasticsearch categories index for the category
       and its direct parent (because the parent ID may change from Parent to Leaf),
-    - update the course documents in the Elasticsearch courses index for all courses linked to
-      this category.
+    - update the fields that depend on it in the documents of the Elasticsearch courses index,
+      for all courses linked to this category.
 
-    Returns None if the page was related to a category and the Elasticsearch update is done.
+    Returns the list of actions if the page was related to a category.
     Raises ObjectDoesNotExist if the page instance is not related to a category.
     """
     category = Category.objects.get(draft_extension__extended_object=instance)
-    actions = [
-        ES_INDICES.courses.get_es_document_for_course(course)
-        for course in category.get_courses(language)
-        if not course.is_snapshot
-    ]
-    actions.append(
-        ES_INDICES.categories.get_es_document_for_category(category, action=action)
+    document = ES_INDICES.categories.get_es_document_for_category(
+        category, action=action
     )
+    actions = get_es_actions_for_related_courses(
+        category.get_courses(language), "categories", document
+    )
+    actions.append(document)
 
     # Update the category's parent only if it exists
     try:
@@ -117,48 +236,64 @@ def apply_es_action_to_category(instance, action, language):
     else:
         actions.append(ES_INDICES.categories.get_es_document_for_category(parent))
 
-    richie_bulk(actions)
+    return actions
 
 
-def apply_es_action_to_page(page, action, language):
+def get_es_actions_for_page(page, action, language):
     """
-    Try updating each type of page extension one-by-one until one works (because we don't know
-    to which type of page extension this page is related).
+    Try computing the actions for each type of page extension one-by-one until one works
+    (because we don't know to which type of page extension this page is related).
     """
     for method in [
-        apply_es_action_to_course,
-        apply_es_action_to_category,
-        apply_es_action_to_organization,
-        apply_es_action_to_person,
+        get_es_actions_for_course,
+        get_es_actions_for_category,
+        get_es_actions_for_organization,
+        get_es_actions_for_person,
     ]:
         try:
             # The method should raise an ObjectDoesNotExist exception if the page extension
             # linked to this page is of another type.
-            method(page, action, language)
+            return method(page, action, language)
         except ObjectDoesNotExist:
             continue
-        else:
-            return
+    return []
+
+
+def apply_es_action_to_page(page, action, language):
+    """Update Elasticsearch indices impacted by the modification of a page."""
+    apply_es_actions(get_es_actions_for_page(page, action, language))
+
+
+def invalidate_page_tree():
+    """
+    Bump the revision of the tree of public pages so that each process builds its snapshot
+    again. It is bumped as soon as the tree is modified and once the modification is
+    committed, so that a snapshot built in between from the uncommitted tree is discarded.
+    """
+    invalidate_tags([PAGE_TREE_TAG])
+    transaction.on_commit(lambda: invalidate_tags([PAGE_TREE_TAG]))
 
 
 # pylint: disable=unused-argument
 def on_page_published(sender, instance, language, **kwargs):
     """
-    Trigger update of the Elasticsearch indices impacted by the modification of the instance
-    only once the database transaction is successful.
+    Queue the update of the Elasticsearch indices impacted by the modification of the
+    instance only once the database transaction is successful.
     """
+    invalidate_page_tree()
     if getattr(settings, "RICHIE_KEEP_SEARCH_UPDATED", True):
         transaction.on_commit(
-            lambda: apply_es_action_to_page(instance, "index", language)
+            lambda: get_indexing_queue().put(instance.pk, "index", language)
         )
 
 
 # pylint: disable=unused-argument
 def on_page_unpublished(sender, instance, language, **kwargs):
     """
-    Trigger update of the Elasticsearch indices impacted by the modification of the instance
-    only once the database transaction is successful.
+    Queue the update of the Elasticsearch indices impacted by the modification of the
+    instance only once the database transaction is successful.
     """
+    invalidate_page_tree()
     if getattr(settings, "RICHIE_KEEP_SEARCH_UPDATED", True):
         # Only unlist pages that are unpublished from all languages otherwise,
         # reindex it to remove the unpublished language
@@ -168,10 +303,22 @@ def on_page_unpublished(sender, instance, language, **kwargs):
             else "delete"
         )
         transaction.on_commit(
-            lambda: apply_es_action_to_page(instance, action, language)
+            lambda: get_indexing_queue().put(instance.pk, action, language)
         )
 
 
+# pylint: disable=unused-argument
+def on_course_runs_synced(sender, instances, **kwargs):
+    """
+    Update the course runs in the Elasticsearch documents of the course instances only once
+    the database transaction is successful.
+    """
+    if getattr(settings, "RICHIE_KEEP_SEARCH_UPDATED", True):
+        courses = [course for course in instances if not course.is_snapshot]
+        if courses:
+            transaction.on_commit(lambda: apply_course_runs_update_to_courses(courses))
+
+
 # pylint: disable=unused-argument
 @receiver(post_obj_operation)
 def on_page_moved(sender, **kwargs):
@@ -179,9 +326,14 @@ def on_page_moved(sender, **kwargs):
     When a page is moved, we may need to re-index all pages linked to objects of
     the same kind. This applies to all category pages as they have the
     *path* of the page in the ES index.
+
+    The revision of the tree of public pages is bumped when a page is moved or deleted.
     """
+    operation_type = kwargs["operation"]
+    if operation_type in (operations.MOVE_PAGE, operations.DELETE_PAGE):
+        invalidate_page_tree()
+
     if getattr(settings, "RICHIE_KEEP_SEARCH_UPDATED", True):
-        operation_type = kwargs["operation"]
         if operation_type == operations.MOVE_PAGE:
             page = kwargs["obj"]
             if hasattr(page, "category"):
@@ -6,7 +6,12 @@ from django.urls import path
 
 from rest_framework import routers
 
-from .views import bootstrap_elasticsearch, filter_definitions
+from .views import (
+    autocomplete,
+    bootstrap_elasticsearch,
+    elasticsearch_metrics,
+    filter_definitions,
+)
 from .viewsets.categories import CategoriesViewSet
 from .viewsets.courses import CoursesViewSet
 from .viewsets.licences import LicencesViewSet
@@ -25,11 +30,18 @@ ROUTER.register(r"(?P<kind>\w+)", CategoriesViewSet, "categories")
 
 # Use the standard name for our urlpatterns so urls.py can import it effortlessly
 urlpatterns = [
+    # Declared before the routes of categories, which would match any kind
+    path(r"autocomplete/", autocomplete, name="autocomplete"),
     path(
         r"bootstrap-elasticsearch/",
         bootstrap_elasticsearch,
         name="bootstrap_elasticsearch",
     ),
+    path(
+        r"elasticsearch-metrics/",
+        elasticsearch_metrics,
+        name="elasticsearch_metrics",
+    ),
     path(r"filter-definitions/", filter_definitions, name="filter_definitions"),
 ]
 
@@ -0,0 +1,79 @@
+"""
+Cursor utilities to paginate search results with `search_after`
+"""
+
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+# Sort clause added last to the sort of a search so that each document has a unique
+# position in its results, as required to resume them after a document with `search_after`.
+# It sorts on the `id` keyword field that indexers copy from the `_id` of their documents:
+# sorting on `_id` itself requires loading it in memory as fielddata, whereas keyword fields
+# are sorted from their doc values. Documents indexed before this field was added are sorted
+# last until the indices are regenerated.
+TIE_BREAKER_SORT = {"id": {"order": "asc", "unmapped_type": "keyword"}}
+
+
+def encode_cursor(values):
+    """Encode a dictionary of values to an opaque cursor that can be used in a querystring."""
+    return urlsafe_b64encode(
+        json.dumps(values, separators=(",", ":")).encode("utf-8")
+    ).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor encoded by `encode_cursor` back to its dictionary of values. The sort
+    values of the document after which results should be resumed are expected on its
+    "after" key.
+
+    Raise a ValueError if the cursor is not valid.
+    """
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError) as error:
+        raise ValueError("Cursor can't be decoded.") from error
+
+    if not isinstance(values, dict) or not isinstance(values.get("after"), list):
+        raise ValueError("Cursor does not point to a document.")
+
+    return values
+
+
+def apply_cursor(query, cursor):
+    """
+    Prepare a search query for results paginated with cursors: break ties in its sort so that
+    each document has a unique position, and resume the results after the document the
+    cursor points to, if any. Nothing is done if the cursor is None, which means results are
+    paginated with an offset.
+
+    Raise a ValueError if the cursor does not match the sort of the query, for example if it
+    was tampered with or if it was issued for another search.
+    """
+    if cursor is None:
+        return
+
+    # Make the default sort by descending score explicit to add the tie-breaker after it
+    query.setdefault("sort", [{"_score": {"order": "desc"}}]).append(TIE_BREAKER_SORT)
+    if not cursor:
+        return
+
+    after = cursor["after"]
+    if len(after) != len(query["sort"]) or not all(
+        value is None or isinstance(value, (str, int, float)) for value in after
+    ):
+        raise ValueError("Cursor does not match the sort of the search.")
+    query["search_after"] = after
+
+
+def get_next_cursor(hits, size, **values):
+    """
+    Return the cursor pointing to the next page of results after a page of hits sorted with
+    a tie-breaker, along with other values needed to resume the search, or None if there is
+    no next page.
+    """
+    if not hits or len(hits) < size:
+        return None
+
+    return encode_cursor({"after": hits[-1]["sort"], **values})
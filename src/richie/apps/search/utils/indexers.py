@@ -3,6 +3,11 @@ Common utilities related to our indexers. For use in our indexers and related se
 or as helpers for users of the project.
 """
 
+import operator
+from functools import reduce
+
+from django.db.models import Q
+from django.db.models.functions import Mod
 from django.utils.module_loading import import_string
 
 from ...courses.defaults import DAY, HOUR, MINUTE, MONTH, WEEK
@@ -37,6 +42,60 @@ class IndicesList:
         )
 
 
+def filter_queryset_for_shard(queryset, shard=None):
+    """
+    Restrict a queryset to the slice of primary keys a worker is in charge of when indexing
+    is spread across several processes.
+
+    The `shard` argument is a tuple `(shard_index, shards_count)`: primary keys are
+    distributed between shards by their modulo so that the slices are balanced without
+    having to count the objects beforehand. The queryset is returned untouched when no
+    shard is given.
+    """
+    if shard is None:
+        return queryset
+
+    shard_index, shards_count = shard
+    return queryset.annotate(richie_shard=Mod("pk", shards_count)).filter(
+        richie_shard=shard_index
+    )
+
+
+def filter_queryset_changed_since(queryset, since=None, related_lookups=()):
+    """
+    Restrict a queryset of page extensions to the ones that need to be reindexed because
+    their page, one of the plugins on their page, or one of the pages reached via the
+    related lookups, changed after the date passed in argument.
+
+    Each related lookup should lead from the page extension to a page (e.g.
+    "extended_object__node__children__cms_pages"). The queryset is returned untouched
+    when no date is given.
+    """
+    if since is None:
+        return queryset
+
+    lookups = [
+        "extended_object",
+        "extended_object__placeholders__cmsplugin",
+        *related_lookups,
+    ]
+    # Use one subquery per lookup instead of joining all the relations in the same query
+    # which would multiply the number of rows to scan
+    return queryset.filter(
+        reduce(
+            operator.or_,
+            [
+                Q(
+                    pk__in=queryset.model.objects.filter(
+                        **{f"{lookup:s}__changed_date__gte": since}
+                    ).values("pk")
+                )
+                for lookup in lookups
+            ],
+        )
+    )
+
+
 def slice_string_for_completion(string):
     """
     Split a string in significant parts for use in completion.
@@ -80,3 +139,10 @@ def get_course_pace(effort=None, duration=None):
     # Drop courses with reference units in minutes and hours at they make no sense
     # to express a course pace
     return None
+
+
+def get_epoch_ms(date_time):
+    """Return a datetime as a number of milliseconds since epoch, or None if it is missing."""
+    if date_time is None:
+        return None
+    return int(date_time.timestamp() * 1000)
@@ -7,7 +7,7 @@ from django.utils.translation import get_language_from_request
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from ..apps import ES_CLIENT
+from ..autocomplete import get_autocomplete_options
 
 
 class ViewSetMetadata:
@@ -60,28 +60,14 @@ class AutocompleteMixin:
                 },
             )
 
-        # Query our specific ES completion field
+        # Query our specific completion field
         language = get_language_from_request(request)
-        autocomplete_query_response = ES_CLIENT.search(
-            index=indexer.index_name,
-            body={
-                "suggest": {
-                    "objects": {
-                        "prefix": query,
-                        "completion": {"field": f"complete.{language:s}"},
-                    }
-                }
-            },
-        )
+        options = get_autocomplete_options(indexer.index_name, query, language)
 
         # Build a response array from the list of completion options
         return Response(
             [
-                indexer.format_es_document_for_autocomplete(
-                    option, get_language_from_request(request)
-                )
-                for option in autocomplete_query_response["suggest"]["objects"][0][
-                    "options"
-                ]
+                indexer.format_es_document_for_autocomplete(option, language)
+                for option in options
             ]
         )
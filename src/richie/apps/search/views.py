@@ -4,14 +4,19 @@ from django.contrib import messages
 from django.core import management
 from django.http import HttpResponse
 from django.utils.encoding import force_str
+from django.utils.translation import get_language_from_request
 from django.utils.translation import gettext_lazy as _
-from django.views.decorators.cache import cache_page
 
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-from .defaults import FILTERS_PRESENTATION
-from .filter_definitions import FILTERS
+from .apps import get_es_metrics
+from .autocomplete import get_grouped_autocomplete_options
+from .filter_definitions import get_static_definitions
+from .indexers import ES_INDICES
+
+# Maximum number of kinds of objects that can be autocompleted in one request
+AUTOCOMPLETE_MAX_KINDS = 20
 
 
 @api_view(["POST"])
@@ -32,20 +37,83 @@ def bootstrap_elasticsearch(request, version):
 
 
 @api_view(["GET"])
-@cache_page(60 * 60 * 2)
+# pylint: disable=unused-argument
+def elasticsearch_metrics(request, version):
+    """
+    Return the metrics of the Elasticsearch clients of the process serving the request, to
+    size their connection pools and tune their retries.
+    """
+    user = request.user
+    if not (user.is_staff and request.user.has_perm("search.can_manage_elasticsearch")):
+        return HttpResponse(
+            force_str(_("You are not allowed to manage the search index.")),
+            status=403 if request.user.is_authenticated else 401,
+        )
+
+    return Response(get_es_metrics())
+
+
+@api_view(["GET"])
 # pylint: disable=unused-argument
 def filter_definitions(request, version):
     """
     Make available on an API route the static parts of filter definitions.
     This is useful to some frontend components that need them to configure themselves.
     """
-    filters = {
-        name: faceted_definition
-        for filter in FILTERS.values()
-        for name, faceted_definition in filter.get_definition().items()
-        if name in FILTERS_PRESENTATION
-    }
-    for name in filters:
-        filters[name]["position"] = FILTERS_PRESENTATION.index(name)
+    return Response(get_static_definitions())
+
+
+def get_autocomplete_search(kind):
+    """
+    Return the indexer of a kind of objects and the contexts restricting autocomplete
+    to this kind. Kinds of objects that have no index of their own are kinds of categories
+    (e.g. "subjects" or "levels").
+    """
+    if kind != "categories" and kind in ES_INDICES.index_map:
+        return getattr(ES_INDICES, kind), None
+
+    return ES_INDICES.categories, {"kind": [kind]}
+
+
+@api_view(["GET"])
+# pylint: disable=unused-argument
+def autocomplete(request, version):
+    """
+    Autocomplete a query on several kinds of objects at once (e.g. courses, organizations
+    and subjects), with one request to Elasticsearch instead of one request to each
+    `/{kind}/autocomplete` endpoint. The options are grouped by kind.
+    """
+    query = request.query_params.get("query")
+    kinds = list(dict.fromkeys(request.query_params.getlist("kind")))
+    errors = []
+    if query is None:
+        errors.append('Missing autocomplete "query".')
+    if not kinds:
+        errors.append('Missing autocomplete "kind".')
+    elif len(kinds) > AUTOCOMPLETE_MAX_KINDS:
+        errors.append(
+            f"Autocomplete is limited to {AUTOCOMPLETE_MAX_KINDS:d} kinds per request."
+        )
+    if errors:
+        return Response(status=400, data={"errors": errors})
+
+    language = get_language_from_request(request)
+    searches = {kind: get_autocomplete_search(kind) for kind in kinds}
+    options = get_grouped_autocomplete_options(
+        {
+            kind: (indexer.index_name, contexts)
+            for kind, (indexer, contexts) in searches.items()
+        },
+        query,
+        language,
+    )
 
-    return Response(filters)
+    return Response(
+        {
+            kind: [
+                indexer.format_es_document_for_autocomplete(option, language)
+                for option in options[kind]
+            ]
+            for kind, (indexer, _contexts) in searches.items()
+        }
+    )
@@ -4,6 +4,7 @@ API endpoints to access categories through ElasticSearch
 
 from django.conf import settings
 from django.utils.translation import get_language_from_request
+from django.utils.translation import gettext as _
 
 from elasticsearch.exceptions import NotFoundError
 from rest_framework.decorators import action
@@ -12,8 +13,11 @@ from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
 from ..apps import ES_CLIENT
+from ..autocomplete import get_autocomplete_options
 from ..defaults import ES_PAGE_SIZE
+from ..elasticsearch import DOC_TYPE
 from ..indexers import ES_INDICES
+from ..utils.cursors import apply_cursor, get_next_cursor
 from ..utils.viewsets import ViewSetMetadata
 
 
@@ -40,10 +44,20 @@ class CategoriesViewSet(ViewSet):
 
         limit, offset, query = params_form.build_es_query(kind=kind)
 
+        size = limit or getattr(settings, "RICHIE_ES_PAGE_SIZE", ES_PAGE_SIZE)
         query["sort"] = [
             {f"title_raw.{get_language_from_request(request)}": {"order": "asc"}}
         ]
 
+        # When results are paginated with cursors, resume them after the last item of the
+        # previous page if a cursor pointing to it is passed
+        cursor = params_form.cleaned_data["cursor"]
+        try:
+            apply_cursor(query, cursor)
+        except ValueError:
+            params_form.add_error("cursor", _("Invalid cursor."))
+            return Response(status=400, data={"errors": params_form.errors})
+
         try:
             # pylint: disable=unexpected-keyword-arg
             query_response = ES_CLIENT.search(
@@ -51,8 +65,8 @@ class CategoriesViewSet(ViewSet):
                 index=self._meta.indexer.index_name,
                 body=query,
                 # Directly pass meta-params through as arguments to the ES client
-                from_=offset,
-                size=limit or getattr(settings, "RICHIE_ES_PAGE_SIZE", ES_PAGE_SIZE),
+                from_=0 if cursor else offset,
+                size=size,
             )
         except NotFoundError as error:
             raise NotFound from error
@@ -63,6 +77,11 @@ class CategoriesViewSet(ViewSet):
         response_object = {
             "meta": {
                 "count": len(query_response["hits"]["hits"]),
+                "next_cursor": (
+                    get_next_cursor(query_response["hits"]["hits"], size)
+                    if cursor is not None
+                    else None
+                ),
                 "offset": offset,
                 "total_count": query_response["hits"]["total"]["value"],
             },
@@ -88,6 +107,7 @@ class CategoriesViewSet(ViewSet):
         try:
             query_response = ES_CLIENT.get(
                 index=self._meta.indexer.index_name,
+                doc_type=DOC_TYPE,
                 id=pk,
             )
         except NotFoundError as error:
@@ -130,31 +150,16 @@ class CategoriesViewSet(ViewSet):
                 },
             )
 
-        # Query our specific ES completion field
+        # Query our specific completion field
         language = get_language_from_request(request)
-        autocomplete_query_response = ES_CLIENT.search(
-            index=indexer.index_name,
-            body={
-                "suggest": {
-                    "categories": {
-                        "prefix": query,
-                        "completion": {
-                            "contexts": {"kind": [kind]},
-                            "field": f"complete.{language:s}",
-                        },
-                    }
-                }
-            },
+        options = get_autocomplete_options(
+            indexer.index_name, query, language, contexts={"kind": [kind]}
         )
 
         # Build a response array from the list of completion options
         return Response(
             [
-                indexer.format_es_document_for_autocomplete(
-                    option, get_language_from_request(request)
-                )
-                for option in autocomplete_query_response["suggest"]["categories"][0][
-                    "options"
-                ]
+                indexer.format_es_document_for_autocomplete(option, language)
+                for option in options
             ]
         )
@@ -2,16 +2,38 @@
 API endpoints to access courses through ElasticSearch
 """
 
+import hashlib
+import json
+
 from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import translation
+from django.utils.translation import get_language
+from django.utils.translation import gettext as _
 
 from elasticsearch.exceptions import NotFoundError
+from elasticsearch.helpers import scan
+from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
 from ..apps import ES_CLIENT
-from ..defaults import ES_PAGE_SIZE, FILTERS_PRESENTATION
-from ..filter_definitions import FILTERS
+from ..cache import get_index_tag, get_search_cache, get_tagged, set_tagged
+from ..defaults import (
+    ES_COURSES_CACHE_TIMEOUT,
+    ES_EXPORT_CHUNK_SIZE,
+    ES_EXPORT_SCROLL,
+    ES_PAGE_SIZE,
+)
+from ..elasticsearch import DOC_TYPE, get_search_error
+from ..filter_definitions import (
+    FILTERS,
+    IndexableFilterDefinition,
+    get_static_definitions,
+)
 from ..indexers import ES_INDICES
+from ..utils.cursors import apply_cursor, get_next_cursor
 from ..utils.viewsets import AutocompleteMixin, ViewSetMetadata
 
 
@@ -23,11 +45,71 @@ class CoursesViewSet(AutocompleteMixin, ViewSet):
 
     _meta = ViewSetMetadata(indexer=ES_INDICES.courses)
 
-    # pylint: disable=no-self-use,unused-argument,too-many-locals
+    # Query params that only select a page of results and don't impact facets
+    PAGINATION_PARAMS = ("limit", "offset", "cursor", "scope", "facets_token")
+
+    @staticmethod
+    def get_digest(data):
+        """
+        Compute a digest of the active language and of cleaned data from the search form.
+        Keys and multiple values are sorted so that equivalent querystrings share the same
+        digest.
+        """
+        normalized_data = {
+            name: sorted(value, key=str) if isinstance(value, list) else value
+            for name, value in data.items()
+        }
+        return hashlib.sha1(
+            json.dumps(
+                [get_language(), normalized_data], sort_keys=True, default=str
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def get_facets_token(self, cleaned_data):
+        """
+        Compute the token identifying the facets of a search: it is the same for all the
+        pages of results of a search, whatever their offset or size.
+        """
+        return self.get_digest(
+            {
+                name: value
+                for name, value in cleaned_data.items()
+                if name not in self.PAGINATION_PARAMS
+            }
+        )
+
+    def get_cache_tags(self):
+        """
+        Return the tags of the cached course searches: they depend on the documents of the
+        courses index and on the titles naming their facets, read from the indices of the
+        indexable filters.
+        """
+        index_names = [
+            self._meta.indexer.index_name,
+            *(
+                getattr(ES_INDICES, filter_definition.term).index_name
+                for filter_definition in FILTERS.values()
+                if isinstance(filter_definition, IndexableFilterDefinition)
+            ),
+        ]
+        # Several filters may read the same index (e.g. subjects and levels)
+        return [get_index_tag(index_name) for index_name in dict.fromkeys(index_names)]
+
+    # pylint: disable=no-self-use,unused-argument,too-many-locals,too-many-branches
+    # pylint: disable=too-many-statements
     def list(self, request, version):
         """
         Course search endpoint: build an ElasticSearch request from our query params so
-        it searches its index and returns a list of matching courses
+        it searches its index and returns a list of matching courses.
+
+        Results can be paginated with the `offset` query param or, at a constant cost
+        whatever the depth of the page, with cursors: an empty `cursor` query param requests
+        the first page, then the cursor returned with each page is passed back in the `cursor`
+        query param to fetch the next one.
+
+        The facets of a search are returned with a token. When requesting another page of
+        results for the same search, clients can pass this token back in the `facets_token`
+        query param so that facets are served from the cache instead of being computed again.
         """
         # Instantiate the form to allow validation/cleaning
         form_class = self._meta.indexer.form
@@ -37,31 +119,98 @@ class CoursesViewSet(AutocompleteMixin, ViewSet):
         if not params_form.is_valid():
             return Response(status=400, data={"errors": params_form.errors})
 
+        cache_timeout = getattr(
+            settings, "RICHIE_ES_COURSES_CACHE_TIMEOUT", ES_COURSES_CACHE_TIMEOUT
+        )
+        if cache_timeout:
+            cache_key = f"course_search_{self.get_digest(params_form.cleaned_data):s}"
+            response_object = get_tagged(cache_key)
+            if response_object is not None:
+                return Response(response_object)
+
         limit, offset, query, aggs = params_form.build_es_query()
+        size = limit or getattr(settings, "RICHIE_ES_PAGE_SIZE", ES_PAGE_SIZE)
 
         body = {"script_fields": params_form.get_script_fields()}
 
+        # When results are paginated with cursors, resume them after the last item of the
+        # previous page if a cursor pointing to it is passed
+        cursor = params_form.cleaned_data["cursor"]
+        try:
+            apply_cursor(body, cursor)
+        except ValueError:
+            params_form.add_error("cursor", _("Invalid cursor."))
+            return Response(status=400, data={"errors": params_form.errors})
+
         # The querystring may request only the query or only the aggregations
         scope = params_form.cleaned_data["scope"]
         if form_class.OBJECTS in scope or not scope:
             body["query"] = query
 
+        filters = None
         if form_class.FILTERS in scope or not scope:
-            body["aggs"] = aggs
-
-        # pylint: disable=unexpected-keyword-arg
-        course_query_response = ES_CLIENT.search(
-            _source=getattr(self._meta.indexer, "display_fields", "*"),
-            index=self._meta.indexer.index_name,
-            body=body,
-            # Directly pass meta-params through as arguments to the ES client
-            from_=offset,
-            size=limit or getattr(settings, "RICHIE_ES_PAGE_SIZE", ES_PAGE_SIZE),
-        )
+            facets_token = self.get_facets_token(params_form.cleaned_data)
+            facets_cache_key = f"course_search_facets_{facets_token:s}"
+            # Reuse the facets of the previous pages of the same search if they are cached
+            if (
+                cache_timeout
+                and params_form.cleaned_data["facets_token"] == facets_token
+            ):
+                filters = get_tagged(facets_cache_key)
+            if filters is None:
+                body["aggs"] = aggs
+
+        # The titles naming the facets known before the aggregations are computed are
+        # fetched in the same round-trip as the search
+        searches = [
+            (
+                None,
+                self._meta.indexer.index_name,
+                {
+                    **body,
+                    "_source": getattr(self._meta.indexer, "display_fields", "*"),
+                    "from": 0 if cursor else offset,
+                    "size": size,
+                },
+            )
+        ]
+        if "aggs" in body:
+            searches.extend(
+                self.get_titles_searches(
+                    {
+                        filter_definition: filter_definition.get_known_keys(
+                            params_form.cleaned_data
+                        )
+                        for filter_definition in FILTERS.values()
+                        if isinstance(filter_definition, IndexableFilterDefinition)
+                    }
+                )
+            )
+        course_query_response, *titles_responses = self.msearch(searches)
+        self.cache_titles(searches[1:], titles_responses)
+
+        # A multi-search reports the errors of each search instead of raising them
+        if "error" in course_query_response:
+            error = get_search_error(course_query_response)
+            # The values of a cursor that matches the sort of the search may still not
+            # have the types of its fields, for example if it was tampered with
+            if cursor and error.status_code == 400:
+                params_form.add_error("cursor", _("Invalid cursor."))
+                return Response(status=400, data={"errors": params_form.errors})
+            raise error
 
         response_object = {
             "meta": {
                 "count": len(course_query_response["hits"]["hits"]),
+                "next_cursor": (
+                    get_next_cursor(
+                        course_query_response["hits"]["hits"],
+                        size,
+                        now=params_form.ms_since_epoch,
+                    )
+                    if cursor is not None
+                    else None
+                ),
                 "offset": offset,
                 "total_count": course_query_response["hits"]["total"]["value"],
             }
@@ -73,31 +222,178 @@ class CoursesViewSet(AutocompleteMixin, ViewSet):
             ]
 
         if form_class.FILTERS in scope or not scope:
-            filters_definition = {
-                name: definition
-                for filter in FILTERS.values()
-                for name, definition in filter.get_definition().items()
-                if name in FILTERS_PRESENTATION
-            }
-            filters = {
-                name: {**filters_definition[name], **faceted_definition}
-                for filter in FILTERS.values()
-                for name, faceted_definition in filter.get_facet_info(
+            if filters is None:
+                filters = self.get_filters(
                     course_query_response["aggregations"]["all_courses"],
-                    data=params_form.cleaned_data,
-                ).items()
-                if name in FILTERS_PRESENTATION
-            }
-            for name in filters:
-                filters[name]["position"] = FILTERS_PRESENTATION.index(name)
+                    params_form.cleaned_data,
+                )
+                if cache_timeout:
+                    set_tagged(
+                        facets_cache_key,
+                        filters,
+                        self.get_cache_tags(),
+                        timeout=cache_timeout,
+                    )
+            response_object["filters"] = filters
+            if cache_timeout:
+                response_object["meta"]["facets_token"] = facets_token
 
-            response_object["filters"] = dict(
-                sorted(filters.items(), key=lambda f: f[1]["position"])
+        if cache_timeout:
+            set_tagged(
+                cache_key,
+                response_object,
+                self.get_cache_tags(),
+                timeout=cache_timeout,
             )
 
         # Will be formatting a response_object for consumption
         return Response(response_object)
 
+    @staticmethod
+    def msearch(searches):
+        """
+        Send searches, as `(filter_definition, index, body)` tuples, to Elasticsearch in a
+        single multi-search round-trip and return their responses.
+        """
+        return ES_CLIENT.msearch(
+            body=[
+                line
+                for _filter_definition, index, body in searches
+                for line in ({"index": index}, body)
+            ]
+        )["responses"]
+
+    @staticmethod
+    def get_titles_searches(keys_by_filter):
+        """
+        Return the searches getting the titles naming the facets of indexable filters that
+        are not cached yet, as `(filter_definition, index, body)` tuples.
+
+        Titles are only shared with filters through the search cache: nothing is searched
+        if it is not configured.
+        """
+        if get_search_cache() is None:
+            return []
+
+        searches = []
+        for filter_definition, keys in keys_by_filter.items():
+            _titles, missing_keys = filter_definition.get_cached_titles(keys)
+            if missing_keys:
+                searches.append(
+                    (
+                        filter_definition,
+                        *filter_definition.get_titles_search(missing_keys),
+                    )
+                )
+        return searches
+
+    @staticmethod
+    def cache_titles(searches, responses):
+        """Cache the titles found by the searches built by `get_titles_searches`."""
+        for (filter_definition, _index, _body), response in zip(searches, responses):
+            # Failed searches are sent again by the filter definition
+            if "error" not in response:
+                filter_definition.cache_titles(response["hits"]["hits"])
+
+    @staticmethod
+    def prefetch_titles(aggregations, cleaned_data):
+        """
+        Get the titles naming the facets of all indexable filters that are not cached yet in
+        a single multi-search round-trip to Elasticsearch, instead of one search per filter.
+
+        The titles of the facets that are only known from the keys returned by the
+        aggregations of the main query could not be fetched along with it.
+        """
+        searches = CoursesViewSet.get_titles_searches(
+            {
+                filter_definition: [
+                    *filter_definition.get_key_counts(aggregations, cleaned_data)[0]
+                ]
+                for filter_definition in FILTERS.values()
+                if isinstance(filter_definition, IndexableFilterDefinition)
+            }
+        )
+
+        # A single search is sent as is by the filter definition when naming its facets
+        if len(searches) < 2:
+            return
+
+        CoursesViewSet.cache_titles(searches, CoursesViewSet.msearch(searches))
+
+    @staticmethod
+    def get_filters(aggregations, cleaned_data):
+        """
+        Format the facets of a search from the aggregations computed by Elasticsearch, in
+        the order in which filters should be presented.
+        """
+        CoursesViewSet.prefetch_titles(aggregations, cleaned_data)
+        facets = {
+            name: faceted_definition
+            for filter in FILTERS.values()
+            for name, faceted_definition in filter.get_facet_info(
+                aggregations, data=cleaned_data
+            ).items()
+        }
+        # Static definitions are already in the order in which filters are presented
+        return {
+            name: {**static_definition, **facets[name]}
+            for name, static_definition in get_static_definitions().items()
+            if name in facets
+        }
+
+    # pylint: disable=unused-argument
+    @action(detail=False)
+    def export(self, request, version):
+        """
+        Course export endpoint: stream all the courses matching the filters passed in query
+        params as newline delimited JSON, one course per line, in no particular order.
+
+        Courses are read from Elasticsearch with a scroll, without scoring nor aggregations,
+        and formatted one at a time so that memory does not grow with the catalogue.
+        """
+        params_form = self._meta.indexer.form(data=request.query_params)
+
+        # Return a 400 with error information if the query params are not valid
+        if not params_form.is_valid():
+            return Response(status=400, data={"errors": params_form.errors})
+
+        query = {
+            "bool": {
+                "must": [
+                    clause
+                    for kf_pair in params_form.get_queries()
+                    for clause in kf_pair["fragment"]
+                ]
+            }
+        }
+        # The state of each course is still needed to pick the course run to present
+        script_fields = params_form.get_script_fields()
+        # Lines are rendered after the view returned: keep the language of the request
+        language = get_language()
+
+        def stream_courses():
+            renderer = JSONRenderer()
+            with translation.override(language):
+                for es_course in scan(
+                    ES_CLIENT,
+                    index=self._meta.indexer.index_name,
+                    query={"query": query, "script_fields": script_fields},
+                    _source=getattr(self._meta.indexer, "display_fields", "*"),
+                    scroll=getattr(
+                        settings, "RICHIE_ES_EXPORT_SCROLL", ES_EXPORT_SCROLL
+                    ),
+                    size=getattr(
+                        settings, "RICHIE_ES_EXPORT_CHUNK_SIZE", ES_EXPORT_CHUNK_SIZE
+                    ),
+                ):
+                    yield renderer.render(
+                        self._meta.indexer.format_es_object_for_api(es_course, language)
+                    ) + b"\n"
+
+        return StreamingHttpResponse(
+            stream_courses(), content_type="application/x-ndjson"
+        )
+
     # pylint: disable=no-self-use,invalid-name,unused-argument
     def retrieve(self, request, pk, version):
         """
@@ -106,7 +402,11 @@ class CoursesViewSet(AutocompleteMixin, ViewSet):
         # Wrap the ES get in a try/catch to we control the exception we emit — it would
         # raise and end up in a 500 error otherwise
         try:
-            query_response = ES_CLIENT.get(index=self._meta.indexer.index_name, id=pk)
+            query_response = ES_CLIENT.get(
+                index=self._meta.indexer.index_name,
+                doc_type=DOC_TYPE,
+                id=pk,
+            )
         except NotFoundError:
             return Response(status=404)
 
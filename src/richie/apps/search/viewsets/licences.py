@@ -4,6 +4,7 @@ API endpoints to access licences through ElasticSearch
 
 from django.conf import settings
 from django.utils.translation import get_language_from_request
+from django.utils.translation import gettext as _
 
 from elasticsearch.exceptions import NotFoundError
 from rest_framework.response import Response
@@ -11,7 +12,9 @@ from rest_framework.viewsets import ViewSet
 
 from ..apps import ES_CLIENT
 from ..defaults import ES_PAGE_SIZE
+from ..elasticsearch import DOC_TYPE
 from ..indexers import ES_INDICES
+from ..utils.cursors import apply_cursor, get_next_cursor
 from ..utils.viewsets import AutocompleteMixin, ViewSetMetadata
 
 
@@ -37,18 +40,28 @@ class LicencesViewSet(AutocompleteMixin, ViewSet):
 
         limit, offset, query = params_form.build_es_query()
 
+        size = limit or getattr(settings, "RICHIE_ES_PAGE_SIZE", ES_PAGE_SIZE)
         query["sort"] = [
             {f"title_raw.{get_language_from_request(request)}": {"order": "asc"}}
         ]
 
+        # When results are paginated with cursors, resume them after the last item of the
+        # previous page if a cursor pointing to it is passed
+        cursor = params_form.cleaned_data["cursor"]
+        try:
+            apply_cursor(query, cursor)
+        except ValueError:
+            params_form.add_error("cursor", _("Invalid cursor."))
+            return Response(status=400, data={"errors": params_form.errors})
+
         # pylint: disable=unexpected-keyword-arg
         search_query_response = ES_CLIENT.search(
             _source=getattr(self._meta.indexer, "display_fields", "*"),
             index=self._meta.indexer.index_name,
             body=query,
             # Directly pass meta-params through as arguments to the ES client
-            from_=offset,
-            size=limit or getattr(settings, "RICHIE_ES_PAGE_SIZE", ES_PAGE_SIZE),
+            from_=0 if cursor else offset,
+            size=size,
         )
 
         # Format the response in a consumer-friendly way
@@ -57,6 +70,11 @@ class LicencesViewSet(AutocompleteMixin, ViewSet):
         response_object = {
             "meta": {
                 "count": len(search_query_response["hits"]["hits"]),
+                "next_cursor": (
+                    get_next_cursor(search_query_response["hits"]["hits"], size)
+                    if cursor is not None
+                    else None
+                ),
                 "offset": offset,
                 "total_count": search_query_response["hits"]["total"]["value"],
             },
@@ -81,6 +99,7 @@ class LicencesViewSet(AutocompleteMixin, ViewSet):
         try:
             query_response = ES_CLIENT.get(
                 index=self._meta.indexer.index_name,
+                doc_type=DOC_TYPE,
                 id=pk,
             )
         except NotFoundError:
@@ -76,3 +76,40 @@ class LMSSelectTestCase(TestCase):
         self.assertIsNone(LMSHandler.select_lms("https://unknown.io/course/123"))
 
         self.assertIsNone(LMSHandler.select_lms(None))
+
+    @override_settings(
+        RICHIE_LMS_BACKENDS=[
+            {
+                "COURSE_REGEX": r"^.*/courses/(?P<course_id>.*)",
+                "BACKEND": "richie.apps.courses.lms.base.BaseLMSBackend",
+                "BASE_URL": "https://edx.org",
+            },
+        ],
+    )
+    def test_lms_select_memoized(self):
+        """
+        Backends should be instantiated only once and shared by all the urls they match,
+        until the LMS backends setting is changed.
+        """
+        backend = LMSHandler.select_lms("https://edx.org/courses/123")
+        self.assertIs(LMSHandler.select_lms("https://edx.org/courses/123"), backend)
+        self.assertIs(LMSHandler.select_lms("https://edx.org/courses/456"), backend)
+
+        with override_settings(
+            RICHIE_LMS_BACKENDS=[
+                {
+                    "COURSE_REGEX": r"^.*/courses/(?P<course_id>.*)",
+                    "BACKEND": "richie.apps.courses.lms.edx.EdXLMSBackend",
+                    "BASE_URL": "https://www.example.com",
+                },
+            ]
+        ):
+            new_backend = LMSHandler.select_lms("https://edx.org/courses/123")
+            self.assertEqual(type(new_backend), EdXLMSBackend)
+            self.assertEqual(
+                new_backend.configuration["BASE_URL"], "https://www.example.com"
+            )
+
+        self.assertEqual(
+            type(LMSHandler.select_lms("https://edx.org/courses/123")), BaseLMSBackend
+        )
@@ -7,22 +7,24 @@ from unittest import mock
 
 from django.conf import settings
 from django.core.cache import caches
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 
 from cms.constants import PUBLISHER_STATE_DEFAULT, PUBLISHER_STATE_DIRTY
 from cms.models import Page, Title
-from cms.signals import post_publish
 from cms.test_utils.testcases import CMSTestCase
 
 from richie.apps.core.helpers import create_i18n_page
 from richie.apps.courses.factories import CourseFactory, CourseRunFactory
 from richie.apps.courses.models import Course, CourseRun
 from richie.apps.courses.serializers import SyncCourseRunSerializer
+from richie.apps.courses.signals import course_runs_synced
 from richie.apps.courses.utils import get_signature
 
 
 # pylint: disable=too-many-public-methods
-@mock.patch.object(post_publish, "send", wraps=post_publish.send)
+@mock.patch.object(course_runs_synced, "send", wraps=course_runs_synced.send)
 @override_settings(
     RICHIE_COURSE_RUN_SYNC_SECRETS=["shared secret"],
     RICHIE_LMS_BACKENDS=[
@@ -327,10 +329,10 @@ class SyncCourseRunApiTestCase(CMSTestCase):
             PUBLISHER_STATE_DEFAULT,
         )
         mock_signal.assert_called_once_with(
-            sender=Page, instance=course.extended_object, language=None
+            sender=Course, instances=[course.public_extension]
         )
         mock_page_clear.assert_called_once()
-        mock_search_clear.assert_called_once()
+        mock_search_clear.assert_not_called()
 
     @override_settings(
         RICHIE_DEFAULT_COURSE_RUN_SYNC_MODE="sync_to_draft", TIME_ZONE="UTC"
@@ -655,10 +657,10 @@ class SyncCourseRunApiTestCase(CMSTestCase):
             PUBLISHER_STATE_DEFAULT,
         )
         mock_signal.assert_called_once_with(
-            sender=Page, instance=course.extended_object, language=None
+            sender=Course, instances=[course.public_extension]
         )
         mock_page_clear.assert_called_once()
-        mock_search_clear.assert_called_once()
+        mock_search_clear.assert_not_called()
 
     @override_settings(TIME_ZONE="UTC")
     def test_api_course_run_sync_existing_draft_sync_to_public(self, mock_signal):
@@ -793,10 +795,10 @@ class SyncCourseRunApiTestCase(CMSTestCase):
             PUBLISHER_STATE_DEFAULT,
         )
         mock_signal.assert_called_once_with(
-            sender=Page, instance=course.extended_object, language=None
+            sender=Course, instances=[course.public_extension]
         )
         mock_page_clear.assert_called_once()
-        mock_search_clear.assert_called_once()
+        mock_search_clear.assert_not_called()
 
     @override_settings(TIME_ZONE="UTC")
     def test_api_course_run_sync_existing_published_sync_to_draft(self, mock_signal):
@@ -1201,6 +1203,104 @@ class SyncCourseRunApiTestCase(CMSTestCase):
         )
         self.assertEqual(public_serializer.data, data)
 
+    @mock.patch.object(
+        type(connection.features),
+        "can_return_rows_from_bulk_insert",
+        new_callable=mock.PropertyMock,
+        return_value=False,
+    )
+    def test_api_course_run_sync_create_bulk_without_returning_rows(self, *_):
+        """
+        On databases that don't return the rows inserted in bulk (e.g. MySQL), the public
+        course runs created in a batch should still be linked to their draft course run.
+        """
+        course = CourseFactory(code="DemoX", should_publish=True)
+        CourseFactory(code="OtherX", should_publish=True)
+        data = [
+            {
+                "resource_link": (
+                    f"http://example.edx:8073/courses/course-v1:edX+{code:s}+01/course/"
+                ),
+                "start": "2020-12-09T09:31:59.417817Z",
+                "end": "2021-03-14T09:31:59.417895Z",
+                "enrollment_start": "2020-11-09T09:31:59.417936Z",
+                "enrollment_end": "2020-12-24T09:31:59.417972Z",
+                "languages": ["en"],
+                "enrollment_count": 46782,
+                "catalog_visibility": "course_and_search",
+            }
+            for code in ["DemoX", "OtherX"]
+        ]
+
+        response = self.client.post(
+            "/api/v1.0/course-runs-sync",
+            data,
+            content_type="application/json",
+            HTTP_AUTHORIZATION=self.authorize(data),
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CourseRun.objects.count(), 4)
+        draft_course_run = CourseRun.objects.get(direct_course=course)
+        public_course_run = CourseRun.objects.get(direct_course=course.public_extension)
+        self.assertEqual(public_course_run.draft_course_run, draft_course_run)
+        self.assertEqual(
+            public_course_run.resource_link, draft_course_run.resource_link
+        )
+
+    @override_settings(TIME_ZONE="UTC")
+    def test_api_course_run_sync_existing_bulk_sync_to_public(self, mock_signal):
+        """
+        Synchronizing existing course runs in bulk should update them with a number of
+        queries that does not depend on the size of the batch and reindex the impacted
+        courses at once.
+        """
+
+        def sync_existing_course_runs(nb_courses):
+            courses = CourseFactory.create_batch(nb_courses)
+            data = []
+            for course in courses:
+                link = (
+                    "http://example.edx:8073/courses/"
+                    f"course-v1:edX+{course.code:s}+01/course/"
+                )
+                CourseRunFactory(
+                    direct_course=course, resource_link=link, sync_mode="sync_to_public"
+                )
+                course.extended_object.publish("en")
+                data.append({"resource_link": link, "enrollment_count": 1789})
+            mock_signal.reset_mock()
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    "/api/v1.0/course-runs-sync",
+                    data,
+                    content_type="application/json",
+                    HTTP_AUTHORIZATION=self.authorize(data),
+                )
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                response.json(),
+                {item["resource_link"]: {"success": True} for item in data},
+            )
+            for course in courses:
+                course.refresh_from_db()
+                self.assertEqual(
+                    list(
+                        CourseRun.objects.filter(
+                            direct_course__in=[course, course.public_extension]
+                        ).values_list("enrollment_count", flat=True)
+                    ),
+                    [1789, 1789],
+                )
+            mock_signal.assert_called_once_with(
+                sender=Course, instances=[course.public_extension for course in courses]
+            )
+            return len(queries)
+
+        self.assertEqual(sync_existing_course_runs(1), sync_existing_course_runs(3))
+
     @override_settings(
         RICHIE_DEFAULT_COURSE_RUN_SYNC_MODE="sync_to_public", TIME_ZONE="UTC"
     )
@@ -1518,7 +1618,7 @@ class SyncCourseRunApiTestCase(CMSTestCase):
             PUBLISHER_STATE_DEFAULT,
         )
         mock_signal.assert_called_once_with(
-            sender=Page, instance=course.extended_object, language=None
+            sender=Course, instances=[course.public_extension]
         )
         mock_page_clear.assert_called_once()
-        mock_search_clear.assert_called_once()
+        mock_search_clear.assert_not_called()
@@ -0,0 +1,76 @@
+"""Test suite for the `update_course_states` management command of the `courses` app."""
+
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from richie.apps.courses.factories import CourseFactory, CourseRunFactory
+from richie.apps.courses.models import Course, CourseState
+
+
+class CommandUpdateCourseStatesTestCase(TestCase):
+    """Test the `update_course_states` management command."""
+
+    @mock.patch("richie.apps.courses.signals.course_states_updated.send")
+    def test_command_update_course_states(self, mock_send):
+        """
+        The command should only recompute the state of the courses for which it is stale and
+        notify the public courses that were updated.
+        """
+        now = timezone.now()
+        course = CourseFactory(should_publish=True)
+        CourseRunFactory(
+            direct_course=course,
+            start=now + timedelta(hours=2),
+            end=now + timedelta(hours=4),
+            enrollment_start=now - timedelta(hours=1),
+            enrollment_end=now + timedelta(hours=1),
+        )
+        course.extended_object.publish("en")
+        fresh_course = CourseFactory()
+        fresh_course.update_state()
+        state_computed_at = Course.objects.get(pk=fresh_course.pk).state_computed_at
+
+        call_command("update_course_states")
+
+        course.refresh_from_db()
+        self.assertEqual(course.best_state, CourseState.FUTURE_OPEN)
+        self.assertEqual(course.public_extension.best_state, CourseState.FUTURE_OPEN)
+        self.assertEqual(
+            Course.objects.get(pk=fresh_course.pk).state_computed_at, state_computed_at
+        )
+        mock_send.assert_called_once_with(
+            sender=Course, instances=[course.public_extension]
+        )
+
+        # Nothing to do until one of the course runs changes state
+        mock_send.reset_mock()
+        call_command("update_course_states")
+        mock_send.assert_not_called()
+
+        with mock.patch(
+            "django.utils.timezone.now",
+            return_value=now + timedelta(hours=1, seconds=1),
+        ):
+            call_command("update_course_states")
+
+        course.refresh_from_db()
+        self.assertEqual(course.best_state, CourseState.FUTURE_CLOSED)
+        mock_send.assert_called_once_with(
+            sender=Course, instances=[course.public_extension]
+        )
+
+    def test_command_update_course_states_all(self):
+        """The `--all` option should recompute the state of all courses."""
+        course = CourseFactory()
+        course.update_state()
+        state_computed_at = Course.objects.get(pk=course.pk).state_computed_at
+
+        call_command("update_course_states", "--all")
+
+        self.assertGreater(
+            Course.objects.get(pk=course.pk).state_computed_at, state_computed_at
+        )
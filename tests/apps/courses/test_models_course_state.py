@@ -3,6 +3,7 @@ Unit tests for the Course model
 """
 
 from datetime import timedelta
+from unittest import mock
 
 from django.test import TestCase
 from django.utils import timezone
@@ -379,3 +380,119 @@ class OrderCoursesByStateTestCase(TestCase):
             catalog_visibility=CourseRunCatalogVisibility.HIDDEN,
         )
         self.assertEqual(self._get_sql_priority(course), CourseState.TO_BE_SCHEDULED)
+
+
+class CourseStateMaterializedTestCase(TestCase):
+    """
+    Unit test suite for the state materialized on courses so that it is not computed from
+    their course runs on each access.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+
+    def test_models_course_state_update_state(self):
+        """
+        Updating the state of a course should store its best course run, the priority of
+        its state and the next time one of its course runs changes state.
+        """
+        course = CourseFactory()
+        course_run = CourseRunFactory(
+            direct_course=course,
+            start=self.now + timedelta(hours=2),
+            end=self.now + timedelta(hours=4),
+            enrollment_start=self.now - timedelta(hours=1),
+            enrollment_end=self.now + timedelta(hours=1),
+        )
+        CourseRunFactory(
+            direct_course=course,
+            start=self.now - timedelta(hours=2),
+            end=self.now - timedelta(hours=1),
+            enrollment_start=self.now - timedelta(hours=3),
+            enrollment_end=self.now - timedelta(hours=2),
+        )
+        self.assertFalse(course.is_state_fresh)
+
+        course.update_state()
+
+        course = Course.objects.get(pk=course.pk)
+        self.assertTrue(course.is_state_fresh)
+
+        # The course runs are not queried anymore to get the state of the course
+        with self.assertNumQueries(1):
+            self.assertEqual(course.state["priority"], CourseState.FUTURE_OPEN)
+
+        self.assertEqual(course.best_run, course_run)
+        self.assertEqual(course.best_state, CourseState.FUTURE_OPEN)
+        self.assertEqual(course.state_transition_at, course_run.enrollment_end)
+
+        # The state is stale once the transition time is passed
+        with mock.patch(
+            "django.utils.timezone.now",
+            return_value=course_run.enrollment_end + timedelta(seconds=1),
+        ):
+            self.assertFalse(course.is_state_fresh)
+            self.assertEqual(course.state["priority"], CourseState.FUTURE_CLOSED)
+
+    def test_models_course_state_update_state_no_course_run(self):
+        """A course with no course runs is to be scheduled until a course run is added."""
+        course = CourseFactory()
+
+        course.update_state()
+
+        course = Course.objects.get(pk=course.pk)
+        self.assertTrue(course.is_state_fresh)
+        self.assertIsNone(course.best_run)
+        self.assertEqual(course.best_state, CourseState.TO_BE_SCHEDULED)
+        self.assertIsNone(course.state_transition_at)
+
+    def test_models_course_state_invalidated_by_course_run(self):
+        """
+        Saving or deleting a course run should make the state of its course stale, including
+        the course of which it is a snapshot, but not the public version of the course.
+        """
+        course = CourseFactory(should_publish=True)
+        snapshot = CourseFactory(page_parent=course.extended_object)
+        for instance in [course, course.public_extension, snapshot]:
+            instance.update_state()
+
+        course_run = CourseRunFactory(direct_course=snapshot)
+
+        states = dict(Course.objects.values_list("pk", "state_computed_at"))
+        self.assertIsNone(states[course.pk])
+        self.assertIsNone(states[snapshot.pk])
+        self.assertIsNotNone(states[course.public_extension.pk])
+
+        course.update_state()
+        course_run.delete()
+        self.assertIsNone(Course.objects.get(pk=course.pk).state_computed_at)
+
+    def test_models_course_state_order_courses_by_materialized_state(self):
+        """Ordering courses by state should use their materialized state when it is fresh."""
+        course = CourseFactory()
+        CourseRunFactory(
+            direct_course=course,
+            start=self.now - timedelta(hours=1),
+            end=self.now + timedelta(hours=2),
+            enrollment_end=self.now + timedelta(hours=1),
+        )
+        course.update_state()
+
+        # Change the materialized state to check that it is the one used
+        Course.objects.filter(pk=course.pk).update(best_state=CourseState.FUTURE_OPEN)
+        self.assertEqual(
+            order_courses_by_state(Course.objects.filter(pk=course.pk))
+            .values_list("best_state_priority", flat=True)
+            .first(),
+            CourseState.FUTURE_OPEN,
+        )
+
+        # The state is computed from the course runs when it is stale
+        Course.objects.filter(pk=course.pk).update(state_computed_at=None)
+        self.assertEqual(
+            order_courses_by_state(Course.objects.filter(pk=course.pk))
+            .values_list("best_state_priority", flat=True)
+            .first(),
+            CourseState.ONGOING_OPEN,
+        )
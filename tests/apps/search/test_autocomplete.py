@@ -0,0 +1,268 @@
+"""
+Tests for the in-memory autocomplete on the completion fields of the search indices
+"""
+
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from elasticsearch.exceptions import ConnectionError as ESConnectionError
+
+from richie.apps.search.autocomplete import (
+    PrefixIndex,
+    get_autocomplete_options,
+    normalize_completion,
+    warm_prefix_indices,
+)
+from richie.apps.search.cache import get_index_tag, invalidate_tags
+from richie.apps.search.indexers.categories import CategoriesIndexer
+from richie.apps.search.indexers.organizations import OrganizationsIndexer
+from richie.apps.search.utils.indexers import slice_string_for_completion
+
+
+def get_hit(document_id, titles, **source):
+    """Build a hit as read from an index with its completion inputs."""
+    return {
+        "_id": document_id,
+        "_source": {
+            "complete": {
+                language: slice_string_for_completion(title)
+                for language, title in titles.items()
+            },
+            "title": titles,
+            **source,
+        },
+    }
+
+
+HITS = [
+    get_hit("1", {"en": "University of Paris 13", "fr": "Université de Paris 13"}),
+    get_hit("2", {"en": "Parisian Institute of Biking"}),
+    get_hit("3", {"en": "Ocean biking"}, kind="subjects"),
+    get_hit("4", {"en": "Biking in Paris"}, kind="levels"),
+    get_hit("5", {"en": "Électricité"}),
+    {"_id": "6", "_source": {"complete": None, "title": {"en": "Paris unlisted"}}},
+]
+
+
+class AutocompleteTestCase(TestCase):
+    """Test answering autocomplete queries from a prefix index kept in memory."""
+
+    def setUp(self):
+        super().setUp()
+        caches["search"].clear()
+
+    def test_autocomplete_normalize_completion(self):
+        """Completion inputs should be analyzed as by the "simple_diacritics_insensitive"."""
+        self.assertEqual(normalize_completion("Électricité"), "electricite")
+        self.assertEqual(
+            normalize_completion("  University of  Paris 13 "), "university of paris"
+        )
+        self.assertEqual(normalize_completion("l'abri à vélos"), "l abri a velos")
+        self.assertEqual(normalize_completion("13"), "")
+
+    def test_autocomplete_prefix_index_search(self):
+        """
+        The prefix index should return each document with an input starting with the
+        query once, in the language of the query.
+        """
+        prefix_index = PrefixIndex(HITS)
+
+        def search(*args, **kwargs):
+            return [hit["_id"] for hit in prefix_index.search(*args, **kwargs)]
+
+        self.assertEqual(search("paris", "en"), ["1", "4", "2"])
+        self.assertEqual(search("PARIS 13", "en"), ["1", "4", "2"])
+        self.assertEqual(search("Paris ", "fr"), ["1"])
+        self.assertEqual(search("of Par", "en"), ["1"])
+        self.assertEqual(search("bik", "en"), ["2", "3", "4"])
+        self.assertEqual(search("elec", "en"), ["5"])
+        self.assertEqual(search("paris", "de"), [])
+        self.assertEqual(search("13", "en"), [])
+        self.assertEqual(search("bik", "en", size=2), ["2", "3"])
+        self.assertEqual(search("bik", "en", contexts={"kind": ["subjects"]}), ["3"])
+
+    @override_settings(RICHIE_ES_AUTOCOMPLETE_IN_MEMORY=True)
+    @mock.patch("richie.apps.search.autocomplete.ES_CLIENT")
+    @mock.patch("richie.apps.search.autocomplete.scan", return_value=HITS)
+    def test_autocomplete_in_memory(self, mock_scan, mock_client):
+        """
+        The prefix index of an index should be loaded once and until documents are
+        written to the index.
+        """
+        options = get_autocomplete_options("richie_organizations", "paris", "en")
+
+        self.assertEqual([hit["_id"] for hit in options], ["1", "4", "2"])
+        mock_scan.assert_called_once_with(
+            mock_client,
+            index="richie_organizations",
+            query={"query": {"match_all": {}}},
+            _source=["absolute_url", "complete", "kind", "title"],
+            size=500,
+        )
+        mock_client.search.assert_not_called()
+
+        # The prefix index is reused for the next queries on the same index
+        mock_scan.reset_mock()
+        get_autocomplete_options("richie_organizations", "bik", "en")
+        get_autocomplete_options(
+            "richie_organizations", "bik", "en", contexts={"kind": ["subjects"]}
+        )
+        mock_scan.assert_not_called()
+
+        # Writing to another index keeps it
+        invalidate_tags([get_index_tag("richie_persons")])
+        get_autocomplete_options("richie_organizations", "bik", "en")
+        mock_scan.assert_not_called()
+
+        # It is loaded again after documents are written to the index
+        invalidate_tags([get_index_tag("richie_organizations")])
+        mock_scan.return_value = HITS[1:]
+        options = get_autocomplete_options("richie_organizations", "paris", "en")
+
+        self.assertEqual([hit["_id"] for hit in options], ["4", "2"])
+        mock_scan.assert_called_once()
+        mock_client.search.assert_not_called()
+
+    @override_settings(
+        RICHIE_ES_AUTOCOMPLETE_IN_MEMORY=True,
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}},
+    )
+    @mock.patch("richie.apps.search.autocomplete.ES_CLIENT")
+    @mock.patch("richie.apps.search.autocomplete.scan")
+    def test_autocomplete_in_memory_no_search_cache(self, mock_scan, mock_client):
+        """
+        Autocomplete should query Elasticsearch without a search cache to know when the
+        documents of an index change.
+        """
+        mock_client.search.return_value = {"suggest": {"objects": [{"options": []}]}}
+
+        get_autocomplete_options("richie_organizations", "paris", "en")
+
+        mock_scan.assert_not_called()
+        mock_client.search.assert_called_once()
+
+    @mock.patch("richie.apps.search.autocomplete.scan", return_value=HITS)
+    def test_autocomplete_warm_prefix_indices(self, mock_scan):
+        """
+        The prefix indices of all the indices should be loaded when the app is ready, only
+        if autocomplete is served from memory.
+        """
+        warm_prefix_indices()
+        mock_scan.assert_not_called()
+
+        with override_settings(RICHIE_ES_AUTOCOMPLETE_IN_MEMORY=True):
+            warm_prefix_indices()
+        self.assertEqual(
+            [call.kwargs["index"] for call in mock_scan.call_args_list],
+            [
+                "richie_categories",
+                "richie_courses",
+                "richie_licences",
+                "richie_organizations",
+                "richie_persons",
+            ],
+        )
+
+        # They are not loaded again by the first requests
+        mock_scan.reset_mock()
+        with override_settings(RICHIE_ES_AUTOCOMPLETE_IN_MEMORY=True):
+            options = get_autocomplete_options("richie_organizations", "paris", "en")
+        self.assertEqual([hit["_id"] for hit in options], ["1", "4", "2"])
+        mock_scan.assert_not_called()
+
+    @override_settings(RICHIE_ES_AUTOCOMPLETE_IN_MEMORY=True)
+    @mock.patch(
+        "richie.apps.search.autocomplete.scan",
+        side_effect=ESConnectionError("N/A", "Connection refused", None),
+    )
+    def test_autocomplete_warm_prefix_indices_unreachable(self, mock_scan):
+        """Indices that can't be read should be loaded on first use instead."""
+        with self.assertLogs("richie.apps.search.autocomplete", "WARNING") as logs:
+            warm_prefix_indices()
+
+        self.assertEqual(len(logs.output), 5)
+        self.assertEqual(mock_scan.call_count, 5)
+
+    @mock.patch("richie.apps.search.autocomplete.ES_CLIENT")
+    @mock.patch("richie.apps.search.autocomplete.scan")
+    def test_autocomplete_elasticsearch(self, mock_scan, mock_client):
+        """Autocomplete should query the completion suggester of Elasticsearch by default."""
+        mock_client.search.return_value = {
+            "suggest": {"objects": [{"options": HITS[:1]}]}
+        }
+
+        options = get_autocomplete_options(
+            "richie_categories", "paris", "fr", contexts={"kind": ["subjects"]}
+        )
+
+        self.assertEqual(options, HITS[:1])
+        mock_scan.assert_not_called()
+        mock_client.search.assert_called_once_with(
+            index="richie_categories",
+            body={
+                "suggest": {
+                    "objects": {
+                        "prefix": "paris",
+                        "completion": {
+                            "field": "complete.fr",
+                            "contexts": {"kind": ["subjects"]},
+                        },
+                    }
+                }
+            },
+        )
+
+    @override_settings(RICHIE_ES_AUTOCOMPLETE_IN_MEMORY=True)
+    @mock.patch.object(
+        OrganizationsIndexer,
+        "index_name",
+        new_callable=mock.PropertyMock,
+        return_value="test_organizations",
+    )
+    @mock.patch("richie.apps.search.autocomplete.scan", return_value=HITS)
+    def test_autocomplete_in_memory_organizations(self, *_):
+        """The autocomplete endpoints should be served from the prefix indices."""
+        response = self.client.get("/api/v1.0/organizations/autocomplete/?query=Par")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            [
+                {
+                    "id": "1",
+                    "kind": "organizations",
+                    "title": "University of Paris 13",
+                },
+                {
+                    "id": "4",
+                    "kind": "organizations",
+                    "title": "Biking in Paris",
+                },
+                {
+                    "id": "2",
+                    "kind": "organizations",
+                    "title": "Parisian Institute of Biking",
+                },
+            ],
+        )
+
+    @override_settings(RICHIE_ES_AUTOCOMPLETE_IN_MEMORY=True)
+    @mock.patch.object(
+        CategoriesIndexer,
+        "index_name",
+        new_callable=mock.PropertyMock,
+        return_value="test_categories",
+    )
+    @mock.patch("richie.apps.search.autocomplete.scan", return_value=HITS)
+    def test_autocomplete_in_memory_categories(self, *_):
+        """Categories autocomplete should be restricted to the kind requested."""
+        response = self.client.get("/api/v1.0/levels/autocomplete/?query=Bik")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            [{"id": "4", "kind": "levels", "title": "Biking in Paris"}],
+        )
@@ -0,0 +1,112 @@
+"""
+Tests for the tagged entries of the search cache
+"""
+
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from richie.apps.search import index_manager
+from richie.apps.search.cache import (
+    get_index_tag,
+    get_tag_version,
+    get_tagged,
+    invalidate_tags,
+    set_tagged,
+)
+
+
+class SearchCacheTestCase(TestCase):
+    """Test caching values that depend on tags and invalidating them by tag."""
+
+    def setUp(self):
+        super().setUp()
+        caches["search"].clear()
+
+    def test_search_cache_invalidate_tags(self):
+        """Invalidating a tag should only evict the entries that depend on it."""
+        set_tagged("a", [1], [get_index_tag("courses")])
+        set_tagged("b", [2], [get_index_tag("courses"), get_index_tag("organizations")])
+        set_tagged("c", [3], [get_index_tag("persons")])
+        set_tagged("d", [4], [])
+
+        self.assertEqual(get_tagged("a"), [1])
+        self.assertEqual(get_tagged("b"), [2])
+
+        invalidate_tags([get_index_tag("organizations")])
+
+        self.assertEqual(get_tagged("a"), [1])
+        self.assertIsNone(get_tagged("b"))
+        self.assertEqual(get_tagged("c"), [3])
+        self.assertEqual(get_tagged("d"), [4])
+
+        invalidate_tags([get_index_tag("courses"), get_index_tag("persons")])
+
+        self.assertIsNone(get_tagged("a"))
+        self.assertIsNone(get_tagged("c"))
+        self.assertEqual(get_tagged("d"), [4])
+
+        # Caching again after invalidation should work as usual
+        set_tagged("a", [5], [get_index_tag("courses")])
+        self.assertEqual(get_tagged("a"), [5])
+
+    def test_search_cache_evicted_tag(self):
+        """
+        An entry should be considered stale if the version of one of its tags was evicted
+        from the cache.
+        """
+        set_tagged("a", [1], [get_index_tag("courses")])
+        caches["search"].delete(f"search_tag_{get_index_tag('courses')}")
+
+        self.assertEqual(get_tagged("a", "missing"), "missing")
+
+    def test_search_cache_tag_version(self):
+        """The version of a tag should be stable until the tag is invalidated."""
+        version = get_tag_version(get_index_tag("courses"))
+        self.assertEqual(get_tag_version(get_index_tag("courses")), version)
+        self.assertNotEqual(get_tag_version(get_index_tag("organizations")), version)
+
+        invalidate_tags([get_index_tag("courses")])
+        self.assertNotEqual(get_tag_version(get_index_tag("courses")), version)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    )
+    def test_search_cache_not_configured(self):
+        """The search cache should be bypassed if it is not configured."""
+        set_tagged("a", [1], [get_index_tag("courses")])
+        invalidate_tags([get_index_tag("courses")])
+
+        self.assertIsNone(get_tagged("a"))
+        self.assertIsNone(get_tag_version(get_index_tag("courses")))
+
+    @mock.patch.object(index_manager, "bulk_compat")
+    def test_search_cache_richie_bulk(self, mock_bulk):
+        """
+        Sending actions in bulk should invalidate the tags of the indices they target and
+        pass lists of actions to the bulk helper as is.
+        """
+        actions = [{"_index": "richie_courses", "_id": 1}]
+        versions = {
+            index: get_tag_version(get_index_tag(index))
+            for index in ["richie_courses", "richie_persons"]
+        }
+
+        index_manager.richie_bulk(actions)
+
+        self.assertIs(mock_bulk.call_args[1]["actions"], actions)
+        self.assertNotEqual(
+            get_tag_version(get_index_tag("richie_courses")), versions["richie_courses"]
+        )
+        self.assertEqual(
+            get_tag_version(get_index_tag("richie_persons")), versions["richie_persons"]
+        )
+
+        # Indices are collected from other iterables as they are consumed
+        mock_bulk.side_effect = lambda actions, **kwargs: list(actions)
+        index_manager.richie_bulk(iter([{"_index": "richie_persons", "_id": 2}]))
+        self.assertNotEqual(
+            get_tag_version(get_index_tag("richie_persons")), versions["richie_persons"]
+        )
@@ -0,0 +1,30 @@
+"""
+Tests for the benchmark_course_search_query command
+"""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from richie.apps.search.management.commands.benchmark_course_search_query import (
+    QUERYSTRINGS,
+)
+
+
+class BenchmarkCourseSearchQueryCommandsTestCase(TestCase):
+    """
+    Test the command that measures the time spent building the query of course searches.
+    """
+
+    def test_commands_benchmark_course_search_query(self):
+        """The time spent per query should be reported for each search."""
+        stdout = StringIO()
+
+        call_command("benchmark_course_search_query", iterations=1, stdout=stdout)
+
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(len(lines), len(QUERYSTRINGS))
+        self.assertTrue(lines[0].startswith("(no filters): "))
+        for line in lines:
+            self.assertTrue(line.endswith(" µs per query"))
@@ -3,9 +3,10 @@ Tests for the regenerate_index command
 """
 
 import logging
+from datetime import datetime, timezone
 from unittest import mock
 
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
 from django.test import TestCase
 
 from richie.apps.search import index_manager
@@ -31,3 +32,78 @@ class BootstrapElasticsearchCommandsTestCase(TestCase):
         mock_regenerate.assert_called_once()
         mock_store.assert_called_once()
         self.assertEqual(mock_info.call_count, 4)
+
+    @mock.patch(
+        "richie.apps.search.management.commands.bootstrap_elasticsearch.regenerate_indices"
+    )
+    @mock.patch(
+        "richie.apps.search.management.commands.bootstrap_elasticsearch.store_es_scripts"
+    )
+    def test_commands_bootstrap_elasticsearch_workers(
+        self, _mock_store, mock_regenerate
+    ):
+        """
+        The number of worker processes should be passed to the index manager and default
+        to 1 to populate the indices sequentially.
+        """
+        call_command("bootstrap_elasticsearch")
+        mock_regenerate.assert_called_once_with(workers=1)
+
+        mock_regenerate.reset_mock()
+        call_command("bootstrap_elasticsearch", "--workers", "4")
+        mock_regenerate.assert_called_once_with(workers=4)
+
+    @mock.patch(
+        "richie.apps.search.management.commands.bootstrap_elasticsearch.regenerate_indices"
+    )
+    @mock.patch(
+        "richie.apps.search.management.commands.bootstrap_elasticsearch.update_indices"
+    )
+    @mock.patch(
+        "richie.apps.search.management.commands.bootstrap_elasticsearch.store_es_scripts"
+    )
+    def test_commands_bootstrap_elasticsearch_since(
+        self, _mock_store, mock_update, mock_regenerate
+    ):
+        """
+        The "since" option should update the existing indices with the records that changed
+        since the date passed in argument instead of regenerating the indices.
+        """
+        call_command("bootstrap_elasticsearch", "--since", "2022-01-01T10:00:00Z")
+        mock_update.assert_called_once_with(
+            since=datetime(2022, 1, 1, 10, tzinfo=timezone.utc)
+        )
+        self.assertFalse(mock_regenerate.called)
+
+        # Naive dates are made aware in the current timezone
+        mock_update.reset_mock()
+        with self.settings(TIME_ZONE="UTC"):
+            call_command("bootstrap_elasticsearch", "--since", "2022-01-01 10:00")
+        mock_update.assert_called_once_with(
+            since=datetime(2022, 1, 1, 10, tzinfo=timezone.utc)
+        )
+
+        mock_update.reset_mock()
+        with self.assertRaises(CommandError):
+            call_command("bootstrap_elasticsearch", "--since", "yesterday")
+        self.assertFalse(mock_update.called)
+
+    @mock.patch(
+        "richie.apps.search.management.commands.bootstrap_elasticsearch.regenerate_indices"
+    )
+    @mock.patch(
+        "richie.apps.search.management.commands.bootstrap_elasticsearch.update_indices"
+    )
+    @mock.patch(
+        "richie.apps.search.management.commands.bootstrap_elasticsearch.store_es_scripts"
+    )
+    def test_commands_bootstrap_elasticsearch_incremental(
+        self, _mock_store, mock_update, mock_regenerate
+    ):
+        """
+        The "incremental" option should update the existing indices from the date of their
+        last indexing.
+        """
+        call_command("bootstrap_elasticsearch", "--incremental")
+        mock_update.assert_called_once_with(since=None)
+        self.assertFalse(mock_regenerate.called)
@@ -2,11 +2,21 @@
 Tests for environment ElasticSearch support
 """
 
+from unittest import mock
+
 from django.core.cache import caches
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import translation
+
+from cms import operations
 
 from richie.apps.courses.factories import CategoryFactory
+from richie.apps.search import index_manager
+from richie.apps.search.apps import ES_CLIENT
 from richie.apps.search.filter_definitions import FILTERS, IndexableFilterDefinition
+from richie.apps.search.filter_definitions.helpers import get_child_page_ids
+from richie.apps.search.signals import on_page_moved
 
 
 class FilterDefintionsTestCase(TestCase):
@@ -15,6 +25,10 @@ class FilterDefintionsTestCase(TestCase):
     integration tests in test_query_courses.py
     """
 
+    def setUp(self):
+        super().setUp()
+        caches["search"].clear()
+
     def test_filter_definitions_indexable_filter_aggs_include_no_page(self):
         """
         The indexable filters (subjects, levels and organizations) should return an empty list
@@ -90,6 +104,85 @@ class FilterDefintionsTestCase(TestCase):
             # pylint: disable=protected-access
             FILTERS[filter_name]._base_page = None
 
+    @override_settings(RICHIE_KEEP_SEARCH_UPDATED=False)
+    def test_filter_definitions_child_page_ids(self):
+        """
+        The children of public pages should be read from a snapshot of the page tree built
+        in one query, until the page tree is modified.
+        """
+        parent = CategoryFactory(should_publish=True)
+        child1, child2 = CategoryFactory.create_batch(
+            2, page_parent=parent.extended_object, should_publish=True
+        )
+        CategoryFactory(page_parent=parent.extended_object)
+        grandchild = CategoryFactory(
+            page_parent=child1.extended_object, should_publish=True
+        )
+        parent_id, child1_id, child2_id, grandchild_id = (
+            category.get_es_id() for category in [parent, child1, child2, grandchild]
+        )
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                get_child_page_ids(parent_id),
+                [child1_id, child2_id],
+            )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_child_page_ids(int(child1_id)), [grandchild_id])
+            self.assertEqual(get_child_page_ids(child2_id), [])
+            self.assertEqual(get_child_page_ids("unknown"), [])
+
+        # Moving a page bumps the revision of the page tree
+        child2.extended_object.move_page(
+            child1.extended_object.node, position="last-child"
+        )
+        on_page_moved(
+            sender=None, operation=operations.MOVE_PAGE, obj=child2.extended_object
+        )
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_child_page_ids(parent_id), [child1_id])
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_child_page_ids(child1_id),
+                [grandchild_id, child2_id],
+            )
+
+        # Publishing a page bumps the revision of the page tree
+        child3_id = CategoryFactory(
+            page_parent=parent.extended_object, should_publish=True
+        ).get_es_id()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                get_child_page_ids(parent_id),
+                [child1_id, child3_id],
+            )
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    )
+    def test_filter_definitions_child_page_ids_no_search_cache(self):
+        """
+        The children of public pages should be queried each time if the search cache is
+        not configured as we can't know when the page tree is modified.
+        """
+        parent = CategoryFactory(should_publish=True)
+        child = CategoryFactory(page_parent=parent.extended_object, should_publish=True)
+
+        self.assertEqual(get_child_page_ids(parent.get_es_id()), [child.get_es_id()])
+
+        CategoryFactory(page_parent=child.extended_object, should_publish=True)
+        new_child = CategoryFactory(
+            page_parent=parent.extended_object, should_publish=True
+        )
+
+        self.assertEqual(
+            get_child_page_ids(parent.get_es_id()),
+            [child.get_es_id(), new_child.get_es_id()],
+        )
+
     def test_filter_definitions_indexable_filter_aggs_include_no_reverse_id(self):
         """
         An indexable filter instantiated with no `reverse_id` should return a match all aggs
@@ -97,3 +190,76 @@ class FilterDefintionsTestCase(TestCase):
         """
         indexable_filter_definition = IndexableFilterDefinition("name")
         self.assertEqual(indexable_filter_definition.aggs_include, ".*")
+
+    @override_settings(RICHIE_ES_INDICES_PREFIX="richie")
+    @mock.patch.object(ES_CLIENT, "search")
+    def test_filter_definitions_indexable_filter_i18n_names_cache(self, mock_search):
+        """
+        The titles of indexed objects should be cached in the process and in the search
+        cache until documents are written to their index.
+        """
+        caches["search"].clear()
+        mock_search.side_effect = lambda body, **_: {
+            "hits": {
+                "hits": [
+                    {"_id": key, "_source": {"title": {"en": f"Org {key:s}"}}}
+                    for key in body["query"]["terms"]["_id"]
+                    if key != "404"
+                ]
+            }
+        }
+        organizations = FILTERS["organizations"]
+
+        with translation.override("en"):
+            self.assertEqual(
+                organizations.get_i18n_names(["1", "2"]),
+                {"1": "Org 1", "2": "Org 2"},
+            )
+            self.assertEqual(mock_search.call_count, 1)
+
+            # Titles are read from the process...
+            self.assertEqual(organizations.get_i18n_names(["2"]), {"2": "Org 2"})
+            self.assertEqual(mock_search.call_count, 1)
+
+            # ...or from the search cache, shared with other processes
+            # pylint: disable=protected-access
+            organizations._titles = {}
+            self.assertEqual(
+                organizations.get_i18n_names(["1", "2", "3", "404"]),
+                {"1": "Org 1", "2": "Org 2", "3": "Org 3"},
+            )
+            self.assertEqual(mock_search.call_count, 2)
+            self.assertEqual(
+                mock_search.call_args[1]["body"],
+                {
+                    "_source": ["title"],
+                    "query": {"terms": {"_id": ["3", "404"]}},
+                    "size": 2,
+                },
+            )
+
+            # Writing to another index does not impact titles
+            with mock.patch.object(
+                index_manager,
+                "bulk_compat",
+                side_effect=lambda actions, **_: list(actions),
+            ):
+                index_manager.richie_bulk([{"_index": "richie_categories", "_id": "1"}])
+            self.assertEqual(organizations.get_i18n_names(["1"]), {"1": "Org 1"})
+            self.assertEqual(mock_search.call_count, 2)
+
+            # Writing to the index of titles refreshes them
+            with mock.patch.object(
+                index_manager,
+                "bulk_compat",
+                side_effect=lambda actions, **_: list(actions),
+            ):
+                index_manager.richie_bulk(
+                    [{"_index": "richie_organizations", "_id": "4"}]
+                )
+            self.assertEqual(organizations.get_i18n_names(["1"]), {"1": "Org 1"})
+            self.assertEqual(mock_search.call_count, 3)
+            self.assertEqual(
+                mock_search.call_args[1]["body"],
+                {"_source": ["title"], "query": {"terms": {"_id": ["1"]}}, "size": 1},
+            )
@@ -6,9 +6,13 @@ from unittest import mock
 
 from django.http.request import QueryDict
 from django.test import TestCase
+from django.test.utils import override_settings
+
+import arrow
 
 from richie.apps.core.defaults import ALL_LANGUAGES_DICT
 from richie.apps.search.forms import CourseSearchForm
+from richie.apps.search.utils.cursors import encode_cursor
 
 
 @mock.patch.dict(ALL_LANGUAGES_DICT, {"fr": "French", "en": "English"})
@@ -31,7 +35,9 @@ class CourseSearchFormTestCase(TestCase):
             form.cleaned_data,
             {
                 "availability": [],
+                "cursor": None,
                 "facet_sorting": "",
+                "facets_token": "",
                 "languages": [],
                 "levels": [],
                 "levels_aggs": [],
@@ -154,7 +160,9 @@ class CourseSearchFormTestCase(TestCase):
             form.cleaned_data,
             {
                 "availability": ["coming_soon"],
+                "cursor": None,
                 "facet_sorting": "count",
+                "facets_token": "",
                 "languages": ["fr"],
                 "levels": ["1"],
                 "levels_aggs": [],
@@ -222,7 +230,9 @@ class CourseSearchFormTestCase(TestCase):
             form.cleaned_data,
             {
                 "availability": ["coming_soon", "ongoing"],
+                "cursor": None,
                 "facet_sorting": "name",
+                "facets_token": "",
                 "languages": ["fr", "en"],
                 "levels": ["1", "2"],
                 "levels_aggs": ["33", "34"],
@@ -317,3 +327,61 @@ class CourseSearchFormTestCase(TestCase):
             self.assertTrue(
                 {"term": {"is_listed": True}} in agg["filter"]["bool"]["must"]
             )
+
+    @mock.patch("arrow.utcnow", return_value=arrow.get(2020, 2, 9))
+    def test_forms_courses_get_score_script(self, *_):
+        """
+        Courses should be ranked by the script computing the best state of their course
+        runs at query time by default.
+        """
+        form = CourseSearchForm(data=QueryDict())
+        self.assertTrue(form.is_valid())
+        self.assertEqual(
+            form.get_score_script(),
+            {
+                "id": "score",
+                "params": {
+                    "languages": None,
+                    "ms_since_epoch": 1581206400000,
+                    "states": None,
+                },
+            },
+        )
+
+    @mock.patch("arrow.utcnow", return_value=arrow.get(2020, 2, 9))
+    def test_forms_courses_get_score_script_cursor(self, *_):
+        """
+        Courses should be ranked at the date carried by the cursor, if any, so that their
+        ranking does not move while their pages of results are fetched.
+        """
+        cursor = encode_cursor({"after": [80.5, "42"], "now": 1577836800000})
+        form = CourseSearchForm(data=QueryDict(query_string=f"cursor={cursor:s}"))
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.ms_since_epoch, 1577836800000)
+        self.assertEqual(
+            form.get_score_script()["params"]["ms_since_epoch"], 1577836800000
+        )
+
+        cursor = encode_cursor({"after": [80.5, "42"]})
+        form = CourseSearchForm(data=QueryDict(query_string=f"cursor={cursor:s}"))
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.ms_since_epoch, 1581206400000)
+
+    @override_settings(RICHIE_ES_COURSES_RANKING="sort_keys")
+    @mock.patch("arrow.utcnow", return_value=arrow.get(2020, 2, 9))
+    def test_forms_courses_get_score_script_sort_keys(self, *_):
+        """
+        The sort keys computed at index time should be used to rank courses if activated
+        and if the ranking does not depend on filters on course runs.
+        """
+        form = CourseSearchForm(data=QueryDict(query_string="query=maths"))
+        self.assertTrue(form.is_valid())
+        self.assertEqual(
+            form.get_score_script(),
+            {"id": "score_sort_keys", "params": {"ms_since_epoch": 1581206400000}},
+        )
+
+        for query_string in ["languages=fr", "availability=open"]:
+            form = CourseSearchForm(data=QueryDict(query_string=query_string))
+            self.assertTrue(form.is_valid())
+            self.assertEqual(form.get_score_script()["id"], "score")
@@ -9,6 +9,7 @@ from django.test import TestCase
 
 from richie.apps.core.defaults import ALL_LANGUAGES_DICT
 from richie.apps.search.forms import ItemSearchForm
+from richie.apps.search.utils.cursors import encode_cursor
 
 
 @mock.patch.dict(ALL_LANGUAGES_DICT, {"fr": "French", "en": "English"})
@@ -27,7 +28,8 @@ class ItemSearchFormTestCase(TestCase):
         form = ItemSearchForm(data=QueryDict())
         self.assertTrue(form.is_valid())
         self.assertEqual(
-            form.cleaned_data, {"limit": None, "offset": None, "query": "", "scope": ""}
+            form.cleaned_data,
+            {"cursor": None, "limit": None, "offset": None, "query": "", "scope": ""},
         )
 
     def test_forms_items_limit_greater_than_1(self, *_):
@@ -97,9 +99,33 @@ class ItemSearchFormTestCase(TestCase):
         )
         self.assertTrue(form.is_valid())
         self.assertEqual(
-            form.cleaned_data, {"limit": 9, "offset": 3, "query": "maths", "scope": ""}
+            form.cleaned_data,
+            {"cursor": None, "limit": 9, "offset": 3, "query": "maths", "scope": ""},
         )
 
+    def test_forms_items_cursor(self, *_):
+        """The `cursor` param should be decoded to the values it holds."""
+        cursor = encode_cursor({"after": ["maths", "42"]})
+        form = ItemSearchForm(data=QueryDict(query_string=f"cursor={cursor:s}"))
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["cursor"], {"after": ["maths", "42"]})
+
+        # An empty cursor requests the first page of results paginated with cursors
+        form = ItemSearchForm(data=QueryDict(query_string="cursor="))
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["cursor"], {})
+
+    def test_forms_items_cursor_invalid(self, *_):
+        """The `cursor` param should be rejected if it does not point to a document."""
+        for cursor in [
+            "invalid",
+            encode_cursor(["maths", "42"]),
+            encode_cursor({"before": ["maths", "42"]}),
+        ]:
+            form = ItemSearchForm(data=QueryDict(query_string=f"cursor={cursor:s}"))
+            self.assertFalse(form.is_valid())
+            self.assertEqual(form.errors, {"cursor": ["Invalid cursor."]})
+
     def test_forms_items_build_es_query_search_by_match_text(self, *_):
         """
         Happy path: build a query that filters items by matching text
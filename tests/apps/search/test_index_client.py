@@ -2,15 +2,34 @@
 Test the index client initialization.
 """
 
+from unittest import mock
+
+from django.core.cache import caches
 from django.test import TestCase
 from django.test.utils import override_settings
 
+from elasticsearch import Elasticsearch
+from elasticsearch.client import IndicesClient
+from elasticsearch.exceptions import ConnectionError as ESConnectionError
+
+from richie.apps.search import apps, index_manager
+from richie.apps.search.apps import get_es_client
+from richie.apps.search.elasticsearch import (
+    ElasticsearchClientCompat7to6,
+    ElasticsearchIndicesClientCompat7to6,
+    InstrumentedTransport,
+)
+
 
 class IndexClientTestCase(TestCase):
     """
     Test the index client.
     """
 
+    def setUp(self):
+        super().setUp()
+        caches["search"].clear()
+
     # pylint: disable=import-outside-toplevel
     @override_settings(RICHIE_ES_CLIENT_KWARGS={"timeout": 99})
     def test_index_client_kwargs(self):
@@ -21,6 +40,183 @@ class IndexClientTestCase(TestCase):
         from richie.apps.search.apps import init_es
 
         init_es()
-        from richie.apps.search.apps import ES_CLIENT
+        from richie.apps.search.apps import ES_BULK_CLIENT, ES_CLIENT
+
+        # The options of the transport are consumed by it and the others are passed to
+        # the connections
+        self.assertEqual(ES_CLIENT.transport.kwargs, {"timeout": 99, "maxsize": 10})
+        self.assertEqual(ES_CLIENT.transport.max_retries, 1)
+        self.assertFalse(ES_CLIENT.transport.retry_on_timeout)
+        self.assertEqual(ES_BULK_CLIENT.transport.kwargs, {"timeout": 99, "maxsize": 4})
+        self.assertEqual(ES_BULK_CLIENT.transport.max_retries, 3)
+        self.assertTrue(ES_BULK_CLIENT.transport.retry_on_timeout)
+
+    # pylint: disable=import-outside-toplevel
+    @override_settings(
+        RICHIE_ES_CLIENT_KWARGS={"timeout": 99, "http_compress": True},
+        RICHIE_ES_CLIENT_PROFILES={"bulk": {"timeout": 300, "maxsize": 8}},
+    )
+    def test_index_client_profiles(self):
+        """
+        Test `RICHIE_ES_CLIENT_PROFILES` setting, that allows to configure the client of
+        each profile over `RICHIE_ES_CLIENT_KWARGS`.
+        """
+        from richie.apps.search.apps import init_es
+
+        init_es()
+        from richie.apps.search.apps import ES_BULK_CLIENT, ES_CLIENT, ES_INDICES_CLIENT
+
+        self.assertEqual(
+            ES_CLIENT.transport.kwargs,
+            {"timeout": 99, "http_compress": True, "maxsize": 10},
+        )
+        self.assertEqual(
+            ES_BULK_CLIENT.transport.kwargs,
+            {"timeout": 300, "http_compress": True, "maxsize": 8},
+        )
+        self.assertEqual(
+            ES_BULK_CLIENT.transport.get_metrics(),
+            {
+                "requests": 0,
+                "retries": 0,
+                "pools": [
+                    {
+                        "host": mock.ANY,
+                        "maxsize": 8,
+                        "in_use": 0,
+                        "opened": 0,
+                    }
+                ],
+            },
+        )
+        self.assertIs(ES_INDICES_CLIENT.client, ES_BULK_CLIENT)
+
+    def test_index_client_metrics(self):
+        """
+        The transport of the clients should count the requests it performs and the
+        attempts that were retried.
+        """
+        client = get_es_client("bulk")
+        connection = client.transport.connection_pool.connections[0]
+        with mock.patch.object(
+            connection,
+            "perform_request",
+            side_effect=[
+                ESConnectionError("N/A", "Connection refused", None),
+                ESConnectionError("N/A", "Connection refused", None),
+                (200, {}, "{}"),
+                (200, {}, "{}"),
+            ],
+        ):
+            client.transport.perform_request("GET", "/")
+            client.transport.perform_request("GET", "/")
+
+        metrics = client.transport.get_metrics()
+        self.assertEqual(metrics["requests"], 2)
+        self.assertEqual(metrics["retries"], 2)
+        self.assertEqual(len(metrics["pools"]), 1)
+        self.assertEqual(metrics["pools"][0]["maxsize"], 4)
+
+    @override_settings(RICHIE_ES_VERSION="7.17.9")
+    @mock.patch("elasticsearch.Elasticsearch.info")
+    def test_index_client_version_setting(self, mock_info):
+        """
+        The version of Elasticsearch should not be probed if it is configured and the
+        compatibility layer should be bypassed if it is not 6.
+        """
+        apps.init_es()
+
+        mock_info.assert_not_called()
+        self.assertIs(type(apps.ES_CLIENT), Elasticsearch)
+        self.assertIs(type(apps.ES_BULK_CLIENT), Elasticsearch)
+        self.assertIs(type(apps.ES_INDICES_CLIENT), IndicesClient)
+        self.assertIsInstance(apps.ES_CLIENT.transport, InstrumentedTransport)
+
+    @override_settings(RICHIE_ES_VERSION="6")
+    @mock.patch("elasticsearch.Elasticsearch.info")
+    def test_index_client_version_setting_6(self, mock_info):
+        """The compatibility layer should be used if Elasticsearch 6 is configured."""
+        apps.init_es()
+
+        mock_info.assert_not_called()
+        self.assertIsInstance(apps.ES_CLIENT, ElasticsearchClientCompat7to6)
+        self.assertEqual(apps.ES_CLIENT.__es_version__, "6")
+        self.assertEqual(apps.ES_BULK_CLIENT.__es_version__, "6")
+        self.assertIsInstance(
+            apps.ES_INDICES_CLIENT, ElasticsearchIndicesClientCompat7to6
+        )
+
+    @mock.patch(
+        "elasticsearch.Elasticsearch.info",
+        return_value={"version": {"number": "6.8.23"}},
+    )
+    def test_index_client_version_detected(self, mock_info):
+        """
+        The version of Elasticsearch should be probed once at initialization and shared
+        with the other processes through the search cache.
+        """
+        apps.init_es()
+
+        self.assertEqual(apps.ES_CLIENT.__es_version__, "6")
+        self.assertEqual(apps.ES_BULK_CLIENT.__es_version__, "6")
+        mock_info.assert_called_once()
+        self.assertEqual(caches["search"].get("es_version"), "6")
+
+        # Another process initializing its clients reuses the version detected
+        mock_info.reset_mock()
+        apps.init_es()
+
+        self.assertEqual(apps.ES_CLIENT.__es_version__, "6")
+        mock_info.assert_not_called()
+
+    @mock.patch(
+        "elasticsearch.Elasticsearch.info",
+        return_value={"version": {"number": "7.10.2"}},
+    )
+    def test_index_client_version_detected_7(self, mock_info):
+        """Plain clients should be used if the version detected is not 6."""
+        apps.init_es()
+
+        mock_info.assert_called_once()
+        self.assertEqual(caches["search"].get("es_version"), "7")
+        self.assertIs(type(apps.ES_CLIENT), Elasticsearch)
+        self.assertIs(type(apps.ES_BULK_CLIENT), Elasticsearch)
+
+    @mock.patch(
+        "elasticsearch.Elasticsearch.info",
+        side_effect=ESConnectionError("N/A", "Connection refused", None),
+    )
+    def test_index_client_version_unreachable(self, mock_info):
+        """
+        The clients should detect the version on first use if Elasticsearch can't be
+        reached at initialization.
+        """
+        with self.assertLogs("richie.apps.search.apps", "WARNING"):
+            apps.init_es()
+
+        self.assertIsNone(caches["search"].get("es_version"))
+        mock_info.assert_called_once()
+
+        mock_info.reset_mock(side_effect=True)
+        mock_info.return_value = {"version": {"number": "7.10.2"}}
+        self.assertEqual(apps.ES_CLIENT.__es_version__, "7")
+        mock_info.assert_called_once()
+        self.assertEqual(caches["search"].get("es_version"), "7")
+
+    @override_settings(RICHIE_ES_VERSION="7")
+    @mock.patch.object(index_manager, "bulk_compat")
+    @mock.patch.object(index_manager, "bulk", return_value=(1, 0))
+    def test_index_client_bulk_without_compat(self, mock_bulk, mock_bulk_compat):
+        """
+        Actions should be sent with the bulk helper of elasticsearch-py directly if the
+        client does not target Elasticsearch 6.
+        """
+        client = apps.get_es_client("bulk", "7")
+        actions = [{"_id": 1, "_index": "richie_courses", "_op_type": "delete"}]
+        with mock.patch.object(index_manager, "ES_BULK_CLIENT", client):
+            self.assertEqual(index_manager.richie_bulk(actions), (1, 0))
 
-        self.assertEqual(ES_CLIENT.transport.kwargs, {"timeout": 99})
+        mock_bulk_compat.assert_not_called()
+        mock_bulk.assert_called_once_with(
+            actions=actions, chunk_size=500, client=client, stats_only=True
+        )
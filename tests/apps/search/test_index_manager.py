@@ -12,7 +12,7 @@ from django.utils import timezone as django_timezone
 from elasticsearch.exceptions import NotFoundError
 
 from richie.apps.courses.factories import CourseFactory
-from richie.apps.search.apps import ES_CLIENT, ES_INDICES_CLIENT
+from richie.apps.search.apps import ES_BULK_CLIENT, ES_CLIENT, ES_INDICES_CLIENT
 from richie.apps.search.index_manager import (
     ES_INDICES,
     get_indices_by_alias,
@@ -338,7 +338,7 @@ class IndexManagerTestCase(TestCase):
         "richie.apps.search.indexers.categories.CategoriesIndexer.scripts",
         new={"script_id_C": "script body C"},
     )
-    @mock.patch.object(ES_CLIENT, "put_script")
+    @mock.patch.object(ES_BULK_CLIENT, "put_script")
     # pylint: disable=unused-argument
     def test_index_manager_store_es_scripts(self, mock_put_script, *args):
         """
@@ -77,12 +77,14 @@ class CategoriesIndexersTestCase(TestCase):
                         "en": "/en/categories/subjects/my-first-subject/my-second-subject/",
                         "fr": "/fr/categories/sujets/ma-premiere-thematique/ma-deuxieme-thematic/",
                     },
+                    "color": category2.color,
                     "complete": {
                         "en": ["my second subject", "second subject", "subject"],
                         "fr": ["ma deuxième thématic", "deuxième thématic", "thématic"],
                     },
                     "description": {},
                     "icon": {},
+                    "id": category2.get_es_id(),
                     "is_meta": False,
                     "kind": "subjects",
                     "logo": {},
@@ -102,6 +104,7 @@ class CategoriesIndexersTestCase(TestCase):
                         "en": "/en/categories/subjects/my-first-subject/",
                         "fr": "/fr/categories/sujets/ma-premiere-thematique/",
                     },
+                    "color": category1.color,
                     "complete": {
                         "en": ["my first subject", "first subject", "subject"],
                         "fr": [
@@ -115,6 +118,7 @@ class CategoriesIndexersTestCase(TestCase):
                         "fr": "description français ligne 1. description français ligne 2.",
                     },
                     "icon": {"en": "picture info", "fr": "picture info"},
+                    "id": category1.get_es_id(),
                     "is_meta": False,
                     "kind": "subjects",
                     "logo": {"en": "picture info", "fr": "picture info"},
@@ -134,9 +138,11 @@ class CategoriesIndexersTestCase(TestCase):
                         "en": "/en/categories/subjects/",
                         "fr": "/fr/categories/sujets/",
                     },
+                    "color": meta.color,
                     "complete": {"en": ["Subjects"], "fr": ["Sujets"]},
                     "description": {},
                     "icon": {"en": "picture info", "fr": "picture info"},
+                    "id": meta.get_es_id(),
                     "is_meta": True,
                     "kind": "meta",
                     "logo": {"en": "picture info", "fr": "picture info"},
@@ -185,9 +191,11 @@ class CategoriesIndexersTestCase(TestCase):
                         "en": "/en/categories/subjects/",
                         "fr": "/fr/categories/subjects/",
                     },
+                    "color": meta.color,
                     "complete": {"en": ["Subjects"]},
                     "description": {},
                     "icon": {},
+                    "id": meta.get_es_id(),
                     "is_meta": True,
                     "kind": "meta",
                     "logo": {},
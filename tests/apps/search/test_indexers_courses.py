@@ -8,6 +8,7 @@ from unittest import mock
 from django.test import TestCase
 
 from cms.api import add_plugin, create_page
+from cms.models import CMSPlugin, Page
 
 from richie.apps.core.helpers import create_i18n_page
 from richie.apps.courses.cms_plugins import CategoryPlugin
@@ -20,10 +21,14 @@ from richie.apps.courses.factories import (
     OrganizationFactory,
     PersonFactory,
 )
-from richie.apps.courses.models import CourseState
+from richie.apps.courses.models import Course, CourseRun, CourseState
 from richie.apps.courses.models.course import CourseRunCatalogVisibility
 from richie.apps.search.indexers.categories import CategoriesIndexer
 from richie.apps.search.indexers.courses import CoursesIndexer
+from richie.apps.search.indexers.courses_batch import (
+    get_course_runs_doc_values,
+    get_course_runs_state,
+)
 from richie.apps.search.indexers.organizations import OrganizationsIndexer
 from richie.plugins.simple_picture.cms_plugins import SimplePicturePlugin
 
@@ -178,8 +183,163 @@ class CoursesIndexersTestCase(TestCase):
         self.assertEqual(len(indexed_courses), 1)
         self.assertEqual(indexed_courses[0]["_id"], course.get_es_id())
 
+    # pylint: disable=too-many-locals
+    def test_indexers_courses_get_es_documents_for_courses_chunk(self):
+        """
+        Documents built for a chunk of courses should each hold the objects related to
+        their own course, and the number of queries should not depend on the number
+        of courses in the chunk.
+        """
+        meta = CategoryFactory(
+            page_parent=create_i18n_page("Categories", published=True),
+            page_reverse_id="subjects",
+            page_title="Subjects",
+            should_publish=True,
+        )
+        parent = CategoryFactory(page_parent=meta.extended_object, should_publish=True)
+        categories = CategoryFactory.create_batch(
+            2, page_parent=parent.extended_object, should_publish=True
+        )
+        organizations = OrganizationFactory.create_batch(3, should_publish=True)
+        persons = PersonFactory.create_batch(3, should_publish=True)
+        licences = LicenceFactory.create_batch(2)
+
+        expected_documents = []
+        for i in range(3):
+            course = CourseFactory(
+                fill_categories=categories[: i + 1],
+                fill_organizations=organizations[i:],
+                fill_team=persons[: i + 1],
+                fill_licences=[("course_license_content", licences[i % 2])],
+            )
+            CourseRunFactory.create_batch(i + 1, direct_course=course)
+            course.extended_object.publish("en")
+            # Add a snapshot with its own course run
+            snapshot = CourseFactory(
+                page_parent=course.extended_object, should_publish=True
+            )
+            CourseRunFactory(direct_course=snapshot)
+            snapshot.extended_object.publish("en")
+
+            # The runs of the snapshot are indexed with the runs of the course
+            public_course = course.extended_object.get_public_object().course
+            course_runs = CourseRun.objects.filter(
+                direct_course__in=[
+                    public_course,
+                    snapshot.extended_object.get_public_object().course,
+                ]
+            )
+            course_categories = [parent, *categories[: i + 1]]
+            expected_documents.append(
+                {
+                    "_id": public_course.get_es_id(),
+                    "categories": sorted(c.get_es_id() for c in course_categories),
+                    "categories_names": sorted(
+                        c.extended_object.get_title() for c in course_categories
+                    ),
+                    "course_runs": sorted(run.start for run in course_runs),
+                    "licences": [licences[i % 2].id],
+                    "organizations": sorted(o.get_es_id() for o in organizations[i:]),
+                    "organizations_names": sorted(
+                        o.extended_object.get_title() for o in organizations[i:]
+                    ),
+                    "persons": sorted(p.get_es_id() for p in persons[: i + 1]),
+                    "persons_names": sorted(
+                        p.extended_object.get_title() for p in persons[: i + 1]
+                    ),
+                    "title": course.extended_object.get_title(),
+                }
+            )
+
+        courses = list(
+            Course.objects.filter(
+                extended_object__publisher_is_draft=False,
+                extended_object__node__parent__cms_pages__course__isnull=True,
+            )
+            .distinct()
+            .order_by("extended_object__node__path")
+        )
+        self.assertEqual(len(courses), 3)
+
+        documents = CoursesIndexer.get_es_documents_for_courses(
+            courses, index="some_index"
+        )
+        self.assertEqual(
+            [
+                {
+                    "_id": document["_id"],
+                    "categories": sorted(document["categories"]),
+                    "categories_names": sorted(document["categories_names"]["en"]),
+                    "course_runs": sorted(
+                        run["start"] for run in document["course_runs"]
+                    ),
+                    "licences": document["licences"],
+                    "organizations": sorted(document["organizations"]),
+                    "organizations_names": sorted(
+                        document["organizations_names"]["en"]
+                    ),
+                    "persons": sorted(document["persons"]),
+                    "persons_names": sorted(document["persons_names"]["en"]),
+                    "title": document["title"]["en"],
+                }
+                for document in documents
+            ],
+            expected_documents,
+        )
+
+        # The number of queries should be the same for a chunk of 1 or 3 courses
+        courses = list(Course.objects.filter(pk__in=[c.pk for c in courses]))
+        with self.assertNumQueries(24):
+            CoursesIndexer.get_es_documents_for_courses(courses[:1])
+
+        courses = list(Course.objects.filter(pk__in=[c.pk for c in courses]))
+        with self.assertNumQueries(24):
+            CoursesIndexer.get_es_documents_for_courses(courses)
+
+    def test_indexers_courses_get_es_documents_since(self):
+        """
+        When a date is given, only the courses whose page, snapshots or related pages
+        changed since this date should be indexed.
+        """
+        organization = OrganizationFactory(should_publish=True)
+        courses = CourseFactory.create_batch(
+            3, fill_organizations=[organization], should_publish=True
+        )
+        snapshot = CourseFactory(
+            page_parent=courses[1].extended_object, should_publish=True
+        )
+
+        # Make as if everything had been modified a long time ago
+        old_date = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        Page.objects.update(changed_date=old_date)
+        CMSPlugin.objects.update(changed_date=old_date)
+        since = datetime(2021, 1, 1, tzinfo=timezone.utc)
+        self.assertEqual(list(CoursesIndexer.get_es_documents(since=since)), [])
+
+        # Modify the page of a course and the page of a snapshot
+        new_date = datetime(2022, 1, 1, tzinfo=timezone.utc)
+        Page.objects.filter(
+            pk__in=[
+                courses[0].public_extension.extended_object_id,
+                snapshot.public_extension.extended_object_id,
+            ]
+        ).update(changed_date=new_date)
+        self.assertEqual(
+            sorted(
+                document["_id"]
+                for document in CoursesIndexer.get_es_documents(since=since)
+            ),
+            sorted([courses[0].get_es_id(), courses[1].get_es_id()]),
+        )
+
+        # Modify the organization: all the courses related to it should be reindexed
+        Page.objects.filter(pk=organization.extended_object_id).update(
+            changed_date=new_date
+        )
+        self.assertEqual(len(list(CoursesIndexer.get_es_documents(since=since))), 3)
+
     @mock.patch(
-        "richie.apps.search.indexers.courses.get_picture_info",
+        "richie.apps.search.indexers.courses_batch.get_picture_info",
         return_value={"info": "picture info"},
     )
     # pylint: disable=too-many-locals
@@ -361,6 +521,7 @@ class CoursesIndexersTestCase(TestCase):
                     "title": "Titre cat 1",
                 },
             },
+            "id": course.get_es_id(),
             "introduction": {
                 "en": "english introduction.",
                 "fr": "introduction française.",
@@ -398,6 +559,10 @@ class CoursesIndexersTestCase(TestCase):
             "pace": 40,
             "title": {"fr": "un titre cours français", "en": "an english course title"},
         }
+        expected_course.update(get_course_runs_state(expected_course["course_runs"]))
+        expected_course.update(
+            get_course_runs_doc_values(expected_course["course_runs"])
+        )
         indexed_courses = list(
             CoursesIndexer.get_es_documents(index="some_index", action="some_action")
         )
@@ -444,9 +609,15 @@ class CoursesIndexersTestCase(TestCase):
                     "duration": {"en": "12 weeks", "fr": "12 semaines"},
                     "effort": {"en": "36 minutes", "fr": "36 minutes"},
                     "icon": {},
+                    "id": str(course.extended_object.publisher_public_id),
                     "introduction": {},
                     "is_new": False,
                     "is_listed": True,
+                    "best_state": CourseState.TO_BE_SCHEDULED,
+                    "state_transition_at": None,
+                    "state_sort_ms": None,
+                    "course_runs_ms": [],
+                    "course_runs_languages": [],
                     "licences": [],
                     "organization_highlighted": None,
                     "organization_highlighted_cover_image": {},
@@ -552,6 +723,96 @@ class CoursesIndexersTestCase(TestCase):
             indexed_courses[0]["course_runs"][0]["enrollment_end"].year, 9999
         )
 
+    def test_indexers_courses_get_es_documents_best_state(self):
+        """
+        The best state of the course runs of a course, the date ranking it within this state
+        and the next time it changes should be indexed so that they don't have to be computed
+        at query time.
+        """
+        course = CourseFactory()
+        CourseRunFactory(
+            direct_course=course,
+            start=datetime(2019, 3, 1, tzinfo=timezone.utc),
+            end=datetime(2019, 6, 1, tzinfo=timezone.utc),
+            enrollment_start=datetime(2019, 1, 1, tzinfo=timezone.utc),
+            enrollment_end=datetime(2019, 2, 1, tzinfo=timezone.utc),
+        )
+        CourseRunFactory(
+            direct_course=course,
+            start=datetime(2019, 5, 1, tzinfo=timezone.utc),
+            end=None,
+            enrollment_start=datetime(2019, 4, 1, tzinfo=timezone.utc),
+            enrollment_end=None,
+        )
+        course.extended_object.publish("en")
+
+        with mock.patch(
+            "django.utils.timezone.now",
+            return_value=datetime(2019, 2, 15, tzinfo=timezone.utc),
+        ):
+            indexed_courses = list(
+                CoursesIndexer.get_es_documents(
+                    index="some_index", action="some_action"
+                )
+            )
+
+        self.assertEqual(
+            indexed_courses[0]["best_state"], CourseState.FUTURE_NOT_YET_OPEN
+        )
+        self.assertEqual(
+            indexed_courses[0]["state_transition_at"],
+            datetime(2019, 3, 1, tzinfo=timezone.utc),
+        )
+        # Courses in this state are ranked by the start date of their best course run
+        self.assertEqual(
+            indexed_courses[0]["state_sort_ms"],
+            datetime(2019, 5, 1, tzinfo=timezone.utc).timestamp() * 1000,
+        )
+
+    def test_indexers_courses_get_course_runs_doc_values(self):
+        """
+        The dates and languages of course runs should be encoded in fields that scripts can
+        read from doc values without losing the course run to which they belong.
+        """
+        course_runs = [
+            {
+                "start": datetime(2019, 3, 1, tzinfo=timezone.utc),
+                "end": datetime(2019, 6, 1, tzinfo=timezone.utc),
+                "enrollment_start": datetime(2019, 1, 1, tzinfo=timezone.utc),
+                "enrollment_end": datetime(2019, 2, 1, tzinfo=timezone.utc),
+                "languages": ["fr", "en"],
+            },
+            {
+                "start": datetime(2019, 5, 1, tzinfo=timezone.utc),
+                "end": datetime(9999, 12, 31, tzinfo=timezone.utc),
+                "enrollment_start": datetime(2019, 4, 1, tzinfo=timezone.utc),
+                "enrollment_end": datetime(9999, 12, 31, tzinfo=timezone.utc),
+                "languages": ["de"],
+            },
+        ]
+
+        doc_values = get_course_runs_doc_values(course_runs)
+
+        self.assertEqual(
+            doc_values["course_runs_languages"], ["0000:fr", "0000:en", "0001:de"]
+        )
+        # Decode the dates as the scripts do
+        dates = {}
+        for value in sorted(doc_values["course_runs_ms"]):
+            dates[(value >> 50, (value >> 48) & 3)] = datetime.fromtimestamp(
+                (value & ((1 << 48) - 1)) / 1000, tz=timezone.utc
+            )
+        self.assertEqual(
+            dates,
+            {
+                (index, position): course_run[field]
+                for index, course_run in enumerate(course_runs)
+                for position, field in enumerate(
+                    ["start", "end", "enrollment_start", "enrollment_end"]
+                )
+            },
+        )
+
     def test_indexers_courses_get_es_document_no_image_cover_picture(self):
         """
         ES document is created without errors when a cover image for the course is
@@ -785,6 +1046,26 @@ class CoursesIndexersTestCase(TestCase):
 
     # format_es_object_for_api
 
+    @staticmethod
+    def get_api_course_run():
+        """Return a course run as stored in course documents and returned by the API."""
+        return {
+            "start": "2019-02-17T21:25:52.179667+00:00",
+            "end": "2019-05-17T21:25:52.179667+00:00",
+            "enrollment_start": "2019-01-17T21:25:52.179667+00:00",
+            "enrollment_end": "2019-03-17T21:25:52.179667+00:00",
+            "languages": ["en"],
+            "offer": "paid",
+            "price": 1337.00,
+            "certificate_offer": "free",
+            "certificate_price": None,
+            "price_currency": "EUR",
+            "discounted_price": None,
+            "discount": None,
+            "certificate_discounted_price": None,
+            "certificate_discount": None,
+        }
+
     def test_indexers_courses_format_es_object_for_api(self):
         """
         Make sure format_es_object_for_api returns a properly formatted course
@@ -795,7 +1076,7 @@ class CoursesIndexersTestCase(TestCase):
                 "absolute_url": {"en": "campo-qui-format-do"},
                 "categories": [43, 86],
                 "code": "abc123",
-                "course_runs": [],
+                "course_runs": [self.get_api_course_run()],
                 "cover_image": {"en": "cover_image.jpg"},
                 "duration": {"en": "6 months"},
                 "effort": {"en": "3 hours"},
@@ -807,22 +1088,7 @@ class CoursesIndexersTestCase(TestCase):
                 "organizations_names": {"en": ["Org 42", "Org 84"]},
                 "title": {"en": "Duis eu arcu erat"},
             },
-            "fields": {
-                "state": [
-                    {"priority": 0, "date_time": "2019-03-17T21:25:52.179667+00:00"}
-                ],
-                "offer_fields": [
-                    {
-                        "offer": "paid",
-                        "price": 1337.00,
-                        "certificate_offer": "free",
-                        "certificate_price": None,
-                        "price_currency": "EUR",
-                        "certificate_discounted_price": None,
-                        "certificate_discount": None,
-                    }
-                ],
-            },
+            "fields": {"state": [{"priority": 0, "index": 0}]},
         }
         self.assertEqual(
             CoursesIndexer.format_es_object_for_api(es_course, "en"),
@@ -831,7 +1097,7 @@ class CoursesIndexersTestCase(TestCase):
                 "absolute_url": "campo-qui-format-do",
                 "categories": [43, 86],
                 "code": "abc123",
-                "course_runs": [],
+                "course_runs": [self.get_api_course_run()],
                 "cover_image": "cover_image.jpg",
                 "duration": "6 months",
                 "effort": "3 hours",
@@ -849,11 +1115,40 @@ class CoursesIndexersTestCase(TestCase):
                 "certificate_offer": "free",
                 "certificate_price": None,
                 "price_currency": "EUR",
+                "discounted_price": None,
+                "discount": None,
                 "certificate_discounted_price": None,
                 "certificate_discount": None,
             },
         )
 
+    def test_indexers_courses_format_es_object_for_api_no_course_run(self):
+        """
+        A course that has no course runs should be formatted without date nor offer.
+        """
+        es_course = {
+            "_id": 93,
+            "_source": {
+                "absolute_url": {"en": "campo-qui-format-do"},
+                "categories": [],
+                "code": "abc123",
+                "course_runs": [],
+                "cover_image": {},
+                "duration": {},
+                "effort": {},
+                "icon": {},
+                "introduction": {},
+                "organizations": [],
+                "title": {"en": "Duis eu arcu erat"},
+            },
+            "fields": {"state": [{"priority": 7}]},
+        }
+        formatted_course = CoursesIndexer.format_es_object_for_api(es_course, "en")
+        self.assertEqual(formatted_course["course_runs"], [])
+        self.assertEqual(formatted_course["state"], CourseState(7))
+        self.assertIsNone(formatted_course["offer"])
+        self.assertIsNone(formatted_course["price"])
+
     def test_indexers_courses_format_es_object_for_api_no_organization(self):
         """
         A course that has no organization and was indexed should not raise 500 errors (although
@@ -865,7 +1160,7 @@ class CoursesIndexersTestCase(TestCase):
                 "absolute_url": {"en": "campo-qui-format-do"},
                 "categories": [43, 86],
                 "code": "abc123",
-                "course_runs": [],
+                "course_runs": [self.get_api_course_run()],
                 "cover_image": {"en": "cover_image.jpg"},
                 "duration": {"en": "3 weeks"},
                 "effort": {"en": "10 minutes"},
@@ -877,22 +1172,7 @@ class CoursesIndexersTestCase(TestCase):
                 "organizations_names": {},
                 "title": {"en": "Duis eu arcu erat"},
             },
-            "fields": {
-                "state": [
-                    {"priority": 0, "date_time": "2019-03-17T21:25:52.179667+00:00"}
-                ],
-                "offer_fields": [
-                    {
-                        "offer": "paid",
-                        "price": 1337.00,
-                        "certificate_offer": "free",
-                        "certificate_price": None,
-                        "price_currency": "EUR",
-                        "certificate_discounted_price": None,
-                        "certificate_discount": None,
-                    }
-                ],
-            },
+            "fields": {"state": [{"priority": 0, "index": 0}]},
         }
         self.assertEqual(
             CoursesIndexer.format_es_object_for_api(es_course, "en"),
@@ -901,7 +1181,7 @@ class CoursesIndexersTestCase(TestCase):
                 "absolute_url": "campo-qui-format-do",
                 "categories": [43, 86],
                 "code": "abc123",
-                "course_runs": [],
+                "course_runs": [self.get_api_course_run()],
                 "cover_image": "cover_image.jpg",
                 "duration": "3 weeks",
                 "effort": "10 minutes",
@@ -919,6 +1199,8 @@ class CoursesIndexersTestCase(TestCase):
                 "certificate_offer": "free",
                 "certificate_price": None,
                 "price_currency": "EUR",
+                "discounted_price": None,
+                "discount": None,
                 "certificate_discounted_price": None,
                 "certificate_discount": None,
             },
@@ -934,7 +1216,7 @@ class CoursesIndexersTestCase(TestCase):
                 "absolute_url": {"en": "campo-qui-format-do"},
                 "categories": [43, 86],
                 "code": "abc123",
-                "course_runs": [],
+                "course_runs": [self.get_api_course_run()],
                 "cover_image": {"en": "cover_image.jpg"},
                 "duration": {"en": "N/A"},
                 "effort": {"en": "N/A"},
@@ -946,22 +1228,7 @@ class CoursesIndexersTestCase(TestCase):
                 "organizations_names": {"en": ["Org 42", "Org 84"]},
                 "title": {"en": "Duis eu arcu erat"},
             },
-            "fields": {
-                "state": [
-                    {"priority": 0, "date_time": "2019-03-17T21:25:52.179667+00:00"}
-                ],
-                "offer_fields": [
-                    {
-                        "offer": "paid",
-                        "price": 1337.00,
-                        "certificate_offer": "free",
-                        "certificate_price": None,
-                        "price_currency": "EUR",
-                        "certificate_discounted_price": None,
-                        "certificate_discount": None,
-                    }
-                ],
-            },
+            "fields": {"state": [{"priority": 0, "index": 0}]},
         }
         self.assertEqual(
             CoursesIndexer.format_es_object_for_api(es_course, "en"),
@@ -970,7 +1237,7 @@ class CoursesIndexersTestCase(TestCase):
                 "absolute_url": "campo-qui-format-do",
                 "categories": [43, 86],
                 "code": "abc123",
-                "course_runs": [],
+                "course_runs": [self.get_api_course_run()],
                 "cover_image": "cover_image.jpg",
                 "duration": "N/A",
                 "effort": "N/A",
@@ -988,6 +1255,8 @@ class CoursesIndexersTestCase(TestCase):
                 "certificate_offer": "free",
                 "certificate_price": None,
                 "price_currency": "EUR",
+                "discounted_price": None,
+                "discount": None,
                 "certificate_discounted_price": None,
                 "certificate_discount": None,
             },
@@ -1003,7 +1272,7 @@ class CoursesIndexersTestCase(TestCase):
                 "absolute_url": {"en": "campo-qui-format-do"},
                 "categories": [43, 86],
                 "code": "abc123",
-                "course_runs": [],
+                "course_runs": [self.get_api_course_run()],
                 "cover_image": {},
                 "duration": {"en": "N/A"},
                 "effort": {"en": "N/A"},
@@ -1015,22 +1284,7 @@ class CoursesIndexersTestCase(TestCase):
                 "organizations_names": {"en": ["Org 42", "Org 84"]},
                 "title": {"en": "Duis eu arcu erat"},
             },
-            "fields": {
-                "state": [
-                    {"priority": 0, "date_time": "2019-03-17T21:25:52.179667+00:00"}
-                ],
-                "offer_fields": [
-                    {
-                        "offer": "paid",
-                        "price": 1337.00,
-                        "certificate_offer": "free",
-                        "certificate_price": None,
-                        "price_currency": "EUR",
-                        "certificate_discounted_price": None,
-                        "certificate_discount": None,
-                    }
-                ],
-            },
+            "fields": {"state": [{"priority": 0, "index": 0}]},
         }
         self.assertEqual(
             CoursesIndexer.format_es_object_for_api(es_course, "en"),
@@ -1039,7 +1293,7 @@ class CoursesIndexersTestCase(TestCase):
                 "absolute_url": "campo-qui-format-do",
                 "categories": [43, 86],
                 "code": "abc123",
-                "course_runs": [],
+                "course_runs": [self.get_api_course_run()],
                 "cover_image": None,
                 "duration": "N/A",
                 "effort": "N/A",
@@ -1057,6 +1311,8 @@ class CoursesIndexersTestCase(TestCase):
                 "certificate_offer": "free",
                 "certificate_price": None,
                 "price_currency": "EUR",
+                "discounted_price": None,
+                "discount": None,
                 "certificate_discounted_price": None,
                 "certificate_discount": None,
             },
@@ -1078,22 +1334,7 @@ class CoursesIndexersTestCase(TestCase):
                 "organizations_names": {"en": ["Org 42", "Org 84"]},
                 "title": {"en": "Duis eu arcu erat"},
             },
-            "fields": {
-                "state": [
-                    {"priority": 0, "date_time": "2019-03-17T21:25:52.179667+00:00"}
-                ],
-                "offer_fields": [
-                    {
-                        "offer": "paid",
-                        "price": 1337.00,
-                        "certificate_offer": "free",
-                        "certificate_price": None,
-                        "price_currency": "EUR",
-                        "certificate_discounted_price": None,
-                        "certificate_discount": None,
-                    }
-                ],
-            },
+            "fields": {"state": [{"priority": 0, "index": 0}]},
         }
         self.assertEqual(
             CoursesIndexer.format_es_document_for_autocomplete(es_course, "en"),
@@ -60,6 +60,7 @@ class LicencesIndexersTestCase(TestCase):
                         "en": licence1.content,
                         "fr": "première licence contenu",
                     },
+                    "id": str(licence1.id),
                     "title": {
                         "en": "my first licence",
                         "fr": "ma première licence",
@@ -89,6 +90,7 @@ class LicencesIndexersTestCase(TestCase):
                         "en": licence2.content,
                         "fr": "deuxième licence contenu",
                     },
+                    "id": str(licence2.id),
                     "title": {
                         "en": "my second licence",
                         "fr": "ma deuxième licence",
@@ -81,7 +81,9 @@ class OrganizationsIndexersTestCase(TestCase):
                         ],
                     },
                     "description": {},
+                    "id": organization2.get_es_id(),
                     "logo": {},
+                    "menu_title": {"en": None, "fr": None},
                     "title": {
                         "en": "my second organization",
                         "fr": "ma deuxième organisation",
@@ -115,7 +117,9 @@ class OrganizationsIndexersTestCase(TestCase):
                         "en": "english description line 1. english description line 2.",
                         "fr": "description français ligne 1. description français ligne 2.",
                     },
+                    "id": organization1.get_es_id(),
                     "logo": {"en": "logo info", "fr": "logo info"},
+                    "menu_title": {"en": None, "fr": None},
                     "title": {
                         "en": "my first organization",
                         "fr": "ma première organisation",
@@ -73,6 +73,7 @@ class PersonsIndexersTestCase(TestCase):
                         "en": ["my first person", "first person", "person"],
                         "fr": ["ma première personne", "première personne", "personne"],
                     },
+                    "id": str(person1.public_extension.extended_object.id),
                     "portrait": {"en": "portrait info", "fr": "portrait info"},
                     "title": {"en": "my first person", "fr": "ma première personne"},
                     "title_raw": {
@@ -93,6 +94,7 @@ class PersonsIndexersTestCase(TestCase):
                         "en": ["my second person", "second person", "person"],
                         "fr": ["ma deuxième personne", "deuxième personne", "personne"],
                     },
+                    "id": str(person2.public_extension.extended_object.id),
                     "portrait": {},
                     "title": {"en": "my second person", "fr": "ma deuxième personne"},
                     "title_raw": {
@@ -6,6 +6,7 @@ from unittest import mock
 
 from django.core.cache import caches
 from django.test import TestCase
+from django.test.utils import override_settings
 
 import arrow
 from cms.models import Page
@@ -22,6 +23,10 @@ from richie.apps.search.filter_definitions import FILTERS
 from richie.apps.search.filter_definitions.courses import ALL_LANGUAGES_DICT
 from richie.apps.search.indexers.categories import CategoriesIndexer
 from richie.apps.search.indexers.courses import CoursesIndexer
+from richie.apps.search.indexers.courses_batch import (
+    get_course_runs_doc_values,
+    get_course_runs_state,
+)
 from richie.apps.search.indexers.licences import LicencesIndexer
 from richie.apps.search.indexers.organizations import OrganizationsIndexer
 from richie.apps.search.indexers.persons import PersonsIndexer
@@ -114,6 +119,12 @@ class CourseRunsCoursesQueryTestCase(TestCase):
         # > [1, 3, 0]
         return list(list(zip(*sorted_courses))[0])
 
+    @staticmethod
+    def get_course_runs_state(course_runs, now):
+        """Compute the sort keys of a course at the time the course runs were generated."""
+        with mock.patch("django.utils.timezone.now", return_value=now.datetime):
+            return get_course_runs_state(course_runs)
+
     def prepare_indices(self, suite=None):
         """
         Not a test.
@@ -542,10 +553,10 @@ class CourseRunsCoursesQueryTestCase(TestCase):
         # Add the sorting script
         ES_CLIENT.put_script(id="score", body=CoursesIndexer.scripts["score"])
         ES_CLIENT.put_script(
-            id="state_field", body=CoursesIndexer.scripts["state_field"]
+            id="score_sort_keys", body=CoursesIndexer.scripts["score_sort_keys"]
         )
         ES_CLIENT.put_script(
-            id="offer_fields", body=CoursesIndexer.scripts["offer_fields"]
+            id="state_field", body=CoursesIndexer.scripts["state_field"]
         )
 
         # Actually insert our courses in the index
@@ -590,16 +601,22 @@ class CourseRunsCoursesQueryTestCase(TestCase):
                     "icon": {"en": "icon.jpg"},
                     "title": {"en": "title"},
                     **courses[course_id],
-                    "course_runs": sorted(
+                    "course_runs": sorted_course_runs,
+                    # Sort keys and doc values computed at index time
+                    **self.get_course_runs_state(sorted_course_runs, now),
+                    **get_course_runs_doc_values(sorted_course_runs),
+                }
+                for course_id, course_run_ids in courses_definition
+                for sorted_course_runs in [
+                    sorted(
                         [
                             # Each course randomly gets course runs (thanks to above shuffle)
                             course_runs[course_run_id]
                             for course_run_id in course_run_ids
                         ],
                         key=lambda o: now - o["end"],
-                    ),
-                }
-                for course_id, course_run_ids in courses_definition
+                    )
+                ]
             ]
         )
         bulk_compat(actions=actions, chunk_size=500, client=ES_CLIENT)
@@ -1148,6 +1165,25 @@ class CourseRunsCoursesQueryTestCase(TestCase):
             },
         )
 
+    def test_query_courses_match_all_sort_keys(self, *_):
+        """
+        Ranking courses with the sort keys computed at index time should give the same
+        ordering as computing the best state of each course at query time.
+        """
+        self.prepare_indices()
+        response = self.client.get("/api/v1.0/courses/?limit=20")
+        self.assertEqual(response.status_code, 200)
+        expected_ids = [course["id"] for course in response.json()["objects"]]
+        self.assertEqual(len(expected_ids), 4)
+
+        with override_settings(RICHIE_ES_COURSES_RANKING="sort_keys"):
+            response = self.client.get("/api/v1.0/courses/?limit=20")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [course["id"] for course in response.json()["objects"]], expected_ids
+        )
+
     def test_query_courses_match_all_grouped_course_runs(self, *_):
         """
         This test examines edge cases of the previous test which lead to different facet counts:
@@ -15,6 +15,9 @@ from richie.apps.search.apps import ES_CLIENT, ES_INDICES_CLIENT
 from richie.apps.search.elasticsearch import bulk_compat
 from richie.apps.search.filter_definitions import FILTERS
 from richie.apps.search.indexers.courses import CoursesIndexer
+from richie.apps.search.indexers.courses_batch import (
+    get_course_runs_doc_values,
+)
 from richie.apps.search.indexers.organizations import OrganizationsIndexer
 from richie.apps.search.text_indexing import ANALYSIS_SETTINGS
 
@@ -112,9 +115,6 @@ class EdgeCasesCoursesQueryTestCase(TestCase):
         ES_CLIENT.put_script(
             id="state_field", body=CoursesIndexer.scripts["state_field"]
         )
-        ES_CLIENT.put_script(
-            id="offer_fields", body=CoursesIndexer.scripts["offer_fields"]
-        )
 
         # Prepare actions to insert our courses and organizations in their indices
         actions = [
@@ -128,6 +128,7 @@ class EdgeCasesCoursesQueryTestCase(TestCase):
                 "_index": "test_courses",
                 "_op_type": "create",
                 **course,
+                **get_course_runs_doc_values(course.get("course_runs", [])),
             }
             for course in courses
         ]
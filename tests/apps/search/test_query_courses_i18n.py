@@ -2,6 +2,7 @@
 Tests related to internationalization of course searches.
 """
 
+from django.core.cache import caches
 from django.test import TestCase
 
 from richie.apps.courses.factories import (
@@ -28,6 +29,7 @@ class CoursesI18nQueryTestCase(TestCase):
         super().setUp()
         self.reset_filter_definitions_cache()
         self.prepare_es()
+        caches["search"].clear()
 
     def tearDown(self):
         """Reset indexable filters cache after each test to avoid impacting subsequent tests."""
@@ -71,9 +73,6 @@ class CoursesI18nQueryTestCase(TestCase):
         ES_CLIENT.put_script(
             id="state_field", body=CoursesIndexer.scripts["state_field"]
         )
-        ES_CLIENT.put_script(
-            id="offer_fields", body=CoursesIndexer.scripts["offer_fields"]
-        )
 
     def test_indexable_filters_internationalization(self):
         """
@@ -0,0 +1,209 @@
+"""
+Tests for the queues collecting page updates to reflect in the Elasticsearch indices
+"""
+
+import time
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from richie.apps.courses.factories import CourseFactory, OrganizationFactory
+from richie.apps.search.indexers.courses import CoursesIndexer
+from richie.apps.search.models import IndexingQueueItem
+from richie.apps.search.queues import (
+    BaseIndexingQueue,
+    DatabaseIndexingQueue,
+    ImmediateIndexingQueue,
+    ThreadIndexingQueue,
+    get_indexing_queue,
+    merge_es_actions,
+)
+
+
+@mock.patch.object(  # Avoid messing up the development Elasticsearch index
+    CoursesIndexer,
+    "index_name",
+    new_callable=mock.PropertyMock,
+    return_value="test_courses",
+)
+@mock.patch(
+    "richie.apps.search.index_manager.bulk_compat"
+)  # Mock call to Elasticsearch
+class IndexingQueuesTestCase(TestCase):
+    """
+    Test the queues that collect page updates, merge them and send the impacted
+    documents to Elasticsearch in bulk.
+    """
+
+    def test_queues_get_indexing_queue(self, *_):
+        """The queue configured in settings should be instantiated only once."""
+        with override_settings(
+            RICHIE_ES_INDEXING_QUEUE="richie.apps.search.queues.DatabaseIndexingQueue"
+        ):
+            queue = get_indexing_queue()
+            self.assertIsInstance(queue, DatabaseIndexingQueue)
+            self.assertIs(get_indexing_queue(), queue)
+
+        self.assertIsInstance(get_indexing_queue(), ImmediateIndexingQueue)
+
+    def test_queues_process_merge_documents(self, mock_bulk, *_):
+        """
+        A document impacted by several page updates should only be sent once to
+        Elasticsearch, and updates of pages that were deleted should be ignored.
+        """
+        organizations = OrganizationFactory.create_batch(2, should_publish=True)
+        course = CourseFactory(fill_organizations=organizations, should_publish=True)
+
+        count = BaseIndexingQueue.process(
+            {
+                (organizations[0].extended_object_id, "en"): "index",
+                (organizations[1].extended_object_id, "en"): "index",
+                (course.extended_object_id, "en"): "index",
+                (999999, "en"): "index",
+            }
+        )
+
+        self.assertEqual(count, 3)
+        self.assertEqual(mock_bulk.call_count, 1)
+        self.assertEqual(
+            sorted(action["_id"] for action in mock_bulk.call_args[1]["actions"]),
+            sorted(
+                [
+                    course.get_es_id(),
+                    organizations[0].get_es_id(),
+                    organizations[1].get_es_id(),
+                ]
+            ),
+        )
+
+    def test_queues_merge_es_actions(self, *_):
+        """
+        Partial updates should be merged into previous actions on the same document instead
+        of replacing them.
+        """
+        index = {"_id": "1", "_op_type": "index", "title": "a", "code": "b"}
+        update = {"_id": "1", "_op_type": "update", "doc": {"title": "c"}}
+        delete = {"_id": "1", "_op_type": "delete"}
+
+        self.assertEqual(merge_es_actions(None, update), update)
+        self.assertEqual(merge_es_actions(update, index), index)
+        self.assertEqual(merge_es_actions(index, delete), delete)
+        self.assertEqual(
+            merge_es_actions(index, update),
+            {"_id": "1", "_op_type": "index", "title": "c", "code": "b"},
+        )
+        self.assertEqual(
+            merge_es_actions(
+                {"_id": "1", "_op_type": "update", "doc": {"code": "d"}}, update
+            ),
+            {"_id": "1", "_op_type": "update", "doc": {"code": "d", "title": "c"}},
+        )
+        self.assertEqual(merge_es_actions(delete, update), delete)
+
+    def test_queues_process_nothing(self, mock_bulk, *_):
+        """Elasticsearch should not be called if there is no action to send."""
+        self.assertEqual(BaseIndexingQueue.process({(999999, "en"): "index"}), 0)
+        self.assertFalse(mock_bulk.called)
+
+    @override_settings(RICHIE_ES_INDEXING_DELAY=0)
+    @mock.patch.object(BaseIndexingQueue, "process")
+    def test_queues_thread(self, mock_process, mock_bulk, *_):
+        """
+        The thread queue should merge repeated updates of the same page and process them
+        in a background thread.
+        """
+        queue = ThreadIndexingQueue()
+        # Make as if updates were already waiting in the queue
+        queue.pending = {(1, "en"): "index", (2, "en"): "index"}
+
+        queue.put(1, "delete", "en")
+        queue.put(1, "index", "fr")
+
+        for _i in range(50):
+            if mock_process.called:
+                break
+            time.sleep(0.1)
+
+        mock_process.assert_called_once_with(
+            {(2, "en"): "index", (1, "en"): "delete", (1, "fr"): "index"}
+        )
+        self.assertEqual(queue.pending, {})
+        self.assertFalse(mock_bulk.called)
+
+    def test_queues_database(self, mock_bulk, *_):
+        """
+        The database queue should record page updates, merge repeated updates of the same
+        page and delete them once processed.
+        """
+        course = CourseFactory(should_publish=True)
+        queue = DatabaseIndexingQueue()
+
+        queue.put(course.extended_object_id, "delete", "en")
+        queue.put(course.extended_object_id, "index", "en")
+        self.assertEqual(IndexingQueueItem.objects.get().action, "index")
+        self.assertFalse(mock_bulk.called)
+
+        call_command("process_indexing_queue")
+
+        self.assertEqual(mock_bulk.call_count, 1)
+        self.assertEqual(len(mock_bulk.call_args[1]["actions"]), 1)
+        action = mock_bulk.call_args[1]["actions"][0]
+        self.assertEqual(action["_id"], course.get_es_id())
+        self.assertEqual(action["_op_type"], "index")
+        self.assertEqual(action["_index"], "test_courses")
+        self.assertFalse(IndexingQueueItem.objects.exists())
+
+        # Processing the queue again should do nothing
+        mock_bulk.reset_mock()
+        self.assertEqual(queue.process_pending(), 0)
+        self.assertFalse(mock_bulk.called)
+
+    def test_queues_database_claimed_before_processing(self, mock_bulk, *_):
+        """
+        Items should be claimed and their transaction committed before Elasticsearch is
+        called, so that pages can be queued again meanwhile without waiting for a lock.
+        """
+        course = CourseFactory(should_publish=True)
+        queue = DatabaseIndexingQueue()
+        queue.put(course.extended_object_id, "index", "en")
+
+        def bulk(*args, **kwargs):
+            self.assertFalse(IndexingQueueItem.objects.exists())
+            queue.put(course.extended_object_id, "delete", "en")
+            return len(list(kwargs["actions"])), 0
+
+        mock_bulk.side_effect = bulk
+
+        self.assertEqual(queue.process_pending(), 1)
+
+        # The update queued while Elasticsearch was called is kept for next time
+        self.assertEqual(IndexingQueueItem.objects.get().action, "delete")
+
+    def test_queues_database_failure(self, mock_bulk, *_):
+        """
+        Items should be queued back if Elasticsearch fails, unless a newer update of the
+        same page was queued meanwhile.
+        """
+        courses = CourseFactory.create_batch(2, should_publish=True)
+        queue = DatabaseIndexingQueue()
+        queue.put(courses[0].extended_object_id, "index", "en")
+        queue.put(courses[1].extended_object_id, "index", "en")
+
+        def bulk(*args, **kwargs):
+            queue.put(courses[1].extended_object_id, "delete", "en")
+            raise ConnectionError("Elasticsearch is not available")
+
+        mock_bulk.side_effect = bulk
+
+        with self.assertRaises(ConnectionError):
+            queue.process_pending()
+
+        self.assertEqual(
+            dict(IndexingQueueItem.objects.values_list("page_id", "action")),
+            {
+                courses[0].extended_object_id: "index",
+                courses[1].extended_object_id: "delete",
+            },
+        )
@@ -7,14 +7,20 @@ from unittest import mock
 from django.db import connection
 from django.test import TestCase
 
+from elasticsearch.helpers import BulkIndexError
+
 from richie.apps.core.factories import UserFactory
 from richie.apps.courses.factories import (
     CategoryFactory,
     CourseFactory,
+    CourseRunFactory,
     OrganizationFactory,
     PersonFactory,
 )
+from richie.apps.courses.models import Course
+from richie.apps.courses.signals import course_runs_synced
 from richie.apps.search.indexers.courses import CoursesIndexer
+from richie.apps.search.indexers.organizations import OrganizationsIndexer
 
 
 @mock.patch.object(  # Avoid messing up the development Elasticsearch index
@@ -108,6 +114,58 @@ class CoursesSignalsTestCase(TestCase):
         self.assertEqual(action["_op_type"], "delete")
         self.assertEqual(action["_index"], "test_courses")
 
+    def test_signals_courses_course_runs_synced(self, mock_bulk, *_):
+        """
+        Synchronizing the course runs of a course should only update the fields that depend
+        on course runs in its document, and index the whole document if it is missing.
+        """
+        course = CourseFactory(should_publish=True)
+        CourseRunFactory(direct_course=course.public_extension)
+        self.run_commit_hooks()
+        mock_bulk.reset_mock()
+
+        course_runs_synced.send(sender=Course, instances=[course.public_extension])
+
+        # Elasticsearch should not be called before the db transaction is successful
+        self.assertFalse(mock_bulk.called)
+
+        with self.assertNumQueries(2):
+            self.run_commit_hooks()
+
+        self.assertEqual(mock_bulk.call_count, 1)
+        self.assertEqual(len(mock_bulk.call_args[1]["actions"]), 1)
+        action = mock_bulk.call_args[1]["actions"][0]
+        self.assertEqual(action["_id"], course.get_es_id())
+        self.assertEqual(action["_op_type"], "update")
+        self.assertEqual(action["_index"], "test_courses")
+        self.assertEqual(
+            list(action["doc"]),
+            [
+                "course_runs",
+                "is_new",
+                "best_state",
+                "state_transition_at",
+                "state_sort_ms",
+                "course_runs_ms",
+                "course_runs_languages",
+            ],
+        )
+        self.assertEqual(len(action["doc"]["course_runs"]), 1)
+        self.assertTrue(action["doc"]["is_new"])
+
+        # - The course document is missing from the index
+        mock_bulk.reset_mock()
+        mock_bulk.side_effect = [BulkIndexError("1 document(s) failed."), None]
+
+        course_runs_synced.send(sender=Course, instances=[course.public_extension])
+        self.run_commit_hooks()
+
+        self.assertEqual(mock_bulk.call_count, 2)
+        action = mock_bulk.call_args[1]["actions"][0]
+        self.assertEqual(action["_id"], course.get_es_id())
+        self.assertEqual(action["_op_type"], "index")
+        self.assertEqual(len(action["course_runs"]), 1)
+
     def test_signals_organizations_publish(self, mock_bulk, *_):
         """
         Publishing an organization should update its document in the Elasticsearch organizations
@@ -134,7 +192,7 @@ class CoursesSignalsTestCase(TestCase):
         self.assertEqual(len(mock_bulk.call_args[1]["actions"]), 3)
         actions = list(mock_bulk.call_args[1]["actions"])
         self.assertEqual(actions[0]["_id"], published_course.get_es_id())
-        self.assertEqual(actions[0]["_op_type"], "index")
+        self.assertEqual(actions[0]["_op_type"], "update")
         self.assertEqual(actions[0]["_index"], "test_courses")
         self.assertEqual(actions[1]["_id"], organization.get_es_id())
         self.assertEqual(actions[1]["_op_type"], "index")
@@ -168,7 +226,7 @@ class CoursesSignalsTestCase(TestCase):
         self.assertEqual(len(mock_bulk.call_args[1]["actions"]), 2)
         actions = list(mock_bulk.call_args[1]["actions"])
         self.assertEqual(actions[0]["_id"], published_course.get_es_id())
-        self.assertEqual(actions[0]["_op_type"], "index")
+        self.assertEqual(actions[0]["_op_type"], "update")
         self.assertEqual(actions[0]["_index"], "test_courses")
         self.assertEqual(actions[1]["_id"], organization.get_es_id())
         self.assertEqual(actions[1]["_op_type"], "index")
@@ -204,7 +262,7 @@ class CoursesSignalsTestCase(TestCase):
         self.assertEqual(len(mock_bulk.call_args[1]["actions"]), 2)
         actions = list(mock_bulk.call_args[1]["actions"])
         self.assertEqual(actions[0]["_id"], published_course.get_es_id())
-        self.assertEqual(actions[0]["_op_type"], "index")
+        self.assertEqual(actions[0]["_op_type"], "update")
         self.assertEqual(actions[0]["_index"], "test_courses")
         self.assertEqual(actions[1]["_id"], organization.get_es_id())
         self.assertEqual(actions[1]["_op_type"], "index")
@@ -224,7 +282,7 @@ class CoursesSignalsTestCase(TestCase):
         self.assertEqual(len(mock_bulk.call_args[1]["actions"]), 2)
         actions = list(mock_bulk.call_args[1]["actions"])
         self.assertEqual(actions[0]["_id"], published_course.get_es_id())
-        self.assertEqual(actions[0]["_op_type"], "index")
+        self.assertEqual(actions[0]["_op_type"], "update")
         self.assertEqual(actions[0]["_index"], "test_courses")
         self.assertEqual(actions[1]["_id"], organization.get_es_id())
         self.assertEqual(actions[1]["_op_type"], "delete")
@@ -256,7 +314,7 @@ class CoursesSignalsTestCase(TestCase):
         self.assertEqual(len(mock_bulk.call_args[1]["actions"]), 3)
         actions = list(mock_bulk.call_args[1]["actions"])
         self.assertEqual(actions[0]["_id"], published_course.get_es_id())
-        self.assertEqual(actions[0]["_op_type"], "index")
+        self.assertEqual(actions[0]["_op_type"], "update")
         self.assertEqual(actions[0]["_index"], "test_courses")
         self.assertEqual(actions[1]["_id"], category.get_es_id())
         self.assertEqual(actions[1]["_op_type"], "index")
@@ -290,7 +348,7 @@ class CoursesSignalsTestCase(TestCase):
         self.assertEqual(len(mock_bulk.call_args[1]["actions"]), 2)
         actions = list(mock_bulk.call_args[1]["actions"])
         self.assertEqual(actions[0]["_id"], published_course.get_es_id())
-        self.assertEqual(actions[0]["_op_type"], "index")
+        self.assertEqual(actions[0]["_op_type"], "update")
         self.assertEqual(actions[0]["_index"], "test_courses")
         self.assertEqual(actions[1]["_id"], category.get_es_id())
         self.assertEqual(actions[1]["_op_type"], "index")
@@ -324,7 +382,7 @@ class CoursesSignalsTestCase(TestCase):
         self.assertEqual(len(mock_bulk.call_args[1]["actions"]), 2)
         actions = list(mock_bulk.call_args[1]["actions"])
         self.assertEqual(actions[0]["_id"], published_course.get_es_id())
-        self.assertEqual(actions[0]["_op_type"], "index")
+        self.assertEqual(actions[0]["_op_type"], "update")
         self.assertEqual(actions[0]["_index"], "test_courses")
         self.assertEqual(actions[1]["_id"], category.get_es_id())
         self.assertEqual(actions[1]["_op_type"], "index")
@@ -344,7 +402,7 @@ class CoursesSignalsTestCase(TestCase):
         self.assertEqual(len(mock_bulk.call_args[1]["actions"]), 2)
         actions = list(mock_bulk.call_args[1]["actions"])
         self.assertEqual(actions[0]["_id"], published_course.get_es_id())
-        self.assertEqual(actions[0]["_op_type"], "index")
+        self.assertEqual(actions[0]["_op_type"], "update")
         self.assertEqual(actions[0]["_index"], "test_courses")
         self.assertEqual(actions[1]["_id"], category.get_es_id())
         self.assertEqual(actions[1]["_op_type"], "delete")
@@ -437,7 +495,7 @@ class CoursesSignalsTestCase(TestCase):
         self.assertEqual(len(mock_bulk.call_args[1]["actions"]), 2)
         actions = list(mock_bulk.call_args[1]["actions"])
         self.assertEqual(actions[0]["_id"], published_course.get_es_id())
-        self.assertEqual(actions[0]["_op_type"], "index")
+        self.assertEqual(actions[0]["_op_type"], "update")
         self.assertEqual(actions[0]["_index"], "test_courses")
         self.assertEqual(actions[1]["_id"], person.get_es_id())
         self.assertEqual(actions[1]["_op_type"], "index")
@@ -471,7 +529,7 @@ class CoursesSignalsTestCase(TestCase):
         self.assertEqual(len(mock_bulk.call_args[1]["actions"]), 2)
         actions = list(mock_bulk.call_args[1]["actions"])
         self.assertEqual(actions[0]["_id"], published_course.get_es_id())
-        self.assertEqual(actions[0]["_op_type"], "index")
+        self.assertEqual(actions[0]["_op_type"], "update")
         self.assertEqual(actions[0]["_index"], "test_courses")
         self.assertEqual(actions[1]["_id"], person.get_es_id())
         self.assertEqual(actions[1]["_op_type"], "index")
@@ -491,8 +549,118 @@ class CoursesSignalsTestCase(TestCase):
         self.assertEqual(len(mock_bulk.call_args[1]["actions"]), 2)
         actions = list(mock_bulk.call_args[1]["actions"])
         self.assertEqual(actions[0]["_id"], published_course.get_es_id())
-        self.assertEqual(actions[0]["_op_type"], "index")
+        self.assertEqual(actions[0]["_op_type"], "update")
         self.assertEqual(actions[0]["_index"], "test_courses")
         self.assertEqual(actions[1]["_id"], person.get_es_id())
         self.assertEqual(actions[1]["_op_type"], "delete")
         self.assertEqual(actions[1]["_index"], "richie_persons")
+
+    @mock.patch("richie.apps.search.signals.ES_CLIENT")
+    def test_signals_organizations_publish_partial_update(
+        self, mock_es_client, mock_bulk, *_
+    ):
+        """
+        Publishing an organization should only build and send, in partial updates to the
+        documents of its courses, the fields that depend on the fields of its document
+        that changed.
+        """
+        organization = OrganizationFactory(page_title="Before", should_publish=True)
+        courses = CourseFactory.create_batch(
+            2, fill_organizations=[organization], should_publish=True
+        )
+        self.run_commit_hooks()
+        indexed = OrganizationsIndexer.get_es_document_for_organization(organization)
+        mock_bulk.reset_mock()
+        mock_es_client.reset_mock()
+
+        title = organization.extended_object.title_set.get(language="en")
+        title.menu_title = "Short"
+        title.save()
+        self.assertTrue(organization.extended_object.publish("en"))
+
+        mock_es_client.get.return_value = {"_source": indexed}
+        self.run_commit_hooks()
+
+        mock_es_client.get.assert_called_once_with(
+            index="richie_organizations",
+            doc_type="_doc",
+            id=organization.get_es_id(),
+            _source=["logo", "menu_title", "title"],
+        )
+        self.assertEqual(mock_bulk.call_count, 1)
+        actions = {
+            action["_id"]: action for action in mock_bulk.call_args[1]["actions"]
+        }
+        self.assertEqual(actions[organization.get_es_id()]["_op_type"], "index")
+        for course in courses:
+            self.assertEqual(
+                actions[course.get_es_id()],
+                {
+                    "_id": course.get_es_id(),
+                    "_index": "test_courses",
+                    "_op_type": "update",
+                    "doc": {"organization_highlighted": {"en": "Short"}},
+                },
+            )
+
+    @mock.patch("richie.apps.search.signals.ES_CLIENT")
+    def test_signals_organizations_publish_unchanged(
+        self, mock_es_client, mock_bulk, *_
+    ):
+        """
+        Publishing an organization should leave the documents of its courses untouched if
+        none of the fields of its document on which they depend changed.
+        """
+        organization = OrganizationFactory(page_title="Before", should_publish=True)
+        CourseFactory.create_batch(
+            2, fill_organizations=[organization], should_publish=True
+        )
+        self.run_commit_hooks()
+        indexed = OrganizationsIndexer.get_es_document_for_organization(organization)
+        mock_bulk.reset_mock()
+        mock_es_client.reset_mock()
+
+        self.assertTrue(organization.extended_object.publish("en"))
+
+        mock_es_client.get.return_value = {"_source": indexed}
+        self.run_commit_hooks()
+
+        self.assertEqual(mock_bulk.call_count, 1)
+        actions = list(mock_bulk.call_args[1]["actions"])
+        self.assertEqual(len(actions), 1)
+        self.assertEqual(actions[0]["_id"], organization.get_es_id())
+
+    def test_signals_organizations_publish_course_not_indexed(self, mock_bulk, *_):
+        """
+        The documents of courses that can't be partially updated because they are not
+        indexed yet should be fully indexed instead.
+        """
+        organization = OrganizationFactory(should_publish=True)
+        course = CourseFactory(fill_organizations=[organization], should_publish=True)
+        self.run_commit_hooks()
+        mock_bulk.reset_mock()
+
+        mock_bulk.side_effect = [
+            BulkIndexError(
+                "1 document(s) failed to index.",
+                [
+                    {
+                        "update": {
+                            "_id": course.get_es_id(),
+                            "_index": "test_courses_2020-01-01",
+                            "status": 404,
+                        }
+                    }
+                ],
+            ),
+            None,
+        ]
+        self.assertTrue(organization.extended_object.publish("en"))
+        self.run_commit_hooks()
+
+        self.assertEqual(mock_bulk.call_count, 2)
+        actions = list(mock_bulk.call_args[1]["actions"])
+        self.assertEqual(len(actions), 1)
+        self.assertEqual(actions[0]["_id"], course.get_es_id())
+        self.assertEqual(actions[0]["_op_type"], "index")
+        self.assertEqual(actions[0]["_index"], "test_courses")
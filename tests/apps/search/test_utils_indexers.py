@@ -5,10 +5,13 @@ Tests for the indexer helpers.
 from django.test import TestCase
 
 from richie.apps.courses.defaults import DAY, HOUR, MINUTE, MONTH, WEEK
+from richie.apps.courses.factories import LicenceFactory
+from richie.apps.courses.models import Licence
 from richie.apps.search.indexers import IndicesList
 from richie.apps.search.indexers.courses import CoursesIndexer
 from richie.apps.search.indexers.organizations import OrganizationsIndexer
 from richie.apps.search.utils.indexers import (
+    filter_queryset_for_shard,
     get_course_pace,
     slice_string_for_completion,
 )
@@ -28,6 +31,27 @@ class UtilsIndexersTestCase(TestCase):
         self.assertEqual(indices.courses, CoursesIndexer)
         self.assertEqual(list(indices), [CoursesIndexer, OrganizationsIndexer])
 
+    def test_filter_queryset_for_shard(self):
+        """
+        The primary keys of a queryset should be split between shards by their modulo so
+        that each object belongs to one and only one shard.
+        """
+        licences = LicenceFactory.create_batch(7)
+        queryset = Licence.objects.order_by("pk")
+
+        self.assertEqual(list(filter_queryset_for_shard(queryset)), licences)
+
+        shards = [
+            list(filter_queryset_for_shard(queryset, (shard_index, 3)))
+            for shard_index in range(3)
+        ]
+        for shard_index, shard in enumerate(shards):
+            self.assertTrue(all(licence.pk % 3 == shard_index for licence in shard))
+        self.assertEqual(
+            sorted(licence.pk for shard in shards for licence in shard),
+            [licence.pk for licence in licences],
+        )
+
     def test_slice_string_for_completion(self):
         """
         The slice_string_for_completion function slices a string into an array of strings suitable
@@ -0,0 +1,224 @@
+"""
+Tests for the autocomplete view of richie's search app, grouping several kinds of objects
+"""
+
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from richie.apps.search.indexers.categories import CategoriesIndexer
+from richie.apps.search.indexers.courses import CoursesIndexer
+from richie.apps.search.indexers.organizations import OrganizationsIndexer
+
+
+def get_suggestion_response(*hits):
+    """Build the response of a search running the completion suggester."""
+    return {"suggest": {"objects": [{"options": list(hits)}]}}
+
+
+COURSE = {
+    "_id": "1",
+    "_source": {
+        "absolute_url": {"en": "/en/course-paris/"},
+        "complete": {"en": ["Paris course", "course"]},
+        "title": {"en": "Paris course"},
+    },
+}
+ORGANIZATION = {
+    "_id": "2",
+    "_source": {
+        "complete": {"en": ["Paris university", "university"]},
+        "title": {"en": "Paris university"},
+    },
+}
+SUBJECT = {
+    "_id": "3",
+    "_source": {
+        "complete": {"en": ["Paris history", "history"]},
+        "kind": "subjects",
+        "title": {"en": "Paris history"},
+    },
+}
+
+
+@mock.patch.object(
+    CategoriesIndexer,
+    "index_name",
+    new_callable=mock.PropertyMock,
+    return_value="test_categories",
+)
+@mock.patch.object(
+    CoursesIndexer,
+    "index_name",
+    new_callable=mock.PropertyMock,
+    return_value="test_courses",
+)
+@mock.patch.object(
+    OrganizationsIndexer,
+    "index_name",
+    new_callable=mock.PropertyMock,
+    return_value="test_organizations",
+)
+class AutocompleteViewTestCase(TestCase):
+    """Test autocompleting several kinds of objects with a single request."""
+
+    def setUp(self):
+        super().setUp()
+        caches["search"].clear()
+
+    @mock.patch("richie.apps.search.autocomplete.ES_CLIENT")
+    def test_views_autocomplete(self, mock_client, *_):
+        """
+        The completion suggesters of all kinds should be run in a single request to
+        Elasticsearch and their options returned by kind.
+        """
+        mock_client.msearch.return_value = {
+            "responses": [
+                get_suggestion_response(COURSE),
+                get_suggestion_response(ORGANIZATION),
+                get_suggestion_response(SUBJECT),
+                {"error": {"type": "index_not_found_exception"}, "status": 404},
+            ]
+        }
+
+        response = self.client.get(
+            "/api/v1.0/autocomplete/?query=Par&kind=courses&kind=organizations"
+            "&kind=subjects&kind=levels&kind=courses"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "courses": [
+                    {
+                        "absolute_url": "/en/course-paris/",
+                        "id": "1",
+                        "kind": "courses",
+                        "title": "Paris course",
+                    }
+                ],
+                "organizations": [
+                    {"id": "2", "kind": "organizations", "title": "Paris university"}
+                ],
+                "subjects": [{"id": "3", "kind": "subjects", "title": "Paris history"}],
+                "levels": [],
+            },
+        )
+        mock_client.search.assert_not_called()
+        mock_client.msearch.assert_called_once_with(
+            body=[
+                {"index": "test_courses"},
+                {
+                    "suggest": {
+                        "objects": {
+                            "prefix": "Par",
+                            "completion": {"field": "complete.en"},
+                        }
+                    },
+                    "size": 0,
+                },
+                {"index": "test_organizations"},
+                {
+                    "suggest": {
+                        "objects": {
+                            "prefix": "Par",
+                            "completion": {"field": "complete.en"},
+                        }
+                    },
+                    "size": 0,
+                },
+                {"index": "test_categories"},
+                {
+                    "suggest": {
+                        "objects": {
+                            "prefix": "Par",
+                            "completion": {
+                                "field": "complete.en",
+                                "contexts": {"kind": ["subjects"]},
+                            },
+                        }
+                    },
+                    "size": 0,
+                },
+                {"index": "test_categories"},
+                {
+                    "suggest": {
+                        "objects": {
+                            "prefix": "Par",
+                            "completion": {
+                                "field": "complete.en",
+                                "contexts": {"kind": ["levels"]},
+                            },
+                        }
+                    },
+                    "size": 0,
+                },
+            ]
+        )
+
+    @override_settings(RICHIE_ES_AUTOCOMPLETE_IN_MEMORY=True)
+    @mock.patch("richie.apps.search.autocomplete.ES_CLIENT")
+    @mock.patch(
+        "richie.apps.search.autocomplete.scan",
+        side_effect=lambda client, index, **kwargs: {
+            "test_courses": [COURSE],
+            "test_categories": [SUBJECT],
+        }[index],
+    )
+    def test_views_autocomplete_in_memory(self, mock_scan, mock_client, *_):
+        """All kinds should be autocompleted without querying Elasticsearch."""
+        response = self.client.get(
+            "/api/v1.0/autocomplete/?query=paris&kind=courses&kind=subjects&kind=levels"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "courses": [
+                    {
+                        "absolute_url": "/en/course-paris/",
+                        "id": "1",
+                        "kind": "courses",
+                        "title": "Paris course",
+                    }
+                ],
+                "subjects": [{"id": "3", "kind": "subjects", "title": "Paris history"}],
+                "levels": [],
+            },
+        )
+        # The prefix index of categories is shared by all kinds of categories
+        self.assertEqual(mock_scan.call_count, 2)
+        mock_client.search.assert_not_called()
+        mock_client.msearch.assert_not_called()
+
+    @mock.patch("richie.apps.search.autocomplete.ES_CLIENT")
+    def test_views_autocomplete_missing_params(self, mock_client, *_):
+        """The query and at least one kind are required."""
+        response = self.client.get("/api/v1.0/autocomplete/")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {
+                "errors": [
+                    'Missing autocomplete "query".',
+                    'Missing autocomplete "kind".',
+                ]
+            },
+        )
+
+        response = self.client.get(
+            "/api/v1.0/autocomplete/?query=Par"
+            + "".join(f"&kind=kind{i:d}" for i in range(21))
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {"errors": ["Autocomplete is limited to 20 kinds per request."]},
+        )
+        mock_client.msearch.assert_not_called()
@@ -0,0 +1,49 @@
+"""Test suite for the elasticsearch_metrics view of richie's search app."""
+
+import json
+from unittest import mock
+
+from cms.test_utils.testcases import CMSTestCase
+
+from richie.apps.core.factories import UserFactory
+
+
+class ElasticsearchMetricsViewTestCase(CMSTestCase):
+    """
+    Integration test suite to validate the behavior of the `elasticsearch_metrics` view.
+    """
+
+    @mock.patch(
+        "richie.apps.search.views.get_es_metrics",
+        return_value={"search": {"requests": 2}, "bulk": {"requests": 1}},
+    )
+    def test_views_elasticsearch_metrics_with_permission(self, _mock_metrics):
+        """The metrics of the Elasticsearch clients should be returned by profile."""
+        user = UserFactory(is_staff=True)
+        self.client.login(username=user.username, password="password")
+
+        # Add the necessary permission
+        self.add_permission(user, "can_manage_elasticsearch")
+
+        response = self.client.get("/api/v1.0/elasticsearch-metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content),
+            {"search": {"requests": 2}, "bulk": {"requests": 1}},
+        )
+
+    def test_views_elasticsearch_metrics_no_permission(self):
+        """Getting the metrics should be forbidden if the permission is not granted."""
+        user = UserFactory(is_staff=True)
+        self.client.login(username=user.username, password="password")
+
+        response = self.client.get("/api/v1.0/elasticsearch-metrics/")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(
+            response.content, b"You are not allowed to manage the search index."
+        )
+
+    def test_views_elasticsearch_metrics_anonymous(self):
+        """An anonymous user should not be allowed to get the metrics."""
+        response = self.client.get("/api/v1.0/elasticsearch-metrics/")
+        self.assertEqual(response.status_code, 401)
@@ -3,6 +3,9 @@
 import json
 from unittest import mock
 
+from django.conf import settings
+from django.core.cache import caches
+
 from cms.test_utils.testcases import CMSTestCase
 
 from richie.apps.core.helpers import create_i18n_page
@@ -15,6 +18,10 @@ class FilterDefinitionsViewTestCase(CMSTestCase):
     Test suite to validate the behavior of the `filter_definitions` view.
     """
 
+    def setUp(self):
+        super().setUp()
+        caches["search"].clear()
+
     def tearDown(self):
         """
         Clear filter definitions cache for base pages. This helps us avoid breaking other
@@ -167,3 +174,23 @@ class FilterDefinitionsViewTestCase(CMSTestCase):
         self.client.get("/api/v1.0/filter-definitions/")
         self.client.get("/api/v1.0/filter-definitions/")
         self.assertEqual(mock_get_definition.call_count, 1)
+
+        # They are built again in each language
+        self.client.cookies[settings.LANGUAGE_COOKIE_NAME] = "fr"
+        self.client.get("/api/v1.0/filter-definitions/")
+        self.assertEqual(mock_get_definition.call_count, 2)
+
+    def test_views_filter_definitions_page_published(self):
+        """
+        The static filter definitions should be built again once a page is published, as
+        the path of the base page of a filter may have changed.
+        """
+        response = self.client.get("/api/v1.0/filter-definitions/")
+        self.assertIsNone(json.loads(response.content)["persons"]["base_path"])
+
+        create_i18n_page(
+            {"en": "Persons", "fr": "Personnes"}, reverse_id="persons", published=True
+        )
+
+        response = self.client.get("/api/v1.0/filter-definitions/")
+        self.assertEqual(json.loads(response.content)["persons"]["base_path"], "0001")
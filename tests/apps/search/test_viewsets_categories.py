@@ -10,6 +10,7 @@ from django.test.utils import override_settings
 from elasticsearch.exceptions import NotFoundError
 
 from richie.apps.search.apps import ES_CLIENT
+from richie.apps.search.utils.cursors import decode_cursor
 
 
 class CategoriesViewsetsTestCase(TestCase):
@@ -108,7 +109,12 @@ class CategoriesViewsetsTestCase(TestCase):
         self.assertEqual(
             response.data,
             {
-                "meta": {"count": 2, "offset": 0, "total_count": 32},
+                "meta": {
+                    "count": 2,
+                    "next_cursor": None,
+                    "offset": 0,
+                    "total_count": 32,
+                },
                 "objects": [
                     {
                         "icon": "/icon21.png",
@@ -164,6 +170,69 @@ class CategoriesViewsetsTestCase(TestCase):
             size=2,
         )
 
+    @override_settings(RICHIE_ES_INDICES_PREFIX="richie")
+    @mock.patch.object(ES_CLIENT, "search")
+    def test_viewsets_categories_search_cursor(self, mock_search):
+        """
+        Passing an empty cursor should paginate the categories with cursors: ties are broken
+        in their sort and the cursor returned with each full page of results resumes them
+        after its last item, whatever the offset.
+        """
+        mock_search.return_value = {
+            "hits": {
+                "hits": [
+                    {
+                        "_id": 21,
+                        "sort": ["a", "21"],
+                        "_source": {
+                            "icon": {"fr": "/icon21.png"},
+                            "is_meta": True,
+                            "logo": {"fr": "/logo21.png"},
+                            "nb_children": 1,
+                            "path": "0002",
+                            "title": {"fr": "Computer Science"},
+                        },
+                    },
+                    {
+                        "_id": 61,
+                        "sort": ["z", "61"],
+                        "_source": {
+                            "icon": {"fr": "/icon61.png"},
+                            "is_meta": False,
+                            "logo": {"fr": "/logo61.png"},
+                            "nb_children": 0,
+                            "path": "00020001",
+                            "title": {"fr": "Engineering Sciences"},
+                        },
+                    },
+                ],
+                "total": {"relation": "eq", "value": 32},
+            }
+        }
+
+        response = self.client.get("/api/v1.0/subjects/?query=Science&limit=2&cursor=")
+
+        self.assertEqual(response.status_code, 200)
+        next_cursor = response.data["meta"]["next_cursor"]
+        self.assertEqual(decode_cursor(next_cursor), {"after": ["z", "61"]})
+        body = mock_search.call_args[1]["body"]
+        self.assertEqual(
+            body["sort"],
+            [
+                {"title_raw.en": {"order": "asc"}},
+                {"id": {"order": "asc", "unmapped_type": "keyword"}},
+            ],
+        )
+        self.assertNotIn("search_after", body)
+
+        response = self.client.get(
+            f"/api/v1.0/subjects/?query=Science&limit=2&offset=4&cursor={next_cursor:s}"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_search.call_args[1]["body"]["search_after"], ["z", "61"])
+        self.assertEqual(mock_search.call_args[1]["from_"], 0)
+
     def test_viewsets_categories_search_with_invalid_params(self):
         """
         Error case: the client used an incorrectly formatted request
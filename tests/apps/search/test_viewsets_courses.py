@@ -5,14 +5,22 @@ Tests for the course viewset
 from datetime import timezone
 from unittest import mock
 
+from django.core.cache import caches
 from django.test.utils import override_settings
 from django.utils import timezone as django_timezone
 
+import arrow
 from cms.test_utils.testcases import CMSTestCase
-from elasticsearch.exceptions import NotFoundError
+from elasticsearch.exceptions import NotFoundError, RequestError, TransportError
 
+from richie.apps.search import index_manager
 from richie.apps.search.apps import ES_CLIENT
+from richie.apps.search.cache import get_index_tag, invalidate_tags
+from richie.apps.search.filter_definitions import FILTERS
+from richie.apps.search.indexers import ES_INDICES
 from richie.apps.search.indexers.courses import CoursesIndexer
+from richie.apps.search.utils.cursors import decode_cursor, encode_cursor
+from richie.apps.search.viewsets.courses import CoursesViewSet
 
 
 # Patch the formatter once so we can keep our tests focused on what we're actually testing
@@ -20,7 +28,7 @@ from richie.apps.search.indexers.courses import CoursesIndexer
 @mock.patch.object(
     CoursesIndexer,
     "format_es_object_for_api",
-    side_effect=lambda es_course: f"Course #{es_course['_id']:n}",
+    side_effect=lambda es_course, *_: f"Course #{es_course['_id']:n}",
 )
 class CoursesViewsetsTestCase(CMSTestCase):
     """
@@ -34,6 +42,7 @@ class CoursesViewsetsTestCase(CMSTestCase):
         """
         super().setUp()
         django_timezone.activate(timezone.utc)
+        caches["search"].clear()
 
     def test_viewsets_courses_retrieve(self, *_):
         """
@@ -67,8 +76,9 @@ class CoursesViewsetsTestCase(CMSTestCase):
         "richie.apps.search.forms.CourseSearchForm.get_script_fields",
         lambda *args: {"some": "fields"},
     )
+    @mock.patch.object(ES_CLIENT, "msearch")
     @mock.patch.object(ES_CLIENT, "search")
-    def test_viewsets_courses_search(self, mock_search, *_):
+    def test_viewsets_courses_search(self, mock_search, mock_msearch, *_):
         """
         Happy path: the consumer is filtering courses by matching text
         """
@@ -182,18 +192,44 @@ class CoursesViewsetsTestCase(CMSTestCase):
                     }
                 }
 
-        mock_search.side_effect = mock_search_implementation
+        mock_msearch.side_effect = lambda body: {
+            "responses": [
+                mock_search_implementation(index=header["index"])
+                for header in body[::2]
+            ]
+        }
 
         response = self.client.get(
             "/api/v1.0/courses/?query=some%20phrase%20terms&limit=2&offset=20"
         )
 
+        # The titles naming the facets were all fetched in a single round-trip, after the
+        # search returned their keys
+        mock_search.assert_not_called()
+        self.assertEqual(mock_msearch.call_count, 2)
+        self.assertEqual(
+            [header["index"] for header in mock_msearch.call_args[1]["body"][::2]],
+            [
+                "richie_categories",
+                "richie_categories",
+                "richie_organizations",
+                "richie_persons",
+                "richie_licences",
+            ],
+        )
+
         # The client received a properly formatted response
         self.assertEqual(response.status_code, 200)
         self.assertEqual(
             response.data,
             {
-                "meta": {"count": 2, "offset": 77, "total_count": 35},
+                "meta": {
+                    "count": 2,
+                    "facets_token": mock.ANY,
+                    "next_cursor": None,
+                    "offset": 77,
+                    "total_count": 35,
+                },
                 "objects": ["Course #523", "Course #861"],
                 "filters": {
                     "availability": {
@@ -333,32 +369,444 @@ class CoursesViewsetsTestCase(CMSTestCase):
             },
         )
         # The ES connector was called with appropriate arguments for the client's request
-        mock_search.assert_any_call(
-            _source=[
-                "absolute_url",
-                "categories",
-                "code",
-                "course_runs",
-                "cover_image",
-                "duration",
-                "effort",
-                "icon",
-                "introduction",
-                "organization_highlighted",
-                "organization_highlighted_cover_image",
-                "organizations",
-                "title",
+        mock_msearch.assert_any_call(
+            body=[
+                {"index": "richie_courses"},
+                {
+                    "_source": [
+                        "absolute_url",
+                        "categories",
+                        "code",
+                        "course_runs",
+                        "cover_image",
+                        "duration",
+                        "effort",
+                        "icon",
+                        "introduction",
+                        "organization_highlighted",
+                        "organization_highlighted_cover_image",
+                        "organizations",
+                        "title",
+                    ],
+                    "aggs": {"some": "aggs"},
+                    "from": 77,
+                    "query": {"some": "query"},
+                    "script_fields": {"some": "fields"},
+                    "size": 2,
+                },
+            ]
+        )
+
+    @mock.patch(
+        "richie.apps.search.forms.CourseSearchForm.build_es_query",
+        lambda *args: (2, 0, {"some": "query"}, {"some": "aggs"}),
+    )
+    @mock.patch(
+        "richie.apps.search.forms.CourseSearchForm.get_script_fields",
+        lambda *args: {"some": "fields"},
+    )
+    @mock.patch.object(
+        ES_CLIENT,
+        "msearch",
+        return_value={
+            "responses": [{"hits": {"hits": [{"_id": 523}], "total": {"value": 1}}}]
+        },
+    )
+    def test_viewsets_courses_search_cache(self, mock_msearch, *_):
+        """
+        The response to a search should be cached for the language and the query params,
+        whatever their order, until documents are written to the indices it depends on.
+        """
+        response = self.client.get(
+            "/api/v1.0/courses/?scope=objects&languages=fr&languages=en&limit=2"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["objects"], ["Course #523"])
+        self.assertEqual(mock_msearch.call_count, 1)
+
+        # Equivalent query params are served from the cache
+        for querystring in [
+            "scope=objects&languages=fr&languages=en&limit=2",
+            "limit=2&languages=en&languages=fr&scope=objects",
+        ]:
+            response = self.client.get(f"/api/v1.0/courses/?{querystring:s}")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["objects"], ["Course #523"])
+        self.assertEqual(mock_msearch.call_count, 1)
+
+        # Other query params or another language are not
+        self.client.get("/api/v1.0/courses/?scope=objects&languages=fr&limit=2")
+        self.assertEqual(mock_msearch.call_count, 2)
+        # Forget the language cookie so that the language is taken from the header
+        self.client.cookies.clear()
+        self.client.get(
+            "/api/v1.0/courses/?scope=objects&languages=fr&languages=en&limit=2",
+            HTTP_ACCEPT_LANGUAGE="fr",
+        )
+        self.assertEqual(mock_msearch.call_count, 3)
+
+        # Writing to the courses index evicts the cached responses
+        with mock.patch.object(index_manager, "bulk_compat"):
+            index_manager.richie_bulk([{"_index": ES_INDICES.courses.index_name}])
+        self.client.get(
+            "/api/v1.0/courses/?scope=objects&languages=fr&languages=en&limit=2",
+            HTTP_ACCEPT_LANGUAGE="fr",
+        )
+        self.assertEqual(mock_msearch.call_count, 4)
+
+        # So does writing to the index of an object naming facets
+        invalidate_tags([get_index_tag(ES_INDICES.organizations.index_name)])
+        self.client.get(
+            "/api/v1.0/courses/?scope=objects&languages=fr&languages=en&limit=2",
+            HTTP_ACCEPT_LANGUAGE="fr",
+        )
+        self.assertEqual(mock_msearch.call_count, 5)
+
+        # Partial updates of course runs synchronized from LMS don't
+        with mock.patch.object(index_manager, "bulk_compat"):
+            index_manager.richie_bulk(
+                [{"_index": ES_INDICES.courses.index_name}], invalidate_cache=False
+            )
+        self.client.get(
+            "/api/v1.0/courses/?scope=objects&languages=fr&languages=en&limit=2",
+            HTTP_ACCEPT_LANGUAGE="fr",
+        )
+        self.assertEqual(mock_msearch.call_count, 5)
+
+    @override_settings(RICHIE_ES_COURSES_CACHE_TIMEOUT=0)
+    @mock.patch(
+        "richie.apps.search.forms.CourseSearchForm.build_es_query",
+        lambda *args: (2, 0, {"some": "query"}, {"some": "aggs"}),
+    )
+    @mock.patch(
+        "richie.apps.search.forms.CourseSearchForm.get_script_fields",
+        lambda *args: {"some": "fields"},
+    )
+    @mock.patch.object(
+        ES_CLIENT,
+        "msearch",
+        return_value={
+            "responses": [{"hits": {"hits": [{"_id": 523}], "total": {"value": 1}}}]
+        },
+    )
+    def test_viewsets_courses_search_cache_disabled(self, mock_msearch, *_):
+        """The response to a search should not be cached if the cache timeout is 0."""
+        for _i in range(2):
+            response = self.client.get("/api/v1.0/courses/?scope=objects")
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_msearch.call_count, 2)
+
+    @mock.patch(
+        "richie.apps.search.forms.CourseSearchForm.build_es_query",
+        lambda *args: (2, 0, {"some": "query"}, {"some": "aggs"}),
+    )
+    @mock.patch(
+        "richie.apps.search.forms.CourseSearchForm.get_script_fields",
+        lambda *args: {"some": "fields"},
+    )
+    @mock.patch.object(
+        CoursesViewSet, "get_filters", return_value={"some": {"position": 0}}
+    )
+    @mock.patch.object(
+        ES_CLIENT,
+        "msearch",
+        return_value={
+            "responses": [
+                {
+                    "hits": {"hits": [{"_id": 523}], "total": {"value": 1}},
+                    "aggregations": {"all_courses": {}},
+                }
+            ]
+        },
+    )
+    def test_viewsets_courses_search_facets_token(
+        self, mock_msearch, mock_get_filters, *_
+    ):
+        """
+        The facets of a search should be returned with a token that allows fetching the
+        next pages of the same search without computing its facets again.
+        """
+        response = self.client.get("/api/v1.0/courses/?languages=fr&limit=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["filters"], {"some": {"position": 0}})
+        facets_token = response.data["meta"]["facets_token"]
+        self.assertIn("aggs", mock_msearch.call_args[1]["body"][1])
+        self.assertEqual(mock_get_filters.call_count, 1)
+
+        # The next pages of the same search reuse the facets
+        for querystring in [
+            "languages=fr&limit=2&offset=2",
+            "offset=4&limit=5&languages=fr",
+        ]:
+            response = self.client.get(
+                f"/api/v1.0/courses/?{querystring:s}&facets_token={facets_token:s}"
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["filters"], {"some": {"position": 0}})
+            self.assertEqual(response.data["meta"]["facets_token"], facets_token)
+            self.assertNotIn("aggs", mock_msearch.call_args[1]["body"][1])
+        self.assertEqual(mock_msearch.call_count, 3)
+        self.assertEqual(mock_get_filters.call_count, 1)
+
+        # The facets are computed again for another search or without the token
+        for querystring in [
+            f"languages=en&limit=2&offset=2&facets_token={facets_token:s}",
+            "languages=fr&limit=2&offset=6",
+        ]:
+            response = self.client.get(f"/api/v1.0/courses/?{querystring:s}")
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("aggs", mock_msearch.call_args[1]["body"][1])
+        self.assertEqual(mock_get_filters.call_count, 3)
+
+        # Writing to the courses index evicts the cached facets
+        invalidate_tags([get_index_tag(ES_INDICES.courses.index_name)])
+        response = self.client.get(
+            f"/api/v1.0/courses/?languages=fr&offset=8&facets_token={facets_token:s}"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("aggs", mock_msearch.call_args[1]["body"][1])
+        self.assertEqual(mock_get_filters.call_count, 4)
+
+    @mock.patch("arrow.utcnow", return_value=arrow.get(2020, 2, 9))
+    @mock.patch.object(ES_CLIENT, "msearch")
+    def test_viewsets_courses_search_cursor(self, mock_msearch, *_):
+        """
+        Passing an empty cursor should paginate courses with cursors: ties are broken in
+        their sort and a cursor is returned with each full page of results to fetch the next
+        page with `search_after`, ranking courses at the date of the first page.
+        """
+        mock_msearch.return_value = {
+            "responses": [
+                {
+                    "hits": {
+                        "hits": [
+                            {"_id": 523, "sort": [80.5, "523"]},
+                            {"_id": 861, "sort": [72.5, "861"]},
+                        ],
+                        "total": {"value": 3},
+                    }
+                }
+            ]
+        }
+        response = self.client.get("/api/v1.0/courses/?scope=objects&limit=2&cursor=")
+        self.assertEqual(response.status_code, 200)
+        next_cursor = response.data["meta"]["next_cursor"]
+        self.assertEqual(
+            decode_cursor(next_cursor),
+            {"after": [72.5, "861"], "now": 1581206400000.0},
+        )
+        body = mock_msearch.call_args[1]["body"][1]
+        self.assertEqual(
+            body["sort"],
+            [
+                {"_score": {"order": "desc"}},
+                {"id": {"order": "asc", "unmapped_type": "keyword"}},
             ],
-            body={
-                "aggs": {"some": "aggs"},
-                "query": {"some": "query"},
+        )
+        self.assertNotIn("search_after", body)
+
+        mock_msearch.return_value = {
+            "responses": [
+                {
+                    "hits": {
+                        "hits": [{"_id": 17, "sort": [1.5, "17"]}],
+                        "total": {"value": 3},
+                    }
+                }
+            ]
+        }
+        with mock.patch("arrow.utcnow", return_value=arrow.get(2020, 2, 10)):
+            response = self.client.get(
+                f"/api/v1.0/courses/?scope=objects&limit=2&cursor={next_cursor:s}"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["objects"], ["Course #17"])
+        # There is no next page
+        self.assertIsNone(response.data["meta"]["next_cursor"])
+
+        body = mock_msearch.call_args[1]["body"][1]
+        self.assertEqual(body["from"], 0)
+        self.assertEqual(body["search_after"], [72.5, "861"])
+        self.assertEqual(
+            body["query"]["function_score"]["script_score"]["script"]["params"][
+                "ms_since_epoch"
+            ],
+            1581206400000,
+        )
+        self.assertEqual(
+            body["script_fields"]["state"]["script"]["params"]["ms_since_epoch"],
+            1581206400000,
+        )
+
+    @mock.patch.object(ES_CLIENT, "msearch")
+    def test_viewsets_courses_search_cursor_invalid(self, mock_msearch, *_):
+        """
+        A cursor that does not match the sort of the search, for example one tampered with,
+        should be rejected with a BadRequest response instead of being sent to Elasticsearch.
+        """
+        cursor = encode_cursor({"after": ["861"], "now": 1581206400000})
+        response = self.client.get(
+            f"/api/v1.0/courses/?scope=objects&limit=2&cursor={cursor:s}"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"], {"cursor": ["Invalid cursor."]})
+        mock_msearch.assert_not_called()
+
+    @mock.patch.object(ES_CLIENT, "msearch")
+    def test_viewsets_courses_search_cursor_rejected(self, mock_msearch, *_):
+        """
+        A cursor whose values don't have the types of the fields of the sort should be
+        rejected with a BadRequest response when Elasticsearch rejects the search. Other
+        errors of the search should be raised as by the client.
+        """
+        mock_msearch.return_value = {
+            "responses": [
+                {
+                    "error": {"type": "search_phase_execution_exception"},
+                    "status": 400,
+                }
+            ]
+        }
+        cursor = encode_cursor({"after": ["a", "861"], "now": 1581206400000})
+        response = self.client.get(
+            f"/api/v1.0/courses/?scope=objects&limit=2&cursor={cursor:s}"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"], {"cursor": ["Invalid cursor."]})
+
+        with self.assertRaises(RequestError):
+            self.client.get("/api/v1.0/courses/?scope=objects&limit=2")
+
+        mock_msearch.return_value = {
+            "responses": [{"error": {"type": "exception"}, "status": 500}]
+        }
+        with self.assertRaises(TransportError):
+            self.client.get(
+                f"/api/v1.0/courses/?scope=objects&limit=2&cursor={cursor:s}"
+            )
+
+    @override_settings(RICHIE_ES_INDICES_PREFIX="richie")
+    @mock.patch(
+        "richie.apps.search.forms.CourseSearchForm.build_es_query",
+        lambda *args: (2, 0, {"some": "query"}, {"some": "aggs"}),
+    )
+    @mock.patch(
+        "richie.apps.search.forms.CourseSearchForm.get_script_fields",
+        lambda *args: {"some": "fields"},
+    )
+    @mock.patch.object(CoursesViewSet, "get_filters", return_value={})
+    @mock.patch.object(ES_CLIENT, "msearch")
+    def test_viewsets_courses_search_known_titles(self, mock_msearch, *_):
+        """
+        The titles naming the facets known before the aggregations are computed, those of
+        the values selected or of the values included if they are all presented, should
+        be fetched in the same round-trip as the search.
+        """
+        titles_hits = {
+            "richie_categories": [
+                {"_id": "1", "_source": {"title": {"en": "Level 1"}}},
+                {"_id": "2", "_source": {"title": {"en": "Level 2"}}},
+            ],
+            "richie_licences": [
+                {"_id": "41", "_source": {"title": {"en": "Licence 41"}}},
+            ],
+        }
+        mock_msearch.side_effect = lambda body: {
+            "responses": [
+                {
+                    "hits": {
+                        "hits": titles_hits.get(header["index"], []),
+                        "total": {"value": 2},
+                    },
+                    "aggregations": {"all_courses": {}},
+                }
+                for header in body[::2]
+            ]
+        }
+
+        response = self.client.get(
+            "/api/v1.0/courses/?licences=41&levels_aggs=1&levels_aggs=2"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_msearch.call_count, 1)
+        body = mock_msearch.call_args[1]["body"]
+        self.assertEqual(
+            body[::2],
+            [
+                {"index": "richie_courses"},
+                {"index": "richie_categories"},
+                {"index": "richie_licences"},
+            ],
+        )
+        self.assertEqual(body[3]["query"], {"terms": {"_id": ["1", "2"]}})
+        self.assertEqual(body[5]["query"], {"terms": {"_id": ["41"]}})
+
+        # The titles are cached for the filters
+        self.assertEqual(
+            FILTERS["levels"].get_cached_titles(["1", "2"]),
+            ({"1": {"en": "Level 1"}, "2": {"en": "Level 2"}}, []),
+        )
+        self.assertEqual(
+            FILTERS["licences"].get_cached_titles(["41"]),
+            ({"41": {"en": "Licence 41"}}, []),
+        )
+
+    @override_settings(RICHIE_ES_INDICES_PREFIX="richie")
+    @mock.patch(
+        "richie.apps.search.forms.CourseSearchForm.get_script_fields",
+        lambda *args: {"some": "fields"},
+    )
+    @mock.patch("richie.apps.search.viewsets.courses.scan")
+    def test_viewsets_courses_export(self, mock_scan, *_):
+        """
+        The export endpoint should stream the courses matching filters as newline delimited
+        JSON, read with a scroll without scoring nor aggregations.
+        """
+        mock_scan.return_value = iter([{"_id": 523}, {"_id": 861}])
+
+        response = self.client.get("/api/v1.0/courses/export/?new=new&limit=1")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        # The courses are only read from Elasticsearch while the response is consumed
+        self.assertFalse(mock_scan.called)
+        self.assertEqual(
+            b"".join(response.streaming_content),
+            b'"Course #523"\n"Course #861"\n',
+        )
+
+        self.assertEqual(mock_scan.call_count, 1)
+        self.assertEqual(mock_scan.call_args[0], (ES_CLIENT,))
+        kwargs = mock_scan.call_args[1]
+        self.assertEqual(kwargs["index"], "richie_courses")
+        self.assertEqual(kwargs["size"], 500)
+        self.assertIn("course_runs", kwargs["_source"])
+        self.assertEqual(
+            kwargs["query"],
+            {
+                "query": {
+                    "bool": {
+                        "must": [
+                            {"term": {"is_listed": True}},
+                            {"term": {"is_new": True}},
+                        ]
+                    }
+                },
                 "script_fields": {"some": "fields"},
             },
-            from_=77,
-            index="richie_courses",
-            size=2,
         )
 
+    def test_viewsets_courses_export_with_invalid_params(self, *_):
+        """The export endpoint should validate filters like the search endpoint."""
+        response = self.client.get("/api/v1.0/courses/export/?languages=xx")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("languages", response.data["errors"])
+
     def test_viewsets_courses_search_with_invalid_params(self, *_):
         """
         Error case: the query string params are not properly formatted
@@ -10,6 +10,7 @@ from django.test.utils import override_settings
 from elasticsearch.exceptions import NotFoundError
 
 from richie.apps.search.apps import ES_CLIENT
+from richie.apps.search.utils.cursors import decode_cursor, encode_cursor
 
 
 class LicencesViewsetsTestCase(TestCase):
@@ -85,7 +86,12 @@ class LicencesViewsetsTestCase(TestCase):
         self.assertEqual(
             response.data,
             {
-                "meta": {"count": 2, "offset": 0, "total_count": 32},
+                "meta": {
+                    "count": 2,
+                    "next_cursor": None,
+                    "offset": 0,
+                    "total_count": 32,
+                },
                 "objects": [
                     {"id": 21, "title": "licence creative commons"},
                     {"id": 61, "title": "licence commerciale"},
@@ -116,6 +122,75 @@ class LicencesViewsetsTestCase(TestCase):
             size=2,
         )
 
+    @override_settings(RICHIE_ES_INDICES_PREFIX="richie")
+    @mock.patch.object(ES_CLIENT, "search")
+    def test_viewsets_licences_search_cursor(self, mock_search):
+        """
+        Passing an empty cursor should paginate the licences with cursors: ties are broken
+        in their sort and the cursor returned with each full page of results resumes them
+        after its last item, whatever the offset.
+        """
+        mock_search.return_value = {
+            "hits": {
+                "hits": [
+                    {
+                        "_id": 21,
+                        "sort": ["a", "21"],
+                        "_source": {
+                            "title": {"fr": "licence creative commons"},
+                        },
+                    },
+                    {
+                        "_id": 61,
+                        "sort": ["z", "61"],
+                        "_source": {
+                            "title": {"fr": "licence commerciale"},
+                        },
+                    },
+                ],
+                "total": {"relation": "eq", "value": 32},
+            }
+        }
+
+        response = self.client.get("/api/v1.0/licences/?query=licence&limit=2&cursor=")
+
+        self.assertEqual(response.status_code, 200)
+        next_cursor = response.data["meta"]["next_cursor"]
+        self.assertEqual(decode_cursor(next_cursor), {"after": ["z", "61"]})
+        body = mock_search.call_args[1]["body"]
+        self.assertEqual(
+            body["sort"],
+            [
+                {"title_raw.en": {"order": "asc"}},
+                {"id": {"order": "asc", "unmapped_type": "keyword"}},
+            ],
+        )
+        self.assertNotIn("search_after", body)
+
+        response = self.client.get(
+            f"/api/v1.0/licences/?query=licence&limit=2&offset=4&cursor={next_cursor:s}"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_search.call_args[1]["body"]["search_after"], ["z", "61"])
+        self.assertEqual(mock_search.call_args[1]["from_"], 0)
+
+    @mock.patch.object(ES_CLIENT, "search")
+    def test_viewsets_licences_search_cursor_invalid(self, mock_search):
+        """
+        A cursor that does not match the sort of the search should be rejected with a
+        BadRequest response instead of being sent to Elasticsearch.
+        """
+        for after in [["z"], ["z", "61", "62"], ["z", ["61"]], [{"z": 1}, "61"]]:
+            cursor = encode_cursor({"after": after})
+            response = self.client.get(
+                f"/api/v1.0/licences/?query=licence&limit=2&cursor={cursor:s}"
+            )
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data["errors"], {"cursor": ["Invalid cursor."]})
+        mock_search.assert_not_called()
+
     def test_viewsets_licences_search_with_invalid_params(self):
         """
         Error case: the client used an incorrectly formatted request
@@ -10,6 +10,7 @@ from django.test.utils import override_settings
 from elasticsearch.exceptions import NotFoundError
 
 from richie.apps.search.apps import ES_CLIENT
+from richie.apps.search.utils.cursors import decode_cursor
 
 
 class OrganizationsViewsetsTestCase(TestCase):
@@ -88,7 +89,12 @@ class OrganizationsViewsetsTestCase(TestCase):
         self.assertEqual(
             response.data,
             {
-                "meta": {"count": 2, "offset": 0, "total_count": 32},
+                "meta": {
+                    "count": 2,
+                    "next_cursor": None,
+                    "offset": 0,
+                    "total_count": 32,
+                },
                 "objects": [
                     {"id": 21, "logo": "/logo_21.png", "title": "Université Paris 13"},
                     {"id": 61, "logo": "/logo_61.png", "title": "Université Paris 8"},
@@ -119,6 +125,63 @@ class OrganizationsViewsetsTestCase(TestCase):
             size=2,
         )
 
+    @override_settings(RICHIE_ES_INDICES_PREFIX="richie")
+    @mock.patch.object(ES_CLIENT, "search")
+    def test_viewsets_organizations_search_cursor(self, mock_search):
+        """
+        Passing an empty cursor should paginate the organizations with cursors: ties are broken
+        in their sort and the cursor returned with each full page of results resumes them
+        after its last item, whatever the offset.
+        """
+        mock_search.return_value = {
+            "hits": {
+                "hits": [
+                    {
+                        "_id": 21,
+                        "sort": ["a", "21"],
+                        "_source": {
+                            "logo": {"fr": "/logo_21.png"},
+                            "title": {"fr": "Université Paris 13"},
+                        },
+                    },
+                    {
+                        "_id": 61,
+                        "sort": ["z", "61"],
+                        "_source": {
+                            "logo": {"fr": "/logo_61.png"},
+                            "title": {"fr": "Université Paris 8"},
+                        },
+                    },
+                ],
+                "total": {"relation": "eq", "value": 32},
+            }
+        }
+
+        response = self.client.get(
+            "/api/v1.0/organizations/?query=Université&limit=2&cursor="
+        )
+
+        self.assertEqual(response.status_code, 200)
+        next_cursor = response.data["meta"]["next_cursor"]
+        self.assertEqual(decode_cursor(next_cursor), {"after": ["z", "61"]})
+        body = mock_search.call_args[1]["body"]
+        self.assertEqual(
+            body["sort"],
+            [
+                {"title_raw.en": {"order": "asc"}},
+                {"id": {"order": "asc", "unmapped_type": "keyword"}},
+            ],
+        )
+        self.assertNotIn("search_after", body)
+
+        response = self.client.get(
+            f"/api/v1.0/organizations/?query=Université&limit=2&offset=4&cursor={next_cursor:s}"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_search.call_args[1]["body"]["search_after"], ["z", "61"])
+        self.assertEqual(mock_search.call_args[1]["from_"], 0)
+
     def test_viewsets_organizations_search_with_invalid_params(self):
         """
         Error case: the client used an incorrectly formatted request